@@ -4,10 +4,15 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from lawly_db.db_models.db_session import global_init
+from prometheus_client import make_asgi_app
 
 from config import settings
 from modules import ai, lawyer
+from websockets_server.handlers.websocket_handler import connection_manager
 from websockets_server.router import router as websocket_router
+from websockets_server.services.amqp_connection import amqp_connection
+from websockets_server.services.outbox_relay import outbox_relay
+from websockets_server.services.presence_registry import presence_registry
 from websockets_server.workers.ai_worker import AIWorker
 
 
@@ -15,17 +20,34 @@ from websockets_server.workers.ai_worker import AIWorker
 async def lifespan(app: FastAPI):
     await global_init()
 
-    ai_worker = AIWorker()
-    worker_task = asyncio.create_task(ai_worker.start())
+    # Встроенный воркер можно отключить и запускать python -m websockets_server.workers
+    ai_worker = None
+    if settings.ai_worker_settings.embedded:
+        ai_worker = AIWorker()
+        worker_task = asyncio.create_task(ai_worker.start())
+
+    relay_task = None
+    outbox_settings = settings.outbox_settings
+    if outbox_settings.enabled and outbox_settings.relay_enabled:
+        relay_task = asyncio.create_task(outbox_relay.run())
 
     yield
 
-    await ai_worker.stop()
+    if relay_task is not None:
+        outbox_relay.stop()
+        await relay_task
+
+    if ai_worker is not None:
+        await ai_worker.stop()
 
-    try:
-        await worker_task
-    except asyncio.CancelledError:
-        pass
+        try:
+            await worker_task
+        except asyncio.CancelledError:
+            pass
+
+    await connection_manager.close()
+    await presence_registry.close()
+    await amqp_connection.close()
 
 
 app = FastAPI(title="Lawly Chat API", lifespan=lifespan)
@@ -42,3 +64,6 @@ app.add_middleware(
 app.include_router(websocket_router, prefix="/api/v1", tags=["WebSockets"])
 app.include_router(ai.router, prefix="/api/v1/chat/ai")
 app.include_router(lawyer.router, prefix="/api/v1/chat/lawyer")
+
+# Метрики Prometheus
+app.mount("/metrics", make_asgi_app())
@@ -0,0 +1,166 @@
+"""
+Метрики Prometheus сервиса
+
+Все метрики объявлены в одном модуле верхнего уровня: модуль, импортированный
+повторно под другим именем (например, app.services.s3_service), иначе
+регистрировал бы их в реестре второй раз.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# S3
+S3_OPERATION_SECONDS = Histogram(
+    "s3_operation_seconds", "Длительность операций с S3", ["operation"]
+)
+S3_HEDGED_REQUESTS = Counter(
+    "s3_hedged_requests_total",
+    "Дополнительные (хеджирующие) GET-запросы к S3",
+    ["outcome"],
+)
+
+# Бюджет памяти для документов
+BUDGET_BYTES_IN_USE = Gauge(
+    "document_memory_budget_bytes_in_use",
+    "Байты документов, зарезервированные в бюджете памяти",
+)
+BUDGET_CAPACITY = Gauge(
+    "document_memory_budget_capacity_bytes",
+    "Размер бюджета памяти для документов",
+)
+BUDGET_WAITERS = Gauge(
+    "document_memory_budget_waiters",
+    "Запросы, ожидающие освобождения бюджета памяти",
+)
+BUDGET_REJECTIONS = Counter(
+    "document_memory_budget_rejections_total",
+    "Запросы, отклоненные из-за исчерпания бюджета памяти",
+)
+
+# AI воркер
+AI_QUEUE_WAIT = Histogram(
+    "ai_worker_queue_wait_seconds",
+    "Время от постановки запроса в очередь до начала обработки",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+AI_EXECUTION = Histogram(
+    "ai_worker_execution_seconds",
+    "Время обработки запроса к AI воркером",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+AI_FIRST_CHUNK = Histogram(
+    "ai_worker_first_chunk_seconds",
+    "Время от запроса к AI до отправки первого фрагмента ответа",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30),
+)
+AI_STREAM_CHUNKS = Histogram(
+    "ai_worker_stream_chunks",
+    "Число фрагментов, отправленных в брокер на один потоковый ответ",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+AI_PROMPT_TOKENS = Histogram(
+    "ai_worker_prompt_tokens",
+    "Оценка размера промпта с контекстом диалога в токенах",
+    buckets=(50, 100, 250, 500, 1000, 2000, 3000, 4000, 6000, 8000),
+)
+AI_CONTEXT_BUILD = Histogram(
+    "ai_worker_context_build_seconds",
+    "Время сборки контекста диалога для запроса к AI",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5),
+)
+AI_CONTEXT_CACHE = Counter(
+    "ai_worker_context_cache_total",
+    "Обращения к кешу истории диалога в воркере",
+    ["result"],
+)
+AI_RESPONSE_CACHE = Counter(
+    "ai_worker_response_cache_total",
+    "Обращения к кешу ответов AI: hit, shared_hit, miss, skip — запрос не кешируется",
+    ["result"],
+)
+AI_EXPIRED = Counter(
+    "ai_worker_expired_requests_total",
+    "Запросы к AI, отброшенные без ответа: истек срок или пользователь отключился",
+    ["reason"],
+)
+AI_CANCELLED = Counter(
+    "ai_worker_cancelled_requests_total",
+    "Запросы к AI, отмененные пользователем: queued — до начала, running — прерванные",
+    ["stage"],
+)
+AI_SHED = Counter(
+    "ai_worker_shed_requests_total",
+    "Запросы к AI, отложенные без вызова, пока выключатель разомкнут",
+)
+AI_INFLIGHT = Gauge(
+    "ai_worker_inflight_requests",
+    "Запросы к AI, выполняемые воркером прямо сейчас",
+)
+AI_CONCURRENCY_LIMIT = Gauge(
+    "ai_worker_concurrency_limit",
+    "Адаптивный предел одновременных запросов к AI",
+)
+AI_CONCURRENCY_MIN_RTT = Gauge(
+    "ai_worker_min_rtt_seconds",
+    "Базовая (наименьшая) задержка вызова AI для адаптивного предела",
+)
+
+# gRPC клиент AI
+AI_GRPC_RETRIES = Counter(
+    "ai_grpc_retries_total",
+    "Повторы вызовов AI после временных ошибок по коду статуса gRPC",
+    ["reason"],
+)
+AI_COALESCED = Counter(
+    "ai_client_coalesced_requests_total",
+    "Запросы к AI, присоединенные к уже выполняющемуся одинаковому вызову",
+)
+AI_GRPC_HEALTHY_CHANNELS = Gauge(
+    "ai_grpc_healthy_channels",
+    "Исправные каналы в пуле gRPC клиента AI",
+)
+AI_CIRCUIT_STATE = Gauge(
+    "ai_circuit_state",
+    "Состояние выключателя вызовов AI: 0 — closed, 1 — half_open, 2 — open",
+)
+AI_CIRCUIT_TRANSITIONS = Counter(
+    "ai_circuit_transitions_total",
+    "Переходы выключателя вызовов AI между состояниями",
+    ["from_state", "to_state"],
+)
+
+# WebSocket соединения
+WEBSOCKET_CONNECTIONS = Gauge(
+    "websocket_connections",
+    "Открытые WebSocket соединения",
+)
+RESPONSE_SUBSCRIPTIONS = Gauge(
+    "websocket_response_subscriptions",
+    "Подписки на ответы AI, по одной на пользователя с открытыми сокетами",
+)
+
+# Исходящие запросы к AI
+OUTBOX_PUBLISHED = Counter(
+    "ai_outbox_published_total",
+    "Публикации исходящих запросов к AI по результату подтверждения брокера",
+    ["result"],
+)
+OUTBOX_LAG = Histogram(
+    "ai_outbox_lag_seconds",
+    "Время от записи запроса в исходящие до подтверждения брокера",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+# Планировщик запросов к AI
+SCHEDULER_WAITING = Gauge(
+    "ai_scheduler_waiting_requests",
+    "Запросы к AI, ожидающие слота в планировщике",
+    ["lane"],
+)
+SCHEDULER_ACTIVE_USERS = Gauge(
+    "ai_scheduler_waiting_users",
+    "Пользователи, у которых есть ожидающие запросы к AI",
+)
+SCHEDULER_MAX_USER_DEPTH = Gauge(
+    "ai_scheduler_max_user_depth",
+    "Наибольшее число ожидающих запросов одного пользователя",
+)
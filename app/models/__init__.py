@@ -0,0 +1,3 @@
+from .ai_request_outbox import AIRequestOutbox
+
+__all__ = ["AIRequestOutbox"]
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from lawly_db.db_models.db_session import Base
+from sqlalchemy import BigInteger, DateTime, Index, Integer, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+class AIRequestOutbox(Base):
+    """
+    Исходящий запрос к AI, записанный в одной транзакции с сообщением
+
+    Строку публикует в RabbitMQ OutboxRelay и проставляет sent_at после
+    подтверждения брокера. Миграция таблицы добавляется в lawly_db, до нее
+    запись в таблицу выключена настройкой outbox_enabled.
+    """
+
+    __tablename__ = "ai_request_outbox"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    message_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    message: Mapped[str] = mapped_column(Text, nullable=False)
+    priority: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    sent_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+    __table_args__ = (
+        # Релей выбирает только неотправленные строки
+        Index(
+            "ix_ai_request_outbox_unsent",
+            "id",
+            postgresql_where=sent_at.is_(None),
+        ),
+    )
@@ -4,6 +4,11 @@ from .descriptions import (
     get_document_description,
     create_lawyer_request_description,
     get_lawyer_responses_description,
+    create_upload_session_description,
+    upload_chunk_description,
+    get_upload_session_description,
+    complete_upload_description,
+    abort_upload_description,
 )
 from .dto import (
     LawyerRequestStatus,
@@ -17,6 +22,8 @@ from .dto import (
     LawyerRequestCreateResponseDTO,
     LawyerResponsesDTO,
     LawyerResponseDTO,
+    UploadSessionCreateDTO,
+    UploadSessionDTO,
 )
 from .response import (
     get_lawyer_requests_response,
@@ -24,6 +31,11 @@ from .response import (
     get_document_response,
     create_lawyer_request_response,
     get_lawyer_responses_response,
+    create_upload_session_response,
+    upload_chunk_response,
+    get_upload_session_response,
+    complete_upload_response,
+    abort_upload_response,
 )
 from .router import router
 
@@ -34,6 +46,11 @@ __all__ = [
     "get_document_description",
     "create_lawyer_request_description",
     "get_lawyer_responses_description",
+    "create_upload_session_description",
+    "upload_chunk_description",
+    "get_upload_session_description",
+    "complete_upload_description",
+    "abort_upload_description",
     "LawyerRequestStatus",
     "LawyerRequestFilterDTO",
     "LawyerRequestUpdateDTO",
@@ -45,9 +62,16 @@ __all__ = [
     "DocumentRetrievalByMessageIdDTO",
     "LawyerRequestCreateDTO",
     "LawyerRequestCreateResponseDTO",
+    "UploadSessionCreateDTO",
+    "UploadSessionDTO",
     "get_lawyer_requests_response",
     "update_lawyer_request_response",
     "get_document_response",
     "create_lawyer_request_response",
     "get_lawyer_responses_response",
+    "create_upload_session_response",
+    "upload_chunk_response",
+    "get_upload_session_response",
+    "complete_upload_response",
+    "abort_upload_response",
 ]
@@ -57,3 +57,55 @@ get_document_description = """
 Возвращает документ в виде файла для скачивания.
 Требуется авторизация с помощью JWT токена. Доступно только юристам для заявок или пользователям для их собственных сообщений.
 """
+
+create_upload_session_description = """
+Создание сессии возобновляемой загрузки документа для заявки к юристу.
+
+Используется вместо передачи document_bytes в одном запросе для больших документов.
+
+Обязательные параметры:
+- description: Описание проблемы или запроса
+- total_size: Полный размер документа в байтах
+
+Консультация проверяется при создании сессии, а списывается при завершении загрузки.
+Неактивная сессия истекает, уже загруженные части при этом удаляются.
+
+Требуется авторизация с помощью JWT токена.
+"""
+
+upload_chunk_description = """
+Загрузка очередной части документа.
+
+Тело запроса — байты части (application/octet-stream).
+- chunk_index: Порядковый номер части, начиная с 0
+- offset: Смещение части в документе
+
+Если связь оборвалась, текущее смещение можно получить запросом состояния загрузки
+и продолжить с него. Повторная отправка уже принятой части безопасна.
+
+Требуется авторизация с помощью JWT токена.
+"""
+
+get_upload_session_description = """
+Получение состояния загрузки: количество принятых байт и номер ожидаемой части.
+
+Требуется авторизация с помощью JWT токена.
+"""
+
+complete_upload_description = """
+Завершение загрузки и создание заявки к юристу.
+
+Все части документа должны быть загружены. Документ уже зашифрован и передан
+в хранилище по мере загрузки частей, поэтому завершение выполняется быстро.
+
+Консультация списывается при завершении. Если завершение не удалось, запрос
+можно повторить: консультация второй раз не списывается.
+
+Требуется авторизация с помощью JWT токена.
+"""
+
+abort_upload_description = """
+Отмена загрузки с удалением уже загруженных частей.
+
+Требуется авторизация с помощью JWT токена.
+"""
@@ -43,6 +43,17 @@ class LawyerRequestCreateDTO(BaseModel):
     )
 
 
+class UploadSessionCreateDTO(BaseModel):
+    description: str = Field(
+        ...,
+        example="Нужно проверить договор купли-продажи",
+        description="Описание заявки для юриста",
+    )
+    total_size: int = Field(
+        ..., example=10485760, description="Полный размер документа в байтах"
+    )
+
+
 # Response models
 class LawyerRequestDTO(BaseModel):
     id: int = Field(..., example=123, description="Уникальный ID заявки")
@@ -102,6 +113,22 @@ class LawyerRequestCreateResponseDTO(BaseModel):
     )
 
 
+class UploadSessionDTO(BaseModel):
+    upload_id: str = Field(
+        ..., example="9f1c2b7e4d6a4f0e8b3a5c7d9e1f2a3b", description="ID загрузки"
+    )
+    offset: int = Field(
+        ..., example=0, description="Количество уже принятых байт документа"
+    )
+    next_chunk: int = Field(..., example=0, description="Номер ожидаемой части")
+    total_size: int = Field(
+        ..., example=10485760, description="Полный размер документа в байтах"
+    )
+    max_chunk_size: int = Field(
+        ..., example=8388608, description="Максимальный размер одной части в байтах"
+    )
+
+
 # Request model для получения документа
 class DocumentRetrievalByRequestIdDTO(BaseModel):
     lawyer_request_id: int = Field(..., example=123, description="ID заявки юриста")
@@ -2,6 +2,7 @@ from modules.lawyer.dto import (
     LawyerResponsesDTO,
     LawyerRequestsDTO,
     LawyerRequestCreateResponseDTO,
+    UploadSessionDTO,
 )
 
 get_lawyer_requests_response = {
@@ -25,6 +26,8 @@ update_lawyer_request_response = {
         "description": "Доступ запрещен. Пользователь не является юристом, или заявка не назначена этому юристу."
     },
     404: {"description": "Заявка не найдена"},
+    411: {"description": "Не указан Content-Length"},
+    503: {"description": "Сервис перегружен, повторите запрос после Retry-After"},
 }
 
 get_document_response = {
@@ -35,6 +38,7 @@ get_document_response = {
         "description": "Доступ запрещен. Недостаточно прав для доступа к этому документу."
     },
     404: {"description": "Документ не найден"},
+    503: {"description": "Сервис перегружен, повторите запрос после Retry-After"},
 }
 
 create_lawyer_request_response = {
@@ -45,4 +49,53 @@ create_lawyer_request_response = {
     },
     400: {"description": "Неверные параметры запроса"},
     500: {"description": "Внутренняя ошибка сервера"},
+    411: {"description": "Не указан Content-Length"},
+    503: {"description": "Сервис перегружен, повторите запрос после Retry-After"},
+}
+
+create_upload_session_response = {
+    401: {"description": "Неверные учетные данные"},
+    201: {"description": "Сессия загрузки создана", "model": UploadSessionDTO},
+    400: {"description": "Неверные параметры запроса"},
+    403: {"description": "У пользователя закончились консультации"},
+    503: {"description": "Слишком много активных загрузок"},
+    502: {"description": "Ошибка хранилища документов"},
+}
+
+upload_chunk_response = {
+    401: {"description": "Неверные учетные данные"},
+    200: {"description": "Часть принята", "model": UploadSessionDTO},
+    400: {"description": "Неверный размер части"},
+    411: {"description": "Не указан Content-Length"},
+    403: {"description": "Нет доступа к этой загрузке"},
+    404: {"description": "Загрузка не найдена или истекла"},
+    409: {"description": "Номер или смещение части не совпадают с ожидаемыми"},
+    503: {"description": "Сервис перегружен, повторите запрос после Retry-After"},
+}
+
+get_upload_session_response = {
+    401: {"description": "Неверные учетные данные"},
+    200: {"description": "Состояние загрузки", "model": UploadSessionDTO},
+    403: {"description": "Нет доступа к этой загрузке"},
+    404: {"description": "Загрузка не найдена или истекла"},
+}
+
+complete_upload_response = {
+    401: {"description": "Неверные учетные данные"},
+    201: {
+        "description": "Заявка успешно создана",
+        "model": LawyerRequestCreateResponseDTO,
+    },
+    403: {"description": "Нет доступа к этой загрузке или закончились консультации"},
+    404: {"description": "Загрузка не найдена или истекла"},
+    409: {"description": "Документ загружен не полностью"},
+    502: {"description": "Ошибка хранилища документов"},
+}
+
+abort_upload_response = {
+    401: {"description": "Неверные учетные данные"},
+    204: {"description": "Загрузка отменена"},
+    403: {"description": "Нет доступа к этой загрузке"},
+    404: {"description": "Загрузка не найдена или истекла"},
+    502: {"description": "Ошибка хранилища документов"},
 }
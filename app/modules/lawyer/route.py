@@ -0,0 +1,65 @@
+from typing import Callable, Coroutine, Any
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+from config import settings
+from services.errors import ServiceUnavailableError
+from services.memory_budget import document_memory_budget
+
+
+def content_length(request: Request) -> int:
+    """
+    Размер тела запроса из Content-Length
+
+    Тело без Content-Length (chunked) пришлось бы читать целиком, не зная
+    его размера, поэтому такие запросы отклоняются.
+
+    :param request: Запрос
+    :return: Размер тела в байтах
+    :raises HTTPException: 411, если Content-Length нет, 400 — если он не число
+    """
+    value = request.headers.get("content-length")
+    if value is None:
+        raise HTTPException(
+            status_code=411, detail="Не указан размер тела запроса (Content-Length)"
+        )
+    if not value.isdigit():
+        raise HTTPException(status_code=400, detail="Неверный Content-Length")
+    return int(value)
+
+
+class DocumentBudgetRoute(APIRoute):
+    """
+    Маршрут, резервирующий бюджет памяти до разбора JSON тела запроса
+
+    Документ в JSON приходит списком document_bytes (list[int]), и самая
+    большая копия — разобранный список — появляется еще до вызова
+    обработчика. Поэтому объем резервируется по Content-Length до разбора
+    тела и держится до конца обработки, а JSON тела без Content-Length
+    отклоняются. Тела не в JSON (части возобновляемой
+    загрузки) резервируются в сервисе.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def budgeted_handler(request: Request) -> Response:
+            content_type = request.headers.get("content-type", "")
+            if not content_type.startswith("application/json"):
+                return await handler(request)
+
+            body_factor = settings.memory_budget_settings.body_factor
+            reserve_size = content_length(request) * body_factor
+            try:
+                async with document_memory_budget.reserve(reserve_size):
+                    return await handler(request)
+            except ServiceUnavailableError as e:
+                return JSONResponse(
+                    status_code=503,
+                    content={"detail": str(e)},
+                    headers={"Retry-After": str(e.retry_after)},
+                )
+
+        return budgeted_handler
@@ -1,19 +1,34 @@
 import io
 
-from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Body,
+    Path,
+    Query,
+    Request,
+    Response,
+    status,
+)
 from datetime import datetime
 
 from starlette.responses import StreamingResponse
 
 from api.auth.auth_bearer import JWTBearer, JWTHeader
 from lawly_db.db_models.enum_models import LawyerRequestStatusEnum
+from config import settings
 from services.errors import (
     AccessDeniedError,
+    ConflictError,
     NotFoundError,
     ParameterError,
+    ServiceError,
+    ServiceUnavailableError,
 )
 
 from services.lawyer_service import LawyerService
+from services.upload_session_store import UploadSession
 
 from modules.lawyer.descriptions import (
     get_lawyer_requests_description,
@@ -21,6 +36,11 @@ from modules.lawyer.descriptions import (
     get_document_description,
     create_lawyer_request_description,
     get_lawyer_responses_description,
+    create_upload_session_description,
+    upload_chunk_description,
+    get_upload_session_description,
+    complete_upload_description,
+    abort_upload_description,
 )
 
 from modules.lawyer.dto import (
@@ -31,6 +51,8 @@ from modules.lawyer.dto import (
     LawyerRequestCreateDTO,
     LawyerRequestCreateResponseDTO,
     LawyerResponsesDTO,
+    UploadSessionCreateDTO,
+    UploadSessionDTO,
 )
 from modules.lawyer.response import (
     get_lawyer_requests_response,
@@ -38,9 +60,15 @@ from modules.lawyer.response import (
     get_document_response,
     create_lawyer_request_response,
     get_lawyer_responses_response,
+    create_upload_session_response,
+    upload_chunk_response,
+    get_upload_session_response,
+    complete_upload_response,
+    abort_upload_response,
 )
+from modules.lawyer.route import DocumentBudgetRoute, content_length
 
-router = APIRouter(tags=["Юрист"])
+router = APIRouter(tags=["Юрист"], route_class=DocumentBudgetRoute)
 
 
 @router.post(
@@ -77,6 +105,199 @@ async def create_lawyer_request(
         raise HTTPException(status_code=404, detail=str(e))
 
 
+def _upload_session_dto(session: UploadSession) -> UploadSessionDTO:
+    return UploadSessionDTO(
+        upload_id=session.upload_id,
+        offset=session.offset,
+        next_chunk=session.next_chunk,
+        total_size=session.total_size,
+        max_chunk_size=settings.upload_settings.max_chunk_size,
+    )
+
+
+@router.post(
+    "/requests/uploads",
+    summary="Создание сессии загрузки документа",
+    description=create_upload_session_description,
+    responses=create_upload_session_response,
+    response_model=UploadSessionDTO,
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_upload_session(
+    request_data: UploadSessionCreateDTO = Body(...),
+    current_user: JWTHeader = Depends(JWTBearer()),
+    lawyer_service: LawyerService = Depends(),
+):
+    """
+    Создание сессии возобновляемой загрузки документа
+    """
+    try:
+        session = await lawyer_service.create_upload_session(
+            user_id=current_user.user_id,
+            description=request_data.description,
+            total_size=request_data.total_size,
+        )
+        return _upload_session_dto(session)
+    except ParameterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AccessDeniedError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ServiceUnavailableError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except ServiceError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+
+@router.get(
+    "/requests/uploads/{upload_id}",
+    summary="Получение состояния загрузки документа",
+    description=get_upload_session_description,
+    responses=get_upload_session_response,
+    response_model=UploadSessionDTO,
+)
+async def get_upload_session(
+    upload_id: str = Path(..., description="ID загрузки"),
+    current_user: JWTHeader = Depends(JWTBearer()),
+    lawyer_service: LawyerService = Depends(),
+):
+    """
+    Получение текущего смещения загрузки
+    """
+    try:
+        session = await lawyer_service.get_upload_session(
+            user_id=current_user.user_id, upload_id=upload_id
+        )
+        return _upload_session_dto(session)
+    except AccessDeniedError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except NotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.put(
+    "/requests/uploads/{upload_id}/chunks/{chunk_index}",
+    summary="Загрузка части документа",
+    description=upload_chunk_description,
+    responses=upload_chunk_response,
+    response_model=UploadSessionDTO,
+)
+async def upload_chunk(
+    request: Request,
+    upload_id: str = Path(..., description="ID загрузки"),
+    chunk_index: int = Path(..., ge=0, description="Порядковый номер части"),
+    offset: int = Query(..., ge=0, description="Смещение части в документе"),
+    current_user: JWTHeader = Depends(JWTBearer()),
+    lawyer_service: LawyerService = Depends(),
+):
+    """
+    Прием очередной части документа
+    """
+    max_chunk_size = settings.upload_settings.max_chunk_size
+    if content_length(request) > max_chunk_size:
+        raise HTTPException(status_code=400, detail="Часть документа слишком большая")
+
+    # Тело читается с ограничением, даже если оно длиннее заявленного
+    data = bytearray()
+    async for piece in request.stream():
+        data += piece
+        if len(data) > max_chunk_size:
+            raise HTTPException(
+                status_code=400, detail="Часть документа слишком большая"
+            )
+
+    try:
+        session = await lawyer_service.upload_chunk(
+            user_id=current_user.user_id,
+            upload_id=upload_id,
+            chunk_index=chunk_index,
+            offset=offset,
+            data=bytes(data),
+        )
+        return _upload_session_dto(session)
+    except ParameterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AccessDeniedError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except NotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ServiceUnavailableError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+@router.post(
+    "/requests/uploads/{upload_id}/complete",
+    summary="Завершение загрузки документа",
+    description=complete_upload_description,
+    responses=complete_upload_response,
+    response_model=LawyerRequestCreateResponseDTO,
+    status_code=status.HTTP_201_CREATED,
+)
+async def complete_upload(
+    upload_id: str = Path(..., description="ID загрузки"),
+    current_user: JWTHeader = Depends(JWTBearer()),
+    lawyer_service: LawyerService = Depends(),
+):
+    """
+    Завершение загрузки и создание заявки к юристу
+    """
+    try:
+        lawyer_request = await lawyer_service.complete_upload(
+            user_id=current_user.user_id, upload_id=upload_id
+        )
+
+        return LawyerRequestCreateResponseDTO(
+            id=lawyer_request.id,
+            status=LawyerRequestStatus(lawyer_request.status.value),
+            created_at=lawyer_request.created_at,
+        )
+    except AccessDeniedError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except NotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ServiceError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+
+@router.delete(
+    "/requests/uploads/{upload_id}",
+    summary="Отмена загрузки документа",
+    description=abort_upload_description,
+    responses=abort_upload_response,
+    response_class=Response,
+)
+async def abort_upload(
+    upload_id: str = Path(..., description="ID загрузки"),
+    current_user: JWTHeader = Depends(JWTBearer()),
+    lawyer_service: LawyerService = Depends(),
+):
+    """
+    Отмена загрузки документа
+    """
+    try:
+        await lawyer_service.abort_upload(
+            user_id=current_user.user_id, upload_id=upload_id
+        )
+        return Response(status_code=204)
+    except AccessDeniedError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except NotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ServiceError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+
 @router.get(
     "/requests",
     summary="Получение заявок юристом",
@@ -214,6 +435,12 @@ async def get_document(
         raise HTTPException(status_code=403, detail=str(e))
     except NotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ServiceUnavailableError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
 
 
 @router.get(
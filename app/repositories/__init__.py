@@ -1,5 +1,11 @@
 from .base_repository import BaseRepository
 from .message_repository import MessageRepository
 from .lawyer_request_repository import LawyerRequestRepository
+from .outbox_repository import OutboxRepository
 
-__all__ = ["BaseRepository", "MessageRepository", "LawyerRequestRepository"]
+__all__ = [
+    "BaseRepository",
+    "MessageRepository",
+    "LawyerRequestRepository",
+    "OutboxRepository",
+]
@@ -9,6 +9,7 @@ from lawly_db.db_models.enum_models import (
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from models import AIRequestOutbox
 from .base_repository import BaseRepository
 
 
@@ -64,6 +65,42 @@ class MessageRepository(BaseRepository):
 
         return list(messages), total
 
+    async def get_recent_ai_messages(
+        self, user_id: int, limit: int, before_id: int | None = None
+    ) -> list[Message]:
+        """
+        Последние сообщения чата с AI для контекста диалога
+
+        :param user_id: ID пользователя
+        :param limit: Максимальное число сообщений
+        :param before_id: Только сообщения старше сообщения с этим ID
+        :return: Сообщения от старых к новым
+        """
+        query = select(Message).where(
+            Message.user_id == user_id, Message.chat_type == ChatTypeEnum.AI
+        )
+        if before_id is not None:
+            query = query.where(Message.id < before_id)
+        query = query.order_by(Message.id.desc()).limit(limit)
+        result = await self.session.execute(query)
+        return list(reversed(result.scalars().all()))
+
+    async def get_last_ai_message_id(self, user_id: int, before_id: int) -> int | None:
+        """
+        ID самого нового сообщения чата с AI старше сообщения before_id
+
+        :param user_id: ID пользователя
+        :param before_id: ID сообщения, более новые не учитываются
+        :return: ID сообщения или None, если сообщений нет
+        """
+        query = select(func.max(Message.id)).where(
+            Message.user_id == user_id,
+            Message.chat_type == ChatTypeEnum.AI,
+            Message.id < before_id,
+        )
+        result = await self.session.execute(query)
+        return result.scalar()
+
     async def get_lawyer_messages(
         self,
         user_id: int,
@@ -120,6 +157,40 @@ class MessageRepository(BaseRepository):
         await self.save(message, self.session)
         return message
 
+    async def create_user_ai_message_with_outbox(
+        self, user_id: int, content: str, priority: int = 0
+    ) -> Message:
+        """
+        Создание сообщения пользователя и запроса к AI в исходящих одной транзакцией
+
+        Запрос публикует OutboxRelay, так что сообщение не остается без ответа,
+        даже если брокер недоступен в момент записи.
+
+        :param user_id: ID пользователя
+        :param content: Текст сообщения
+        :param priority: 1 — приоритетная полоса планировщика воркера
+        :return: Созданное сообщение
+        """
+        message = Message(
+            user_id=user_id,
+            chat_type=ChatTypeEnum.AI,
+            sender_type=MessageSenderTypeEnum.USER,
+            text=content,
+            status=MessageStatusEnum.SENT,
+        )
+        self.session.add(message)
+        # ID сообщения нужен строке исходящих до фиксации транзакции
+        await self.session.flush()
+
+        outbox = AIRequestOutbox(
+            user_id=user_id,
+            message_id=message.id,
+            message=content,
+            priority=priority,
+        )
+        await self.save(outbox, self.session)
+        return message
+
     async def create_ai_response_message(self, user_id: int, content: str) -> Message:
         """
         Создание ответного сообщения от AI
@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import AIRequestOutbox
+from .base_repository import BaseRepository
+
+
+class OutboxRepository(BaseRepository):
+    def __init__(self, session: AsyncSession):
+        super().__init__(session)
+
+    async def lock_unsent(self, limit: int) -> list[AIRequestOutbox]:
+        """
+        Выборка неотправленных запросов с блокировкой строк до конца транзакции
+
+        Заблокированные строки пропускаются, поэтому несколько реплик
+        публикуют исходящие параллельно, не дублируя друг друга.
+
+        :param limit: Размер пачки
+        :return: Строки в порядке записи
+        """
+        query = (
+            select(AIRequestOutbox)
+            .where(AIRequestOutbox.sent_at.is_(None))
+            .order_by(AIRequestOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.session.execute(query)
+        return list(result.scalars().all())
+
+    async def mark_sent(self, outbox_ids: list[int]):
+        """
+        Отметка запросов, подтвержденных брокером
+
+        :param outbox_ids: ID строк исходящих
+        """
+        if not outbox_ids:
+            return
+        query = (
+            update(AIRequestOutbox)
+            .where(AIRequestOutbox.id.in_(outbox_ids))
+            .values(sent_at=datetime.now(timezone.utc))
+        )
+        await self.session.execute(query)
+
+    async def mark_failed(self, outbox_ids: list[int]):
+        """
+        Учет неудачной попытки публикации, строки останутся в исходящих
+
+        :param outbox_ids: ID строк исходящих
+        """
+        if not outbox_ids:
+            return
+        query = (
+            update(AIRequestOutbox)
+            .where(AIRequestOutbox.id.in_(outbox_ids))
+            .values(attempts=AIRequestOutbox.attempts + 1)
+        )
+        await self.session.execute(query)
+
+    async def delete_sent_before(self, before: datetime) -> int:
+        """
+        Удаление давно отправленных запросов
+
+        :param before: Граница по времени отправки
+        :return: Число удаленных строк
+        """
+        query = delete(AIRequestOutbox).where(AIRequestOutbox.sent_at < before)
+        result = await self.session.execute(query)
+        await self.session.commit()
+        return result.rowcount
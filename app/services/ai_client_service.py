@@ -1,95 +1,427 @@
+import asyncio
 import logging
+import random
+import unicodedata
+from typing import AsyncIterator
+
+import grpc
 from protos.ai_service.client import AIAssistantClient
 from protos.ai_service.dto import AIRequestDTO
 
 from config import settings
+from metrics import AI_COALESCED, AI_GRPC_HEALTHY_CHANNELS, AI_GRPC_RETRIES
+from services.circuit_breaker import CircuitBreaker
+from services.errors import AIDeadlineExceededError, AIServiceError
 
 logger = logging.getLogger(__name__)
 
+# Временные ошибки сервера: запрос можно повторить на другом канале
+RETRYABLE_CODES = {
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.ABORTED,
+}
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Приведение запроса к каноническому виду: регистр, пунктуация и пробелы
+    не различаются
+
+    :param prompt: Текст запроса
+    :return: Нормализованный текст
+    """
+    text = unicodedata.normalize("NFKC", prompt).casefold().replace("ё", "е")
+    text = "".join(
+        " " if unicodedata.category(char).startswith("P") else char for char in text
+    )
+    return " ".join(text.split())
+
+
+def retry_reason(error: Exception) -> str | None:
+    """
+    Причина повтора запроса к AI
+
+    :param error: Ошибка вызова
+    :return: Код статуса gRPC или connection для ошибок соединения,
+        None — ошибка постоянная, повтор не поможет
+    """
+    if isinstance(error, grpc.aio.AioRpcError):
+        code = error.code()
+        return code.name if code in RETRYABLE_CODES else None
+    if isinstance(error, (ConnectionError, OSError)):
+        return "connection"
+    return None
+
+
+class _Flight:
+    """Вызов ai_chat и число запросов, ожидающих его результат"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Channel:
+    """Клиент AI с собственным каналом gRPC"""
+
+    __slots__ = ("client", "connected", "healthy")
+
+    def __init__(self, client: AIAssistantClient):
+        self.client = client
+        self.connected = False
+        self.healthy = True
+
 
 class AIClientService:
     """
     Сервис для взаимодействия с AI через gRPC
+
+    Запросы распределяются по кругу между pool_size каналами. Каждая попытка
+    ограничена call_timeout. При временных ошибках (UNAVAILABLE,
+    RESOURCE_EXHAUSTED, ABORTED, обрыв соединения) канал отмечается
+    неисправным, а запрос повторяется на следующем канале после задержки
+    со случайным разбросом. Неисправные каналы переподключаются в фоне
+    раз в health_check_interval и до этого не выбираются.
+
+    Исходы вызовов (с учетом повторов) отслеживает CircuitBreaker: пока
+    AI сервис деградировал, запросы сразу отклоняются с AICircuitOpenError,
+    а не ждут своей ошибки.
     """
 
-    def __init__(self):
-        # Инициализация с указанными параметрами (хост ai_grpc_service и порт 50051)
-        self.client = AIAssistantClient(
-            host=settings.ai_service.host, port=settings.ai_service.port
+    def __init__(self, pool_size: int | None = None):
+        ai_settings = settings.ai_service
+        self.pool_size = max(pool_size or ai_settings.pool_size, 1)
+        self.call_timeout = ai_settings.call_timeout
+        self.max_retries = ai_settings.max_retries
+        self.retry_base_delay = ai_settings.retry_base_delay
+        self.retry_max_delay = ai_settings.retry_max_delay
+        self.health_check_interval = ai_settings.health_check_interval
+        self.temperature = ai_settings.temperature
+        self.max_tokens = ai_settings.max_tokens
+
+        self.channels = [
+            _Channel(AIAssistantClient(host=ai_settings.host, port=ai_settings.port))
+            for _ in range(self.pool_size)
+        ]
+        self._next = 0
+        self._health_task: asyncio.Task | None = None
+        self._flights: dict[tuple, _Flight] = {}
+
+        circuit_settings = settings.ai_circuit_settings
+        self.breaker = CircuitBreaker(
+            window=circuit_settings.window,
+            min_calls=circuit_settings.min_calls,
+            failure_rate=circuit_settings.failure_rate,
+            slow_call_seconds=circuit_settings.slow_call_seconds,
+            open_seconds=circuit_settings.open_seconds,
+            half_open_calls=circuit_settings.half_open_calls,
         )
-        self.connected = False
+
+    @property
+    def connected(self) -> bool:
+        return any(channel.connected for channel in self.channels)
+
+    @property
+    def supports_streaming(self) -> bool:
+        """Есть ли в клиенте protos потоковый метод ai_chat_stream"""
+        return hasattr(self.channels[0].client, "ai_chat_stream")
 
     async def connect(self):
         """
-        Подключение к gRPC серверу
+        Подключение всех каналов к gRPC серверу
+
+        :raises AIServiceError: Если не подключился ни один канал
         """
+        await asyncio.gather(
+            *(self._connect(channel) for channel in self.channels),
+            return_exceptions=True,
+        )
         if not self.connected:
-            try:
-                await self.client.connect()
-                self.connected = True
-                logger.info("Подключение к AI gRPC серверу установлено")
-            except Exception as e:
-                logger.error(f"Ошибка подключения к AI gRPC серверу: {str(e)}")
-                raise
+            raise AIServiceError("AI gRPC сервер недоступен")
 
-    async def send_message(self, message: str) -> str:
+    async def send_message(
+        self,
+        message: str,
+        timeout: float | None = None,
+        temperature: float | None = None,
+        max_tokens: int | None = None,
+    ) -> str:
         """
         Отправка сообщения AI и получение ответа
 
+        Одновременные запросы с одинаковым нормализованным текстом и параметрами
+        ждут один вызов ai_chat. Вызов отменяется, только когда его перестали
+        ждать все запросы.
+
         :param message: Текст сообщения
+        :param timeout: Сколько секунд осталось до срока запроса, None — без срока.
+            По истечении запрос перестает ждать ответ, и если его больше никто
+            не ждет, вызов gRPC отменяется и AI сервис прекращает генерацию
+        :param temperature: Температура генерации, None — из настроек
+        :param max_tokens: Предел длины ответа в токенах, None — из настроек
         :return: Ответ AI
+        :raises AIServiceError: Если AI сервис недоступен или не вернул ответ
+        :raises AICircuitOpenError: Если вызовы AI временно отклоняются
+        :raises AIDeadlineExceededError: Если AI не ответил до срока
         """
-        try:
-            # Подключаемся к gRPC серверу, если еще не подключены
-            if not self.connected:
-                await self.connect()
-
-            # Создаем DTO для запроса
-            request = AIRequestDTO(
-                user_prompt=message,
-                temperature=0.7,  # Значение по умолчанию, можно настроить
-                max_tokens=2000,  # Значение по умолчанию, можно настроить
+        request = self._request(message, temperature, max_tokens)
+        key = (normalize_prompt(message), request.temperature, request.max_tokens)
+
+        flight = self._flights.get(key)
+        if flight is None:
+            # Отказ до создания вызова: к уже идущему вызову можно присоединиться
+            self.breaker.check()
+            flight = self._flights[key] = _Flight(
+                asyncio.create_task(self._call(request))
             )
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            AI_COALESCED.inc()
 
-            # Отправляем запрос и получаем ответ
-            logger.info(f"Отправка запроса к AI: {message[:50]}...")
-            response = await self.client.ai_chat(request)
-
-            # Проверяем ответ
-            if response:
-                logger.info(f"Получен ответ от AI: {response.assistant_reply[:50]}...")
-                return response.assistant_reply
-            else:
-                error_message = "AI не вернул ответ"
-                logger.error(error_message)
-                return (
-                    f"Извините, произошла ошибка при обработке запроса: {error_message}"
-                )
+        flight.waiters += 1
+        try:
+            # shield: таймаут или отмена одного запроса не отменяют общий вызов
+            return await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        except asyncio.TimeoutError as e:
+            logger.warning(f"AI не ответил за {timeout:.1f} с, срок запроса истек")
+            raise AIDeadlineExceededError("Срок запроса к AI истек") from e
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                self._forget(key, flight)
+                flight.task.cancel()
 
-        except Exception as e:
-            logger.error(f"Ошибка при отправке запроса к AI: {str(e)}")
-            # Пробуем переподключиться при ошибке
-            self.connected = False
+    async def stream_message(
+        self,
+        message: str,
+        timeout: float | None = None,
+        temperature: float | None = None,
+        max_tokens: int | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        Потоковая отправка сообщения AI: фрагменты ответа по мере генерации
 
-            # Возвращаем сообщение об ошибке
-            return f"Произошла ошибка: {str(e)}"
+        Если клиент protos не поддерживает потоковый ai_chat_stream, весь
+        ответ приходит одним фрагментом. Поток повторяется при временной
+        ошибке, только пока не получен первый фрагмент.
 
-        finally:
-            # Не закрываем соединение после каждого запроса для улучшения производительности
-            # Если нужно закрыть соединение, используйте:
-            # await self.client.close()
-            pass
+        :param message: Текст сообщения
+        :param timeout: Сколько секунд осталось до срока запроса, None — без срока
+        :param temperature: Температура генерации, None — из настроек
+        :param max_tokens: Предел длины ответа в токенах, None — из настроек
+        :return: Асинхронный итератор фрагментов текста ответа
+        :raises AIServiceError: Если AI сервис недоступен или не вернул ответ
+        :raises AICircuitOpenError: Если вызовы AI временно отклоняются
+        :raises AIDeadlineExceededError: Если ответ не завершен до срока
+        """
+        if not self.supports_streaming:
+            yield await self.send_message(
+                message, timeout=timeout, temperature=temperature, max_tokens=max_tokens
+            )
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        request = self._request(message, temperature, max_tokens)
+        async with self.breaker.call():
+            received = False
+            attempt = 0
+            while True:
+                channel = self._pick()
+                try:
+                    await self._connect(channel)
+                    logger.info(f"Потоковый запрос к AI: {message[:50]}...")
+                    stream = channel.client.ai_chat_stream(request).__aiter__()
+                    while True:
+                        remaining = None if deadline is None else deadline - loop.time()
+                        try:
+                            chunk = await asyncio.wait_for(anext(stream), remaining)
+                        except StopAsyncIteration:
+                            break
+                        if chunk.assistant_reply:
+                            received = True
+                            yield chunk.assistant_reply
+                    break
+
+                except asyncio.TimeoutError as e:
+                    logger.warning(
+                        f"AI не завершил ответ за {timeout:.1f} с, срок истек"
+                    )
+                    raise AIDeadlineExceededError("Срок запроса к AI истек") from e
+                except Exception as e:
+                    attempt += 1
+                    # Часть ответа уже отправлена клиенту, повтор ее бы продублировал
+                    retry = not received and self._should_retry(channel, e, attempt)
+                    if not retry:
+                        logger.error(f"Ошибка потокового запроса к AI: {str(e)}")
+                        raise AIServiceError(
+                            f"Ошибка потокового запроса к AI: {str(e)}"
+                        ) from e
+                    await self._backoff(attempt, deadline)
+
+            if not received:
+                logger.error("AI не вернул ответ")
+                raise AIServiceError("AI не вернул ответ")
 
     async def close(self):
         """
-        Закрытие соединения с gRPC сервером
+        Закрытие соединений с gRPC сервером
         """
-        if self.connected:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for channel in self.channels:
+            if not channel.connected:
+                continue
             try:
-                await self.client.close()
-                self.connected = False
-                logger.info("Соединение с AI gRPC сервером закрыто")
+                await channel.client.close()
+                channel.connected = False
             except Exception as e:
                 logger.error(
                     f"Ошибка при закрытии соединения с AI gRPC сервером: {str(e)}"
                 )
+        logger.info("Соединения с AI gRPC сервером закрыты")
+
+    def _request(
+        self, message: str, temperature: float | None, max_tokens: int | None
+    ) -> AIRequestDTO:
+        return AIRequestDTO(
+            user_prompt=message,
+            temperature=self.temperature if temperature is None else temperature,
+            max_tokens=self.max_tokens if max_tokens is None else max_tokens,
+        )
+
+    async def _call(self, request: AIRequestDTO) -> str:
+        """
+        Вызов ai_chat, общий для всех ожидающих его запросов
+
+        :param request: Запрос к AI
+        :return: Ответ AI
+        :raises AIServiceError: Если AI сервис недоступен или не вернул ответ
+        :raises AICircuitOpenError: Если вызовы AI временно отклоняются
+        """
+        async with self.breaker.call():
+            return await self._call_with_retries(request)
+
+    async def _call_with_retries(self, request: AIRequestDTO) -> str:
+        attempt = 0
+        while True:
+            channel = self._pick()
+            try:
+                await self._connect(channel)
+                logger.info(f"Отправка запроса к AI: {request.user_prompt[:50]}...")
+                response = await asyncio.wait_for(
+                    channel.client.ai_chat(request), self.call_timeout
+                )
+                break
+            except asyncio.TimeoutError as e:
+                logger.error(f"AI не ответил за {self.call_timeout:.0f} с")
+                raise AIServiceError("AI не ответил за отведенное время") from e
+            except Exception as e:
+                attempt += 1
+                if not self._should_retry(channel, e, attempt):
+                    logger.error(f"Ошибка при отправке запроса к AI: {str(e)}")
+                    raise AIServiceError(
+                        f"Ошибка при отправке запроса к AI: {str(e)}"
+                    ) from e
+                await self._backoff(attempt)
+
+        # Соединение не закрывается после каждого запроса для улучшения производительности
+        # Проверяем ответ
+        if not response:
+            logger.error("AI не вернул ответ")
+            raise AIServiceError("AI не вернул ответ")
+
+        logger.info(f"Получен ответ от AI: {response.assistant_reply[:50]}...")
+        return response.assistant_reply
+
+    def _forget(self, key: tuple, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _pick(self) -> _Channel:
+        # Следующий исправный канал по кругу, если исправных нет — просто следующий
+        for _ in range(self.pool_size):
+            channel = self.channels[self._next]
+            self._next = (self._next + 1) % self.pool_size
+            if channel.healthy:
+                return channel
+        return channel
+
+    async def _connect(self, channel: _Channel):
+        if channel.connected:
+            return
+        try:
+            await channel.client.connect()
+        except Exception as e:
+            logger.error(f"Ошибка подключения к AI gRPC серверу: {str(e)}")
+            raise
+        channel.connected = True
+        logger.info("Подключение к AI gRPC серверу установлено")
+
+    def _should_retry(self, channel: _Channel, error: Exception, attempt: int) -> bool:
+        reason = retry_reason(error)
+        if reason is None:
+            return False
+        # Канал переподключит проверка исправности
+        self._mark_unhealthy(channel)
+        if attempt > self.max_retries:
+            return False
+        AI_GRPC_RETRIES.labels(reason=reason).inc()
+        logger.warning(
+            f"Временная ошибка AI ({reason}), попытка {attempt + 1} "
+            f"из {self.max_retries + 1}"
+        )
+        return True
+
+    async def _backoff(self, attempt: int, deadline: float | None = None):
+        """
+        Пауза перед повтором: экспоненциальная с полным случайным разбросом,
+        чтобы повторы разных запросов не приходили на сервер одновременно
+
+        :param attempt: Номер неудачной попытки
+        :param deadline: Время цикла событий, позже которого повтор бесполезен
+        :raises AIDeadlineExceededError: Если пауза закончится после срока
+        """
+        delay = random.uniform(
+            0, min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1))
+        )
+        if deadline is not None and asyncio.get_running_loop().time() + delay >= (
+            deadline
+        ):
+            raise AIDeadlineExceededError("Срок запроса к AI истек")
+        await asyncio.sleep(delay)
+
+    def _mark_unhealthy(self, channel: _Channel):
+        if channel.healthy:
+            channel.healthy = False
+            self._update_health()
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_check())
+
+    async def _health_check(self):
+        """
+        Переподключение неисправных каналов, пока все не восстановятся
+        """
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            broken = [channel for channel in self.channels if not channel.healthy]
+            if not broken:
+                return
+            for channel in broken:
+                try:
+                    if channel.connected:
+                        channel.connected = False
+                        await channel.client.close()
+                    await self._connect(channel)
+                except Exception as e:
+                    logger.warning(f"Канал AI gRPC все еще недоступен: {str(e)}")
+                    continue
+                channel.healthy = True
+            self._update_health()
+
+    def _update_health(self):
+        AI_GRPC_HEALTHY_CHANNELS.set(sum(channel.healthy for channel in self.channels))
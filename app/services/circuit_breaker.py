@@ -0,0 +1,147 @@
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from metrics import AI_CIRCUIT_STATE, AI_CIRCUIT_TRANSITIONS
+from services.errors import AICircuitOpenError, AIServiceError
+
+logger = logging.getLogger(__name__)
+
+STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель вызовов AI
+
+    closed — вызовы проходят, их исходы копятся в окне из window последних
+    вызовов. Ошибка или ответ дольше slow_call_seconds считаются неудачей.
+    Когда в окне не меньше min_calls вызовов и доля неудач достигла
+    failure_rate, выключатель размыкается.
+
+    open — вызовы сразу отклоняются с AICircuitOpenError, пока не пройдет
+    open_seconds. Затем half_open: пропускается не больше half_open_calls
+    пробных вызовов одновременно. Если все они удачны — closed, первая
+    неудача снова размыкает выключатель.
+    """
+
+    def __init__(
+        self,
+        window: int,
+        min_calls: int,
+        failure_rate: float,
+        slow_call_seconds: float,
+        open_seconds: float,
+        half_open_calls: int,
+    ):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = "closed"
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        # Номер состояния: исходы вызовов, начатых до перехода, не учитываются
+        self._generation = 0
+        AI_CIRCUIT_STATE.set(STATE_VALUES[self.state])
+
+    @property
+    def retry_after(self) -> float:
+        """
+        Через сколько секунд выключатель пропустит пробный вызов
+        """
+        if self.state != "open":
+            return 0.0
+        return max(self._opened_at + self.open_seconds - time.monotonic(), 0.0)
+
+    def check(self):
+        """
+        Проверка, что вызов будет пропущен
+
+        :raises AICircuitOpenError: Если выключатель разомкнут или все пробные
+            вызовы уже выполняются
+        """
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                raise AICircuitOpenError(
+                    "AI сервис временно недоступен",
+                    retry_after=self.retry_after,
+                )
+            self._transition("half_open")
+        if self.state == "half_open" and self._probes >= self.half_open_calls:
+            raise AICircuitOpenError(
+                "AI сервис временно недоступен, идет проверка",
+                retry_after=self.open_seconds,
+            )
+
+    @asynccontextmanager
+    async def call(self) -> AsyncIterator[None]:
+        """
+        Вызов AI под контролем выключателя
+
+        AIServiceError внутри блока — неудача, отмена блока исход не меняет.
+
+        :raises AICircuitOpenError: Если вызов отклонен
+        """
+        self.check()
+        generation = self._generation
+        probe = self.state == "half_open"
+        if probe:
+            self._probes += 1
+        start = time.monotonic()
+        try:
+            yield
+        except AIServiceError:
+            self._record(False, probe, generation)
+            raise
+        except BaseException:
+            if probe and generation == self._generation:
+                self._probes -= 1
+            raise
+        else:
+            success = time.monotonic() - start < self.slow_call_seconds
+            self._record(success, probe, generation)
+
+    def _record(self, success: bool, probe: bool, generation: int):
+        if generation != self._generation:
+            return
+        if probe:
+            self._probes -= 1
+            if not success:
+                self._open()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_calls:
+                self._transition("closed")
+            return
+
+        if len(self._outcomes) == self._outcomes.maxlen and not self._outcomes[0]:
+            self._failures -= 1
+        self._outcomes.append(success)
+        if not success:
+            self._failures += 1
+        calls = len(self._outcomes)
+        if calls >= self.min_calls and self._failures >= self.failure_rate * calls:
+            self._open()
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._transition("open")
+
+    def _transition(self, state: str):
+        logger.warning(f"Выключатель вызовов AI: {self.state} → {state}")
+        AI_CIRCUIT_TRANSITIONS.labels(from_state=self.state, to_state=state).inc()
+        AI_CIRCUIT_STATE.set(STATE_VALUES[state])
+        self.state = state
+        self._generation += 1
+        self._probes = 0
+        self._probe_successes = 0
+        if state == "closed":
+            self._outcomes.clear()
+            self._failures = 0
@@ -28,3 +28,37 @@ class ParameterError(ServiceError):
     """Ошибка параметров запроса"""
 
     pass
+
+
+class ConflictError(ServiceError):
+    """Ошибка, когда запрос противоречит текущему состоянию объекта"""
+
+    pass
+
+
+class ServiceUnavailableError(ServiceError):
+    """Ошибка временной недоступности сервиса"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class AIServiceError(ServiceError):
+    """Ошибка запроса к AI сервису, запрос можно повторить позже"""
+
+    pass
+
+
+class AIDeadlineExceededError(ServiceError):
+    """Срок ответа на запрос к AI истек, повторять запрос незачем"""
+
+    pass
+
+
+class AICircuitOpenError(AIServiceError):
+    """Вызовы AI временно отклоняются выключателем, запрос нужно отложить"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        self.retry_after = retry_after
+        super().__init__(message)
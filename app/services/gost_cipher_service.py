@@ -4,6 +4,80 @@ import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
 
+class GostCfbEncryptor:
+    """
+    Потоковое шифрование в режиме CFB.
+
+    Результат последовательных вызовов update() и finalize() побайтно совпадает
+    с GostCipherService.encrypt_cfb() для той же конкатенации данных, поэтому
+    расшифровывается обычным decrypt_data().
+    """
+
+    def __init__(self, cipher: "GostCipherService", key: bytes, iv: bytes):
+        self._cipher = cipher
+        self._key = key
+        self._gamma = iv
+        self._tail = b""
+        self._header = iv
+        self.finalized = False
+
+    def update(self, data: bytes) -> bytes:
+        """
+        Шифрование очередной порции данных
+
+        Неполный последний блок придерживается до следующего вызова.
+
+        :param data: Открытые данные
+        :return: Шифротекст для всех полных блоков (с IV в первом вызове)
+        """
+        if self.finalized:
+            raise ValueError("Encryptor is already finalized")
+
+        buf = self._tail + data
+        full = len(buf) - len(buf) % 8
+        self._tail = buf[full:]
+
+        out = bytearray(self._header)
+        self._header = b""
+        for i in range(0, full, 8):
+            out += self._encrypt_block(buf[i : i + 8])
+        return bytes(out)
+
+    def copy(self) -> "GostCfbEncryptor":
+        """
+        Независимая копия шифратора с текущим состоянием
+
+        :return: Шифратор, продолжающий шифрование с той же позиции
+        """
+        clone = GostCfbEncryptor(self._cipher, self._key, self._gamma)
+        clone._tail = self._tail
+        clone._header = self._header
+        clone.finalized = self.finalized
+        return clone
+
+    def finalize(self) -> bytes:
+        """
+        Завершение шифрования
+
+        :return: Шифротекст для оставшегося неполного блока
+        """
+        if self.finalized:
+            return b""
+        self.finalized = True
+        out = self._header
+        self._header = b""
+        if self._tail:
+            out += self._encrypt_block(self._tail)
+            self._tail = b""
+        return out
+
+    def _encrypt_block(self, blk: bytes) -> bytes:
+        self._gamma = self._cipher.encrypt_block(self._gamma, self._key)
+        cx = bytes(b ^ s for b, s in zip(blk, self._gamma[: len(blk)]))
+        self._gamma = cx
+        return cx
+
+
 class GostCipherService:
     # S-блоки
     S_BOX = [
@@ -104,6 +178,21 @@ class GostCipherService:
             gamma = blk
         return bytes(out)
 
+    def cfb_encryptor(self, key: bytes, iv: bytes | None = None) -> GostCfbEncryptor:
+        """
+        Создание потокового шифратора CFB
+
+        :param key: Ключ шифрования
+        :param iv: Вектор инициализации (опционально)
+        :return: Шифратор, принимающий данные порциями
+        """
+        self._init_cipher(key)
+        if iv is None:
+            iv = os.urandom(8)
+        elif len(iv) != 8:
+            raise ValueError("IV must be 8 bytes")
+        return GostCfbEncryptor(self, key, iv)
+
     # Синхронные методы
     def encrypt_data(self, data: str | bytes, key: bytes) -> str | bytes:
         """
@@ -153,3 +242,16 @@ class GostCipherService:
         """
         loop = asyncio.get_running_loop()
         return await loop.run_in_executor(self._executor, self.decrypt_data, blob, key)
+
+    async def async_encrypt_chunk(
+        self, encryptor: GostCfbEncryptor, data: bytes
+    ) -> bytes:
+        """
+        Асинхронное шифрование очередной порции данных потоковым шифратором
+
+        :param encryptor: Потоковый шифратор
+        :param data: Открытые данные
+        :return: Шифротекст для полных блоков
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, encryptor.update, data)
@@ -0,0 +1,63 @@
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from prometheus_client import Histogram
+
+
+class LatencyTracker:
+    """
+    Скользящее окно задержек по операциям
+
+    Хранит последние window замеров для каждой операции и считает по ним
+    перцентили. Замеры также публикуются в гистограмму Prometheus, если она задана.
+    """
+
+    def __init__(self, window: int = 200, histogram: Histogram | None = None):
+        self.window = window
+        self.histogram = histogram
+        self._samples: dict[str, deque[float]] = {}
+
+    def observe(self, operation: str, seconds: float):
+        """
+        Добавление замера
+
+        :param operation: Название операции
+        :param seconds: Длительность в секундах
+        """
+        samples = self._samples.get(operation)
+        if samples is None:
+            samples = self._samples[operation] = deque(maxlen=self.window)
+        samples.append(seconds)
+        if self.histogram is not None:
+            self.histogram.labels(operation=operation).observe(seconds)
+
+    def count(self, operation: str) -> int:
+        return len(self._samples.get(operation, ()))
+
+    def percentile(self, operation: str, q: float) -> float | None:
+        """
+        Перцентиль задержки операции по окну замеров
+
+        :param operation: Название операции
+        :param q: Перцентиль от 0 до 1
+        :return: Задержка в секундах или None, если замеров нет
+        """
+        samples = self._samples.get(operation)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        index = min(int(q * len(ordered)), len(ordered) - 1)
+        return ordered[index]
+
+    @asynccontextmanager
+    async def measure(self, operation: str) -> AsyncIterator[None]:
+        """
+        Замер длительности блока (замер не записывается, если блок упал)
+
+        :param operation: Название операции
+        """
+        start = time.monotonic()
+        yield
+        self.observe(operation, time.monotonic() - start)
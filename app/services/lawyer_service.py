@@ -1,4 +1,5 @@
 import datetime
+import logging
 
 from fastapi import Depends
 from lawly_db.db_models import LawyerRequest, Lawyer
@@ -18,13 +19,24 @@ if TYPE_CHECKING:
 
 from services.gost_cipher_service import GostCipherService
 from services.s3_service import S3Service
-from services.errors import AccessDeniedError, NotFoundError, ParameterError
+from services.memory_budget import document_memory_budget
+from services.upload_session_store import UploadSession, upload_sessions
+from services.errors import (
+    AccessDeniedError,
+    ConflictError,
+    NotFoundError,
+    ParameterError,
+    ServiceError,
+    ServiceUnavailableError,
+)
 from config import settings
 from repositories.lawyer_request_repository import LawyerRequestRepository
 from repositories.message_repository import MessageRepository
 from repositories.lawyer_repository import LawyerRepository
 from utils.notfication import notification
 
+logger = logging.getLogger(__name__)
+
 
 class LawyerService:
     def __init__(self, session: AsyncSession = Depends(get_session)):
@@ -82,35 +94,249 @@ class LawyerService:
         :raises ServiceError: В случае ошибки при загрузке документа
         """
         document_url = None
+        await self._check_consultations(user_id)
+        await self._write_off_consultation(user_id)
+
+        # Если есть документ, шифруем и загружаем его в S3
+        if document_bytes:
+            document_url = await self._encrypt_and_upload(document_bytes)
+
+        # Создаем заявку к юристу
+        lawyer_request = await self.lawyer_request_repo.create_lawyer_request(
+            user_id=user_id, message=description, document_url=document_url
+        )
+
+        return lawyer_request
+
+    async def create_upload_session(
+        self, user_id: int, description: str, total_size: int
+    ) -> UploadSession:
+        """
+        Создание сессии возобновляемой загрузки документа для заявки к юристу
+
+        Консультация только проверяется, списывается она при завершении загрузки.
+
+        :param user_id: ID пользователя
+        :param description: Описание заявки
+        :param total_size: Полный размер документа в байтах
+        :return: Созданная сессия загрузки
+        :raises ParameterError: Если размер документа недопустим
+        :raises AccessDeniedError: Если у пользователя закончились консультации
+        :raises ServiceUnavailableError: Если достигнут лимит активных загрузок
+        """
+        if not 0 < total_size <= settings.upload_settings.max_document_size:
+            raise ParameterError(
+                f"Размер документа должен быть от 1 до "
+                f"{settings.upload_settings.max_document_size} байт"
+            )
+
+        await self._abort_expired_uploads()
+        await self._check_consultations(user_id)
+
+        object_key, s3_upload_id = await self.s3_service.create_multipart_upload()
+        key = await self.get_encryption_key()
+        try:
+            return upload_sessions.create(
+                user_id=user_id,
+                description=description,
+                total_size=total_size,
+                object_key=object_key,
+                s3_upload_id=s3_upload_id,
+                encryptor=self.gost_cipher.cfb_encryptor(key),
+            )
+        except ServiceUnavailableError:
+            await self.s3_service.abort_multipart_upload(object_key, s3_upload_id)
+            raise
+
+    async def get_upload_session(self, user_id: int, upload_id: str) -> UploadSession:
+        """
+        Получение сессии загрузки пользователя
+
+        :param user_id: ID пользователя
+        :param upload_id: ID загрузки
+        :return: Сессия загрузки
+        :raises NotFoundError: Если сессия не найдена или истекла
+        :raises AccessDeniedError: Если сессия принадлежит другому пользователю
+        """
+        session = upload_sessions.get(upload_id)
+        if not session:
+            raise NotFoundError(f"Загрузка {upload_id} не найдена или истекла")
+        if session.user_id != user_id:
+            raise AccessDeniedError("Нет доступа к этой загрузке")
+        return session
+
+    async def upload_chunk(
+        self, user_id: int, upload_id: str, chunk_index: int, offset: int, data: bytes
+    ) -> UploadSession:
+        """
+        Прием очередной части документа
+
+        Часть сразу шифруется, а накопленный шифротекст отправляется в S3
+        частями составной загрузки. Повторная отправка уже принятой части
+        не меняет состояние сессии. Шифратор, смещение и номер части меняются
+        вместе, только когда часть принята: прерванный запрос можно повторить.
+
+        :param user_id: ID пользователя
+        :param upload_id: ID загрузки
+        :param chunk_index: Порядковый номер части (с 0)
+        :param offset: Смещение части в документе
+        :param data: Байты части
+        :return: Сессия загрузки с обновленным смещением
+        :raises ConflictError: Если номер или смещение части не совпадают с ожидаемыми
+        :raises ParameterError: Если часть пустая, слишком большая или выходит за размер документа
+        :raises ServiceUnavailableError: Если бюджет памяти для документов исчерпан
+            или отложенный шифротекст все еще не удается отправить в S3
+        """
+        session = await self.get_upload_session(user_id, upload_id)
+        part_size = settings.upload_settings.part_size
+
+        async with session.lock:
+            if (
+                chunk_index < session.next_chunk
+                and offset + len(data) <= session.offset
+            ):
+                return session
+
+            if chunk_index != session.next_chunk or offset != session.offset:
+                raise ConflictError(
+                    f"Ожидается часть {session.next_chunk} со смещения {session.offset}"
+                )
+            if not data or len(data) > settings.upload_settings.max_chunk_size:
+                raise ParameterError(
+                    f"Размер части должен быть от 1 до "
+                    f"{settings.upload_settings.max_chunk_size} байт"
+                )
+            if session.offset + len(data) > session.total_size:
+                raise ParameterError("Часть выходит за пределы размера документа")
+
+            if len(session.pending) >= part_size:
+                # Прошлая отправка в S3 не удалась: пока шифротекст не отправлен,
+                # новые части не принимаются, иначе он рос бы до размера документа
+                try:
+                    await self._flush_upload_part(session)
+                except ServiceError as e:
+                    raise ServiceUnavailableError(
+                        "Хранилище документов недоступно, повторите отправку части",
+                        retry_after=5,
+                    ) from e
+
+            # Часть и ее шифротекст. Шифруем копией шифратора: если запрос
+            # прервется, состояние сессии останется прежним
+            encryptor = session.encryptor.copy()
+            async with document_memory_budget.reserve(len(data) * 2):
+                ciphertext = await self.gost_cipher.async_encrypt_chunk(encryptor, data)
+            session.encryptor = encryptor
+            session.pending += ciphertext
+            session.offset += len(data)
+            session.next_chunk += 1
+
+            if len(session.pending) >= part_size:
+                try:
+                    await self._flush_upload_part(session)
+                except ServiceError as e:
+                    # Часть уже принята, шифротекст будет отправлен со следующей частью
+                    logger.warning(f"Отправка части в S3 отложена: {e.message}")
+
+        return session
+
+    async def complete_upload(self, user_id: int, upload_id: str) -> LawyerRequest:
+        """
+        Завершение загрузки и создание заявки к юристу
+
+        Консультация списывается до завершения загрузки в S3: если списать
+        ее не удалось, сессия остается, а в S3 не появляется документ без
+        заявки. Сессия удаляется только после создания заявки, так что при
+        ошибке S3 или базы данных запрос можно повторить: списанная
+        консультация и завершенная загрузка повторно не выполняются.
+
+        :param user_id: ID пользователя
+        :param upload_id: ID загрузки
+        :return: Созданный объект LawyerRequest
+        :raises ConflictError: Если документ получен не полностью
+        :raises AccessDeniedError: Если не удалось списать консультацию
+        :raises ServiceError: Если не удалось завершить загрузку в S3
+        """
+        session = await self.get_upload_session(user_id, upload_id)
+
+        async with session.lock:
+            # Параллельный запрос мог уже создать заявку
+            if upload_sessions.get(upload_id) is not session:
+                raise NotFoundError(f"Загрузка {upload_id} не найдена или истекла")
+            if not session.received_all:
+                raise ConflictError(
+                    f"Документ получен не полностью: {session.offset} из "
+                    f"{session.total_size} байт"
+                )
+
+            if not session.consultation_written_off:
+                await self._write_off_consultation(user_id)
+                session.consultation_written_off = True
+
+            if session.document_url is None:
+                session.pending += session.encryptor.finalize()
+                if session.pending:
+                    await self._flush_upload_part(session)
+
+                session.document_url = await self.s3_service.complete_multipart_upload(
+                    session.object_key, session.s3_upload_id, session.parts
+                )
+
+            lawyer_request = await self.lawyer_request_repo.create_lawyer_request(
+                user_id=user_id,
+                message=session.description,
+                document_url=session.document_url,
+            )
+            upload_sessions.remove(upload_id)
+
+        return lawyer_request
+
+    async def abort_upload(self, user_id: int, upload_id: str):
+        """
+        Отмена загрузки с удалением уже отправленных частей
+
+        :param user_id: ID пользователя
+        :param upload_id: ID загрузки
+        """
+        session = await self.get_upload_session(user_id, upload_id)
+        upload_sessions.remove(upload_id)
+        await self.s3_service.abort_multipart_upload(
+            session.object_key, session.s3_upload_id
+        )
+
+    async def _flush_upload_part(self, session: UploadSession):
+        part = await self.s3_service.upload_part(
+            session.object_key,
+            session.s3_upload_id,
+            len(session.parts) + 1,
+            bytes(session.pending),
+        )
+        session.parts.append(part)
+        session.pending.clear()
+
+    async def _abort_expired_uploads(self):
+        for session in upload_sessions.pop_expired():
+            await self.s3_service.abort_multipart_upload(
+                session.object_key, session.s3_upload_id
+            )
+
+    async def _check_consultations(self, user_id: int):
         user_service_client = UserServiceClient(
             host=settings.user_service.host, port=settings.user_service.port
         )
         sub_info = await user_service_client.get_user_info(user_id)
         if sub_info.consultations_used + 1 > sub_info.consultations_total:
             raise AccessDeniedError("У вас закончились консультации")
+
+    async def _write_off_consultation(self, user_id: int):
+        user_service_client = UserServiceClient(
+            host=settings.user_service.host, port=settings.user_service.port
+        )
         write_off_consultation = await user_service_client.write_off_consultation(
             user_id=user_id
         )
         if not write_off_consultation:
             raise AccessDeniedError("Не удалось списать консультацию")
 
-        # Если есть документ, шифруем и загружаем его в S3
-        if document_bytes:
-            key = await self.get_encryption_key()
-            document_bytes_obj = bytes(document_bytes)
-            encrypted_bytes = await self.gost_cipher.async_encrypt_data(
-                document_bytes_obj, key
-            )
-
-            document_url = await self.s3_service.upload_file(encrypted_bytes)
-
-        # Создаем заявку к юристу
-        lawyer_request = await self.lawyer_request_repo.create_lawyer_request(
-            user_id=user_id, message=description, document_url=document_url
-        )
-
-        return lawyer_request
-
     async def check_is_lawyer(self, user_id: int) -> bool:
         """
         Проверка, является ли пользователь юристом
@@ -183,13 +409,7 @@ class LawyerService:
             raise AccessDeniedError("Заявка не назначена этому юристу")
 
         if status == LawyerRequestStatusEnum.COMPLETED and document_bytes:
-            key = await self.get_encryption_key()
-            document_bytes_obj = bytes(document_bytes)
-            encrypted_bytes = await self.gost_cipher.async_encrypt_data(
-                document_bytes_obj, key
-            )
-
-            document_url = await self.s3_service.upload_file(encrypted_bytes)
+            document_url = await self._encrypt_and_upload(document_bytes)
             mes = await self.message_repo.create_user_lawyer_message(
                 user_id=request.user_id, content=description, document_url=document_url
             )
@@ -222,6 +442,7 @@ class LawyerService:
         :raises ParameterError: Если не указан ни lawyer_request_id, ни message_id
         :raises NotFoundError: Если заявка, сообщение или документ не найдены
         :raises AccessDeniedError: Если пользователь не имеет доступа к документу
+        :raises ServiceUnavailableError: Если бюджет памяти для документов исчерпан
         """
         if not lawyer_request_id and not message_id:
             raise ParameterError(
@@ -260,13 +481,38 @@ class LawyerService:
         if not document_url:
             raise NotFoundError("Документ не найден")
 
-        encrypted_bytes = await self.s3_service.download_file(document_url)
+        # Зашифрованные копии резервируются по размеру из ответа S3 (две, если
+        # ответили оба запроса при хеджировании), расшифрованная — после скачивания
+        async with document_memory_budget.reservation() as reservation:
+            encrypted_bytes = await self.s3_service.download_file(
+                document_url, reservation=reservation
+            )
+            await reservation.grow(len(encrypted_bytes))
 
-        key = await self.get_encryption_key()
-        document_bytes = await self.gost_cipher.async_decrypt_data(encrypted_bytes, key)
+            key = await self.get_encryption_key()
+            document_bytes = await self.gost_cipher.async_decrypt_data(
+                encrypted_bytes, key
+            )
 
         return document_bytes
 
+    async def _encrypt_and_upload(self, document_bytes: list[int]) -> str:
+        """
+        Шифрование документа и загрузка в S3
+
+        Память под документ резервирует DocumentBudgetRoute по размеру тела
+        запроса, еще до его разбора.
+
+        :param document_bytes: Байты документа
+        :return: URL загруженного документа
+        """
+        key = await self.get_encryption_key()
+        encrypted_bytes = await self.gost_cipher.async_encrypt_data(
+            bytes(document_bytes), key
+        )
+
+        return await self.s3_service.upload_file(encrypted_bytes)
+
     async def get_encryption_key(self) -> bytes:
         """
         Получение ключа шифрования из настроек
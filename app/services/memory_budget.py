@@ -0,0 +1,191 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from config import settings
+from metrics import (
+    BUDGET_BYTES_IN_USE,
+    BUDGET_CAPACITY,
+    BUDGET_REJECTIONS,
+    BUDGET_WAITERS,
+)
+from services.errors import ServiceUnavailableError
+
+logger = logging.getLogger(__name__)
+
+
+class ByteBudget:
+    """
+    Общий на процесс бюджет памяти для байтов документов
+
+    Работает как семафор с весом: каждый запрос резервирует объем, пропорциональный
+    размеру документа, и ждет в порядке очереди, пока бюджет не освободится.
+    Если ожидание превышает max_wait_seconds, запрос отклоняется с
+    ServiceUnavailableError.
+    """
+
+    def __init__(
+        self, capacity: int, max_wait_seconds: float, retry_after_seconds: int
+    ):
+        self.capacity = capacity
+        self.max_wait_seconds = max_wait_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.in_use = 0
+        self._waiters: deque[tuple[int, asyncio.Future]] = deque()
+        BUDGET_CAPACITY.set(capacity)
+
+    async def acquire(self, size: int) -> int:
+        """
+        Резервирование байтов в бюджете
+
+        Запрос больше всего бюджета ограничивается размером бюджета, чтобы он
+        мог выполниться в одиночку.
+
+        :param size: Объем резервирования в байтах
+        :return: Фактически зарезервированный объем (его нужно передать в release)
+        :raises ServiceUnavailableError: Если бюджет не освободился за max_wait_seconds
+        """
+        size = min(max(size, 0), self.capacity)
+
+        if not self._waiters and self.in_use + size <= self.capacity:
+            self._take(size)
+            return size
+
+        if self.max_wait_seconds <= 0:
+            self._reject(size)
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (size, future)
+        self._waiters.append(waiter)
+        BUDGET_WAITERS.set(len(self._waiters))
+        try:
+            await asyncio.wait_for(future, self.max_wait_seconds)
+            return size
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return size
+            self._remove_waiter(waiter)
+            self._reject(size)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(size)
+            else:
+                self._remove_waiter(waiter)
+            raise
+
+    def release(self, size: int):
+        """
+        Возврат байтов в бюджет
+
+        :param size: Объем, полученный из acquire
+        """
+        self.in_use -= size
+        BUDGET_BYTES_IN_USE.set(self.in_use)
+        self._wake_waiters()
+
+    @asynccontextmanager
+    async def reserve(self, size: int) -> AsyncIterator[int]:
+        """
+        Резервирование байтов на время выполнения блока
+
+        :param size: Объем резервирования в байтах
+        """
+        reserved = await self.acquire(size)
+        try:
+            yield reserved
+        finally:
+            self.release(reserved)
+
+    @asynccontextmanager
+    async def reservation(self) -> AsyncIterator["Reservation"]:
+        """
+        Резервирование, которое растет по мере того, как становятся известны
+        размеры данных, и возвращается целиком по выходе из блока
+        """
+        reservation = Reservation(self)
+        try:
+            yield reservation
+        finally:
+            reservation.release()
+
+    def _take(self, size: int):
+        self.in_use += size
+        BUDGET_BYTES_IN_USE.set(self.in_use)
+
+    def _reject(self, size: int):
+        BUDGET_REJECTIONS.inc()
+        logger.warning(
+            f"Бюджет памяти для документов исчерпан: занято {self.in_use} "
+            f"из {self.capacity} байт, запрошено {size}"
+        )
+        raise ServiceUnavailableError(
+            "Сервис перегружен, повторите запрос позже",
+            retry_after=self.retry_after_seconds,
+        )
+
+    def _remove_waiter(self, waiter: tuple[int, asyncio.Future]):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        BUDGET_WAITERS.set(len(self._waiters))
+        # Ушедший из головы очереди мог блокировать запросы поменьше
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        while self._waiters:
+            size, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.in_use + size > self.capacity:
+                break
+            self._waiters.popleft()
+            self._take(size)
+            future.set_result(None)
+        BUDGET_WAITERS.set(len(self._waiters))
+
+
+class Reservation:
+    """Растущее резервирование в бюджете памяти"""
+
+    def __init__(self, budget: ByteBudget):
+        self.budget = budget
+        self.size = 0
+
+    async def grow(self, size: int) -> int:
+        """
+        Дополнительное резервирование
+
+        :param size: Объем в байтах
+        :return: Фактически зарезервированный объем (его можно вернуть в shrink)
+        :raises ServiceUnavailableError: Если бюджет не освободился за max_wait_seconds
+        """
+        reserved = await self.budget.acquire(size)
+        self.size += reserved
+        return reserved
+
+    def shrink(self, size: int):
+        """
+        Возврат части резервирования до выхода из блока
+
+        :param size: Объем, полученный из grow
+        """
+        # После выхода из блока резервирование уже возвращено целиком
+        size = min(size, self.size)
+        self.size -= size
+        self.budget.release(size)
+
+    def release(self):
+        if self.size:
+            self.budget.release(self.size)
+            self.size = 0
+
+
+document_memory_budget = ByteBudget(
+    capacity=settings.memory_budget_settings.max_bytes,
+    max_wait_seconds=settings.memory_budget_settings.max_wait_seconds,
+    retry_after_seconds=settings.memory_budget_settings.retry_after_seconds,
+)
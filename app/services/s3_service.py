@@ -1,3 +1,6 @@
+import asyncio
+import contextlib
+import time
 import uuid
 import logging
 import aioboto3
@@ -5,7 +8,15 @@ from botocore.exceptions import ClientError
 from botocore.config import Config
 
 from config import settings
-from services.errors import NotFoundError, ServiceError
+from metrics import S3_HEDGED_REQUESTS, S3_OPERATION_SECONDS
+from services.errors import NotFoundError, ServiceError, ServiceUnavailableError
+from services.latency_tracker import LatencyTracker
+from services.memory_budget import Reservation
+
+# Общий на процесс трекер: S3Service создается на каждый запрос
+s3_latency = LatencyTracker(
+    window=settings.s3_settings.latency_window, histogram=S3_OPERATION_SECONDS
+)
 
 
 class S3Service:
@@ -23,6 +34,7 @@ class S3Service:
         )
         self.bucket_name = settings.s3_settings.bucket_name
         self.endpoint_url = settings.s3_settings.endpoint_url
+        self.latency = s3_latency
         self.logger = self._setup_logger()
 
     def _setup_logger(self):
@@ -85,12 +97,13 @@ class S3Service:
             client_params = self._get_client_config()
             async with self.session.client('s3', **client_params) as s3:
                 self.logger.info(f"Начинаем загрузку файла {file_name}")
-                await s3.put_object(
-                    Bucket=self.bucket_name,
-                    Key=file_name,
-                    Body=file_bytes,
-                    ContentType=content_type,
-                )
+                async with self.latency.measure("put_object"):
+                    await s3.put_object(
+                        Bucket=self.bucket_name,
+                        Key=file_name,
+                        Body=file_bytes,
+                        ContentType=content_type,
+                    )
                 self.logger.info(f"Файл {file_name} успешно загружен")
 
             # Получаем URL файла
@@ -104,40 +117,157 @@ class S3Service:
             self.logger.error(f"Неожиданная ошибка при загрузке файла {file_name}: {e}")
             raise ServiceError(f"Неожиданная ошибка при загрузке файла в S3: {str(e)}")
 
-    async def download_file(self, file_url: str) -> bytes:
+    async def create_multipart_upload(
+        self,
+        file_name: str | None = None,
+        content_type: str = "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ) -> tuple[str, str]:
+        """
+        Начало составной (multipart) загрузки файла
+
+        :param file_name: Опциональное имя файла, если не предоставлено, будет сгенерирован UUID
+        :param content_type: Тип содержимого файла
+        :return: Ключ объекта и ID составной загрузки
+        :raises ServiceError: В случае ошибки S3
+        """
+        if not file_name:
+            file_name = f"{uuid.uuid4()}.doc"
+
+        try:
+            client_params = self._get_client_config()
+            async with self.session.client('s3', **client_params) as s3:
+                async with self.latency.measure("create_multipart_upload"):
+                    response = await s3.create_multipart_upload(
+                        Bucket=self.bucket_name, Key=file_name, ContentType=content_type
+                    )
+                self.logger.info(f"Начата составная загрузка файла {file_name}")
+                return file_name, response['UploadId']
+        except Exception as e:
+            self.logger.error(f"Ошибка при создании составной загрузки: {e}")
+            raise ServiceError(f"Ошибка при создании составной загрузки в S3: {str(e)}")
+
+    async def upload_part(
+        self, file_name: str, upload_id: str, part_number: int, body: bytes
+    ) -> dict:
+        """
+        Загрузка очередной части составной загрузки
+
+        :param file_name: Ключ объекта
+        :param upload_id: ID составной загрузки
+        :param part_number: Номер части (с 1)
+        :param body: Байты части
+        :return: Описание части для complete_multipart_upload
+        :raises ServiceError: В случае ошибки S3
+        """
+        try:
+            client_params = self._get_client_config()
+            async with self.session.client('s3', **client_params) as s3:
+                async with self.latency.measure("upload_part"):
+                    response = await s3.upload_part(
+                        Bucket=self.bucket_name,
+                        Key=file_name,
+                        UploadId=upload_id,
+                        PartNumber=part_number,
+                        Body=body,
+                    )
+                return {"PartNumber": part_number, "ETag": response['ETag']}
+        except Exception as e:
+            self.logger.error(
+                f"Ошибка при загрузке части {part_number} файла {file_name}: {e}"
+            )
+            raise ServiceError(f"Ошибка при загрузке части файла в S3: {str(e)}")
+
+    async def complete_multipart_upload(
+        self, file_name: str, upload_id: str, parts: list[dict]
+    ) -> str:
+        """
+        Завершение составной загрузки
+
+        :param file_name: Ключ объекта
+        :param upload_id: ID составной загрузки
+        :param parts: Описания загруженных частей
+        :return: URL загруженного файла
+        :raises ServiceError: В случае ошибки S3
+        """
+        try:
+            client_params = self._get_client_config()
+            async with self.session.client('s3', **client_params) as s3:
+                async with self.latency.measure("complete_multipart_upload"):
+                    await s3.complete_multipart_upload(
+                        Bucket=self.bucket_name,
+                        Key=file_name,
+                        UploadId=upload_id,
+                        MultipartUpload={"Parts": parts},
+                    )
+                self.logger.info(f"Составная загрузка файла {file_name} завершена")
+        except Exception as e:
+            self.logger.error(f"Ошибка при завершении составной загрузки: {e}")
+            raise ServiceError(
+                f"Ошибка при завершении составной загрузки в S3: {str(e)}"
+            )
+
+        return await self.get_file_url(file_name)
+
+    async def abort_multipart_upload(self, file_name: str, upload_id: str):
+        """
+        Отмена составной загрузки с удалением загруженных частей
+
+        :param file_name: Ключ объекта
+        :param upload_id: ID составной загрузки
+        """
+        try:
+            client_params = self._get_client_config()
+            async with self.session.client('s3', **client_params) as s3:
+                await s3.abort_multipart_upload(
+                    Bucket=self.bucket_name, Key=file_name, UploadId=upload_id
+                )
+                self.logger.info(f"Составная загрузка файла {file_name} отменена")
+        except Exception as e:
+            self.logger.warning(f"Ошибка при отмене составной загрузки: {e}")
+
+    def _get_file_key(self, file_url: str) -> str:
+        """Извлекает ключ объекта из URL файла"""
+        if self.endpoint_url in file_url:
+            # Для presigned URL или path-style URL
+            file_key = file_url.split(f"{self.bucket_name}/")[1]
+            # Убираем параметры запроса, если они есть
+            if '?' in file_key:
+                file_key = file_key.split('?')[0]
+            return file_key
+        # Для virtual-hosted style URL
+        return file_url.split(f"{self.bucket_name}.s3.amazonaws.com/")[1]
+
+    async def download_file(
+        self, file_url: str, reservation: Reservation | None = None
+    ) -> bytes:
         """
         Скачивание файла из S3 хранилища
 
         :param file_url: URL файла в S3
+        :param reservation: Резервирование в бюджете памяти: каждый запрос
+            GET, в том числе хеджирующий, добавляет в него размер объекта
+            из ответа до чтения тела
         :return: Байты файла
         :raises ServiceError: В случае ошибки скачивания файла
         :raises NotFoundError: Если файл не найден
+        :raises ServiceUnavailableError: Если бюджет памяти исчерпан
         """
         try:
-            # Извлекаем ключ файла из URL
-            if self.endpoint_url in file_url:
-                # Для presigned URL или path-style URL
-                file_key = file_url.split(f"{self.bucket_name}/")[1]
-                # Убираем параметры запроса, если они есть
-                if '?' in file_key:
-                    file_key = file_key.split('?')[0]
-            else:
-                # Для virtual-hosted style URL
-                file_key = file_url.split(f"{self.bucket_name}.s3.amazonaws.com/")[1]
-
+            file_key = self._get_file_key(file_url)
             self.logger.info(f"Скачивание файла с ключом: {file_key}")
 
-            client_params = self._get_client_config()
-            async with self.session.client('s3', **client_params) as s3:
-                response = await s3.get_object(Bucket=self.bucket_name, Key=file_key)
+            if settings.s3_settings.hedge_enabled:
+                data = await self._hedged_get_object(file_key, reservation)
+            else:
+                data = await self._get_object(file_key, reservation=reservation)
 
-                async with response['Body'] as stream:
-                    data = await stream.read()
-                    self.logger.info(
-                        f"Файл {file_key} успешно скачан, размер: {len(data)} байт"
-                    )
-                    return data
+            self.logger.info(
+                f"Файл {file_key} успешно скачан, размер: {len(data)} байт"
+            )
+            return data
 
+        except ServiceUnavailableError:
+            raise
         except ClientError as e:
             error_code = e.response.get('Error', {}).get('Code', '')
             self.logger.error(f"Ошибка при скачивании файла: {e}")
@@ -152,6 +282,125 @@ class S3Service:
                 f"Неожиданная ошибка при скачивании файла из S3: {str(e)}"
             )
 
+    async def _get_object(
+        self,
+        file_key: str,
+        first_byte: asyncio.Event | None = None,
+        reservation: Reservation | None = None,
+    ) -> bytes:
+        """
+        Скачивание объекта с замером времени до первого байта
+
+        :param file_key: Ключ объекта
+        :param first_byte: Событие, которое выставляется при получении ответа
+        :param reservation: Резервирование, в которое добавляется размер объекта
+        :return: Байты объекта
+        """
+        start = time.monotonic()
+        client_params = self._get_client_config()
+        async with self.session.client('s3', **client_params) as s3:
+            response = await s3.get_object(Bucket=self.bucket_name, Key=file_key)
+            self.latency.observe("get_object_first_byte", time.monotonic() - start)
+            if first_byte is not None:
+                first_byte.set()
+
+            reserved = 0
+            if reservation is not None:
+                reserved = await reservation.grow(response['ContentLength'])
+            try:
+                async with response['Body'] as stream:
+                    data = await stream.read()
+            except BaseException:
+                # Копия отмененного или упавшего запроса в памяти не останется
+                if reserved:
+                    reservation.shrink(reserved)
+                raise
+
+        self.latency.observe("get_object", time.monotonic() - start)
+        return data
+
+    def _hedge_delay(self) -> float:
+        """
+        Задержка перед хеджирующим запросом: перцентиль недавнего времени до
+        первого байта, ограниченный сверху и снизу
+        """
+        s3_settings = settings.s3_settings
+        if self.latency.count("get_object_first_byte") < s3_settings.hedge_min_samples:
+            return s3_settings.hedge_max_delay
+        delay = self.latency.percentile(
+            "get_object_first_byte", s3_settings.hedge_percentile
+        )
+        return min(max(delay, s3_settings.hedge_min_delay), s3_settings.hedge_max_delay)
+
+    async def _hedged_get_object(
+        self, file_key: str, reservation: Reservation | None = None
+    ) -> bytes:
+        """
+        Скачивание объекта с хеджированием
+
+        Если первый запрос не получил первый байт за адаптивную задержку,
+        отправляется второй запрос того же ключа. Используется ответ, пришедший
+        первым, проигравший запрос отменяется.
+
+        Если отменяется первый запрос, так и не получивший первый байт, его
+        время до первого байта неизвестно, но не меньше прошедшего. Оно
+        записывается в замеры: иначе в окне остаются только быстрые ответы
+        и задержка хеджирования занижается как раз тогда, когда S3 медленнее.
+
+        :param file_key: Ключ объекта
+        :param reservation: Резервирование для копий объекта в памяти
+        :return: Байты объекта
+        """
+        start = time.monotonic()
+        first_byte = asyncio.Event()
+        primary = asyncio.create_task(
+            self._get_object(file_key, first_byte, reservation)
+        )
+        first_byte_wait = asyncio.create_task(first_byte.wait())
+        try:
+            await asyncio.wait(
+                {primary, first_byte_wait},
+                timeout=self._hedge_delay(),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        except BaseException:
+            # Вызывающий отменен: запрос не должен скачивать объект и
+            # резервировать память после освобождения резервирования
+            primary.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await primary
+            raise
+        finally:
+            first_byte_wait.cancel()
+
+        if first_byte.is_set() or primary.done():
+            return await primary
+
+        self.logger.info(f"Медленный ответ S3 для {file_key}, отправляем второй запрос")
+        hedge = asyncio.create_task(self._get_object(file_key, reservation=reservation))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        S3_HEDGED_REQUESTS.labels(
+                            outcome="won" if task is hedge else "lost"
+                        ).inc()
+                        return task.result()
+            # Оба запроса завершились ошибкой
+            return primary.result()
+        finally:
+            if primary in pending and not first_byte.is_set():
+                self.latency.observe("get_object_first_byte", time.monotonic() - start)
+            for task in pending:
+                task.cancel()
+            for task in pending:
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+
     async def check_bucket_exists(self) -> bool:
         """
         Проверяет существование бакета
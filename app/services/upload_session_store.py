@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from config import settings
+from services.errors import ServiceUnavailableError
+from services.gost_cipher_service import GostCfbEncryptor
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UploadSession:
+    """Состояние возобновляемой загрузки документа"""
+
+    upload_id: str
+    user_id: int
+    description: str
+    total_size: int
+    object_key: str
+    s3_upload_id: str
+    encryptor: GostCfbEncryptor
+    expires_at: float
+    offset: int = 0
+    next_chunk: int = 0
+    # Зашифрованные байты, еще не отправленные в S3 частью
+    pending: bytearray = field(default_factory=bytearray)
+    parts: list[dict] = field(default_factory=list)
+    # Консультация списана, повторное завершение загрузки ее не списывает
+    consultation_written_off: bool = False
+    # Загрузка в S3 завершена, осталось создать заявку
+    document_url: str | None = None
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def received_all(self) -> bool:
+        return self.offset == self.total_size
+
+
+class UploadSessionStore:
+    """
+    Хранилище сессий возобновляемой загрузки в памяти процесса
+
+    Число сессий ограничено, неактивные сессии истекают через session_ttl_seconds.
+    Сессия привязана к процессу, поэтому при нескольких репликах запросы одной
+    загрузки должны попадать на один и тот же процесс.
+    """
+
+    def __init__(self, max_sessions: int, ttl_seconds: int):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: dict[str, UploadSession] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(
+        self,
+        user_id: int,
+        description: str,
+        total_size: int,
+        object_key: str,
+        s3_upload_id: str,
+        encryptor: GostCfbEncryptor,
+    ) -> UploadSession:
+        """
+        Регистрация новой сессии загрузки
+
+        :raises ServiceUnavailableError: Если достигнут лимит одновременных сессий
+        """
+        if len(self._sessions) >= self.max_sessions:
+            raise ServiceUnavailableError(
+                "Слишком много активных загрузок, попробуйте позже",
+                retry_after=30,
+            )
+
+        session = UploadSession(
+            upload_id=uuid.uuid4().hex,
+            user_id=user_id,
+            description=description,
+            total_size=total_size,
+            object_key=object_key,
+            s3_upload_id=s3_upload_id,
+            encryptor=encryptor,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        self._sessions[session.upload_id] = session
+        return session
+
+    def get(self, upload_id: str) -> UploadSession | None:
+        """
+        Получение активной сессии с продлением срока жизни
+
+        :param upload_id: ID загрузки
+        :return: Сессия или None, если не найдена или истекла
+        """
+        session = self._sessions.get(upload_id)
+        if session is None:
+            return None
+        if session.expires_at <= time.monotonic():
+            return None
+        session.expires_at = time.monotonic() + self.ttl_seconds
+        return session
+
+    def remove(self, upload_id: str) -> UploadSession | None:
+        return self._sessions.pop(upload_id, None)
+
+    def pop_expired(self) -> list[UploadSession]:
+        """
+        Удаление истекших сессий
+
+        :return: Удаленные сессии, для которых нужно отменить загрузку в S3
+        """
+        now = time.monotonic()
+        expired = [s for s in self._sessions.values() if s.expires_at <= now]
+        for session in expired:
+            del self._sessions[session.upload_id]
+        if expired:
+            logger.info(f"Удалено истекших сессий загрузки: {len(expired)}")
+        return expired
+
+
+upload_sessions = UploadSessionStore(
+    max_sessions=settings.upload_settings.max_sessions,
+    ttl_seconds=settings.upload_settings.session_ttl_seconds,
+)
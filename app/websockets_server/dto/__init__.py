@@ -4,9 +4,14 @@ from .messages import (
     UserMessage,
     MessageReceivedConfirmation,
     AIResponseMessage,
+    AIResponseChunkMessage,
+    AIResponseDoneMessage,
+    AIRequestExpiredMessage,
+    CancelRequestMessage,
     ErrorMessage,
     RabbitMQAIRequest,
     RabbitMQAIResponse,
+    RabbitMQAICancel,
 )
 
 __all__ = [
@@ -15,7 +20,12 @@ __all__ = [
     "UserMessage",
     "MessageReceivedConfirmation",
     "AIResponseMessage",
+    "AIResponseChunkMessage",
+    "AIResponseDoneMessage",
+    "AIRequestExpiredMessage",
+    "CancelRequestMessage",
     "ErrorMessage",
     "RabbitMQAIRequest",
     "RabbitMQAIResponse",
+    "RabbitMQAICancel",
 ]
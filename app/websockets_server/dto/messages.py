@@ -41,12 +41,58 @@ class AIResponseMessage(WebSocketBaseMessage):
     content: str
 
 
+class AIResponseChunkMessage(WebSocketBaseMessage):
+    """
+    Очередной фрагмент ответа AI
+
+    Фрагменты идут по возрастанию seq. seq=0 начинает ответ заново: после
+    сбоя AI запрос повторяется, и ранее полученные фрагменты устаревают.
+    """
+
+    type: str = "ai_response_chunk"
+    message_id: str
+    user_id: int
+    content: str
+    seq: int
+
+
+class AIResponseDoneMessage(WebSocketBaseMessage):
+    """Ответ AI завершен, content — полный текст ответа"""
+
+    type: str = "ai_response_done"
+    message_id: str
+    user_id: int
+    content: str
+
+
+class CancelRequestMessage(WebSocketBaseMessage):
+    """Отмена запроса к AI клиентом, например после правки вопроса"""
+
+    type: str = "cancel"
+    message_id: str
+
+
+class AIRequestExpiredMessage(WebSocketBaseMessage):
+    """Запрос к AI не выполнен до истечения срока, клиент может отправить его снова"""
+
+    type: str = "ai_request_expired"
+    message_id: str
+
+
 class ErrorMessage(WebSocketBaseMessage):
-    """Сообщение об ошибке"""
+    """
+    Сообщение об ошибке
+
+    Для ошибок запроса к AI передается message_id. ai_unavailable значит, что
+    запрос сохранен и будет выполнен позже, retry_after — через сколько
+    секунд AI ожидается снова.
+    """
 
     type: str = "error"
     message: str
     error_code: Optional[str] = None
+    message_id: Optional[str] = None
+    retry_after: Optional[float] = None
 
 
 # Для RabbitMQ
@@ -56,6 +102,25 @@ class RabbitMQAIRequest(BaseModel):
     user_id: int
     message: str
     message_id: str
+    enqueued_at: Optional[float] = None
+    # Приоритетная полоса планировщика воркера. Источника приоритета (тарифа
+    # пользователя) в токене пока нет, поэтому запросы идут с приоритетом 0
+    priority: int = 0
+    # Время (unix), после которого ответ уже не нужен
+    deadline: Optional[float] = None
+
+
+class RabbitMQAICancel(BaseModel):
+    """
+    Отмена запросов к AI, рассылается всем воркерам
+
+    С message_id отменяется один запрос. Без него — все запросы пользователя,
+    поставленные в очередь не позже cancelled_at (пользователь отключился).
+    """
+
+    user_id: int
+    message_id: Optional[str] = None
+    cancelled_at: float = 0.0
 
 
 class RabbitMQAIResponse(BaseModel):
@@ -64,3 +129,9 @@ class RabbitMQAIResponse(BaseModel):
     user_id: int
     message_id: str
     content: str
+    type: str = "ai_response"
+    # Номер фрагмента для ai_response_chunk
+    seq: int = 0
+    # Код ошибки и через сколько секунд AI ожидается снова для error
+    error_code: Optional[str] = None
+    retry_after: Optional[float] = None
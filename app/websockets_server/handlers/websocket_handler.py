@@ -1,18 +1,20 @@
-import asyncio
 import json
 import logging
 from fastapi import WebSocket, WebSocketDisconnect, Depends, status
-from typing import Any
 
 from api.auth.auth_handler import decode_jwt
+from config import settings
 from repositories.message_repository import MessageRepository
 from websockets_server.services.connection_manager import ConnectionManager
+from websockets_server.services.outbox_relay import outbox_relay
+from websockets_server.services.presence_registry import presence_registry
 from websockets_server.services.rabbitmq_service import RabbitMQService
 from websockets_server.dto import (
     ConnectionStatusMessage,
     UserMessage,
     MessageReceivedConfirmation,
-    AIResponseMessage,
+    AIRequestExpiredMessage,
+    CancelRequestMessage,
     ErrorMessage,
 )
 from lawly_db.db_models.db_session import get_session
@@ -20,25 +22,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 logger = logging.getLogger(__name__)
 
-connection_manager = ConnectionManager()
 rabbitmq_service = RabbitMQService()
-
-
-async def handle_ai_response(data: dict[str, Any]):
-    """
-    Обработка ответа от AI
-
-    :param data: Данные ответа
-    """
-    user_id = data.get("user_id")
-    message_id = data.get("message_id")
-    content = data.get("content")
-
-    response = AIResponseMessage(
-        user_id=user_id, message_id=message_id, content=content
-    )
-
-    await connection_manager.send_message(response, user_id)
+# Одна подписка на ответы на пользователя, ответы получают все его сокеты
+connection_manager = ConnectionManager(rabbitmq_service)
 
 
 async def websocket_endpoint(
@@ -59,7 +45,7 @@ async def websocket_endpoint(
     user_id = payload["user_id"]
     logger.info(f"Авторизован пользователь ID: {user_id}")
 
-    # Устанавливаем соединение
+    # Устанавливаем соединение, первый сокет пользователя открывает подписку
     await connection_manager.connect(websocket, user_id)
     logger.info(f"Соединение установлено для пользователя {user_id}")
 
@@ -69,37 +55,49 @@ async def websocket_endpoint(
     # Подключаемся к RabbitMQ, если еще не подключены
     await rabbitmq_service.connect()
 
-    # Переменная для хранения задачи подписки
-    subscription_task = None
-
     try:
         # Отправляем подтверждение подключения
         status_message = ConnectionStatusMessage(status="connected", user_id=user_id)
         await websocket.send_json(status_message.dict())
 
-        # Запускаем слушателя ответов от AI
-        async def response_callback(data):
-            await handle_ai_response(data)
-
-        # Используем асинхронную задачу для прослушивания ответов
-        subscription_task = asyncio.create_task(
-            rabbitmq_service.listen_for_responses(user_id, response_callback)
-        )
+        # Запросы, просроченные пока пользователь был отключен, клиент может повторить
+        for expired_id in await presence_registry.pop_expired(user_id):
+            expired_message = AIRequestExpiredMessage(message_id=expired_id)
+            await websocket.send_json(expired_message.model_dump())
 
         while True:
             try:
                 data = await websocket.receive_json()
                 logger.info(f"Получены данные от клиента: {data}")
 
+                if data.get("type") == "cancel":
+                    # Отмену выполнит воркер, у которого запрос в очереди или в работе
+                    cancel_message = CancelRequestMessage(**data)
+                    await rabbitmq_service.send_ai_cancel(
+                        user_id, cancel_message.message_id
+                    )
+                    continue
+
                 user_message = UserMessage(**data)
 
                 if user_message.type == "user_message":
                     if not user_message.content:
                         continue
 
-                    stored_message = await message_repo.create_user_ai_message(
-                        user_id=user_id, content=user_message.content
-                    )
+                    if settings.outbox_settings.enabled:
+                        # Сообщение и запрос к AI фиксируются одной транзакцией,
+                        # публикует запрос релей исходящих
+                        stored_message = (
+                            await message_repo.create_user_ai_message_with_outbox(
+                                user_id=user_id,
+                                content=user_message.content,
+                            )
+                        )
+                        outbox_relay.notify()
+                    else:
+                        stored_message = await message_repo.create_user_ai_message(
+                            user_id=user_id, content=user_message.content
+                        )
                     message_id = str(stored_message.id)
 
                     confirmation = MessageReceivedConfirmation(
@@ -107,12 +105,12 @@ async def websocket_endpoint(
                     )
                     await websocket.send_json(confirmation.dict())
 
-                    # Отправляем запрос через RabbitMQ
-                    await rabbitmq_service.send_ai_request(
-                        user_id=user_id,
-                        message=user_message.content,
-                        message_id=message_id,
-                    )
+                    if not settings.outbox_settings.enabled:
+                        await rabbitmq_service.send_ai_request(
+                            user_id=user_id,
+                            message=user_message.content,
+                            message_id=message_id,
+                        )
 
             except WebSocketDisconnect:
                 logger.info(f"WebSocket отключен для пользователя {user_id}")
@@ -151,11 +149,5 @@ async def websocket_endpoint(
 
         logger.error(traceback.format_exc())
     finally:
-        if subscription_task and not subscription_task.done():
-            subscription_task.cancel()
-            try:
-                await subscription_task
-            except asyncio.CancelledError:
-                pass
-        connection_manager.disconnect(websocket, user_id)
+        await connection_manager.disconnect(websocket, user_id)
         logger.info(f"Соединение закрыто для пользователя {user_id}")
@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+
+from redis import asyncio as aioredis
+
+from config import settings
+from metrics import AI_RESPONSE_CACHE
+from services.ai_client_service import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+
+class AIResponseCache:
+    """
+    Кеш ответов AI по хешу нормализованного запроса
+
+    Одинаковые общие вопросы («как вернуть товар») разных пользователей
+    получают сохраненный ответ без запроса к AI. Записи живут ttl_seconds,
+    при переполнении вытесняется давно не использованная (LRU).
+
+    Кешируются только запросы без контекста диалога: ответ на них не
+    зависит от пользователя. Запросы длиннее max_prompt_chars почти
+    не повторяются и не кешируются.
+
+    Базовая реализация хранит записи в памяти процесса.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_prompt_chars: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_prompt_chars = max_prompt_chars
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, prompt: str) -> str | None:
+        """
+        Ключ кеша для запроса
+
+        :param prompt: Текст запроса
+        :return: Хеш нормализованного запроса или None, если запрос не кешируется
+        """
+        if len(prompt) > self.max_prompt_chars:
+            return None
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            return None
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    async def get(self, prompt: str) -> str | None:
+        """
+        Сохраненный ответ на запрос
+
+        :param prompt: Текст запроса
+        :return: Ответ AI или None, если его нет в кеше
+        """
+        key = self.key(prompt)
+        if key is None:
+            AI_RESPONSE_CACHE.labels(result="skip").inc()
+            return None
+
+        reply = self._get_local(key)
+        if reply is not None:
+            AI_RESPONSE_CACHE.labels(result="hit").inc()
+            return reply
+
+        reply = await self._get_shared(key)
+        if reply is not None:
+            AI_RESPONSE_CACHE.labels(result="shared_hit").inc()
+            self._set_local(key, reply)
+            return reply
+
+        AI_RESPONSE_CACHE.labels(result="miss").inc()
+        return None
+
+    async def set(self, prompt: str, reply: str):
+        """
+        Сохранение ответа AI
+
+        :param prompt: Текст запроса
+        :param reply: Ответ AI
+        """
+        key = self.key(prompt)
+        if key is None or not reply:
+            return
+        self._set_local(key, reply)
+        await self._set_shared(key, reply)
+
+    async def close(self):
+        """
+        Закрытие общего хранилища
+        """
+
+    def _get_local(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, reply = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return reply
+
+    def _set_local(self, key: str, reply: str):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, reply)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _get_shared(self, key: str) -> str | None:
+        return None
+
+    async def _set_shared(self, key: str, reply: str):
+        pass
+
+
+class RedisAIResponseCache(AIResponseCache):
+    """
+    Кеш ответов AI с общим уровнем в Redis
+
+    Кеш в памяти процесса остается первым уровнем, промах проверяется
+    в Redis (ключ chat:ai_cache:{хеш}), так что ответ, полученный одним
+    воркером, достается всем. Ошибки Redis не мешают запросу к AI.
+    """
+
+    def __init__(
+        self,
+        redis_url: str,
+        max_entries: int,
+        ttl_seconds: float,
+        max_prompt_chars: int,
+    ):
+        super().__init__(max_entries, ttl_seconds, max_prompt_chars)
+        self.redis = aioredis.from_url(redis_url)
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return f"chat:ai_cache:{key}"
+
+    async def close(self):
+        await self.redis.aclose()
+
+    async def _get_shared(self, key: str) -> str | None:
+        try:
+            reply = await self.redis.get(self._key(key))
+        except Exception as e:
+            logger.error(f"Ошибка чтения кеша ответов AI из Redis: {str(e)}")
+            return None
+        return None if reply is None else reply.decode()
+
+    async def _set_shared(self, key: str, reply: str):
+        try:
+            await self.redis.set(self._key(key), reply, px=int(self.ttl_seconds * 1000))
+        except Exception as e:
+            logger.error(f"Ошибка записи кеша ответов AI в Redis: {str(e)}")
+
+
+def create_ai_response_cache() -> AIResponseCache | None:
+    """
+    Создание кеша ответов AI по настройкам: None, если кеш выключен,
+    с уровнем в Redis, если задан ai_cache_redis_url
+    """
+    cache_settings = settings.ai_cache_settings
+    if not cache_settings.enabled or cache_settings.max_entries <= 0:
+        return None
+    if cache_settings.redis_url:
+        return RedisAIResponseCache(
+            redis_url=cache_settings.redis_url,
+            max_entries=cache_settings.max_entries,
+            ttl_seconds=cache_settings.ttl_seconds,
+            max_prompt_chars=cache_settings.max_prompt_chars,
+        )
+    return AIResponseCache(
+        max_entries=cache_settings.max_entries,
+        ttl_seconds=cache_settings.ttl_seconds,
+        max_prompt_chars=cache_settings.max_prompt_chars,
+    )
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+
+import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractMessage, AbstractRobustConnection
+from aio_pika.exceptions import AMQPError, DeliveryError
+from aio_pika.pool import Pool
+
+from config import settings
+from websockets_server.services.memory_broker import MemoryConnection, memory_broker
+
+logger = logging.getLogger(__name__)
+
+
+class AMQPConnectionManager:
+    """
+    Общее на процесс соединение с RabbitMQ
+
+    Держит одно устойчивое (robust) соединение, которое само восстанавливается
+    после обрыва, и пул каналов для публикации с подтверждениями брокера
+    (publisher confirms). Потребители открывают на этом соединении собственные
+    каналы через channel().
+
+    При transport="memory" вместо RabbitMQ используется брокер в памяти
+    процесса с тем же интерфейсом каналов, очередей и обменов.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        channel_pool_size: int,
+        confirm_timeout: float,
+        transport: str = "amqp",
+    ):
+        self.url = url
+        self.transport = transport
+        self.channel_pool_size = channel_pool_size
+        self.confirm_timeout = confirm_timeout
+        self.connection: AbstractRobustConnection | None = None
+        self.channel_pool: Pool[AbstractChannel] | None = None
+        self._lock = asyncio.Lock()
+
+    async def get_connection(self) -> AbstractRobustConnection:
+        """
+        Получение соединения, при первом вызове оно устанавливается
+
+        :return: Устойчивое соединение с RabbitMQ
+        """
+        if self.connection is not None and not self.connection.is_closed:
+            return self.connection
+
+        async with self._lock:
+            if self.connection is None or self.connection.is_closed:
+                if self.transport == "memory":
+                    self.connection = MemoryConnection(memory_broker)
+                else:
+                    self.connection = await aio_pika.connect_robust(self.url)
+                self.channel_pool = Pool(
+                    self._open_publish_channel, max_size=self.channel_pool_size
+                )
+                logger.info(
+                    f"Общее соединение с брокером установлено ({self.transport})"
+                )
+        return self.connection
+
+    async def channel(self) -> AbstractChannel:
+        """
+        Открытие отдельного канала на общем соединении (закрывает вызывающий)
+
+        :return: Канал для объявления очередей и потребления
+        """
+        connection = await self.get_connection()
+        return await connection.channel()
+
+    async def publish(
+        self, message: AbstractMessage, routing_key: str, exchange_name: str = ""
+    ) -> bool:
+        """
+        Публикация сообщения с ожиданием подтверждения брокера
+
+        :param message: Сообщение
+        :param routing_key: Ключ маршрутизации
+        :param exchange_name: Имя обмена, пустая строка — обмен по умолчанию
+        :return: True, если брокер подтвердил прием сообщения
+        """
+        results = await self.publish_batch([(message, routing_key)], exchange_name)
+        return results[0]
+
+    async def publish_batch(
+        self, messages: list[tuple[AbstractMessage, str]], exchange_name: str = ""
+    ) -> list[bool]:
+        """
+        Публикация пачки сообщений на одном канале
+
+        Сообщения отправляются без ожидания друг друга, а подтверждения брокер
+        присылает пачками, поэтому пачка стоит примерно одного круга до брокера.
+
+        :param messages: Пары (сообщение, ключ маршрутизации)
+        :param exchange_name: Имя обмена, пустая строка — обмен по умолчанию
+        :return: Результат подтверждения для каждого сообщения в том же порядке
+        """
+        if not messages:
+            return []
+
+        await self.get_connection()
+        async with self.channel_pool.acquire() as channel:
+            if channel.is_closed:
+                await channel.reopen()
+            if exchange_name:
+                exchange = await channel.get_exchange(exchange_name, ensure=False)
+            else:
+                exchange = channel.default_exchange
+
+            results = await asyncio.gather(
+                *(
+                    exchange.publish(
+                        message, routing_key=routing_key, timeout=self.confirm_timeout
+                    )
+                    for message, routing_key in messages
+                ),
+                return_exceptions=True,
+            )
+
+        confirmed = []
+        for result in results:
+            if isinstance(result, DeliveryError):
+                logger.error(f"Брокер отклонил сообщение: {result}")
+                confirmed.append(False)
+            elif isinstance(result, (AMQPError, asyncio.TimeoutError, ConnectionError)):
+                logger.error(f"Сообщение не подтверждено брокером: {result!r}")
+                confirmed.append(False)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                confirmed.append(True)
+        return confirmed
+
+    async def close(self):
+        """
+        Закрытие пула каналов и соединения
+        """
+        if self.channel_pool is not None:
+            await self.channel_pool.close()
+            self.channel_pool = None
+        if self.connection is not None and not self.connection.is_closed:
+            await self.connection.close()
+            logger.info("Общее соединение с RabbitMQ закрыто")
+        self.connection = None
+
+    async def _open_publish_channel(self) -> AbstractChannel:
+        connection = await self.get_connection()
+        return await connection.channel(publisher_confirms=True)
+
+
+amqp_connection = AMQPConnectionManager(
+    url=settings.rabbitmq_settings.url,
+    channel_pool_size=settings.rabbitmq_settings.channel_pool_size,
+    confirm_timeout=settings.rabbitmq_settings.confirm_timeout,
+    transport=settings.rabbitmq_settings.transport,
+)
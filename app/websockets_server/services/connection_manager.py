@@ -1,7 +1,20 @@
+import asyncio
 import logging
+from typing import Any
+
 from fastapi import WebSocket
 
-from websockets_server.dto import WebSocketBaseMessage
+from config import settings
+from metrics import RESPONSE_SUBSCRIPTIONS, WEBSOCKET_CONNECTIONS
+from websockets_server.dto import (
+    AIRequestExpiredMessage,
+    AIResponseChunkMessage,
+    AIResponseDoneMessage,
+    AIResponseMessage,
+    ErrorMessage,
+    WebSocketBaseMessage,
+)
+from websockets_server.services.rabbitmq_service import RabbitMQService
 
 logger = logging.getLogger(__name__)
 
@@ -9,10 +22,32 @@ logger = logging.getLogger(__name__)
 class ConnectionManager:
     """
     Менеджер WebSocket соединений
+
+    Если передан rabbitmq_service, менеджер держит одну подписку на ответы AI
+    на пользователя: ее открывает первый сокет пользователя, закрывает
+    последний, а каждый ответ рассылается всем сокетам пользователя
+    (вкладкам и устройствам). Потребителей у брокера столько же, сколько
+    пользователей, а не сокетов. Пока подписка открыта, пользователь
+    зарегистрирован в реестре присутствия, по нему AI воркер отбрасывает
+    запросы отключившихся пользователей.
+
+    Когда закрыт последний сокет пользователя, его запросы к AI отменяются
+    (ai_worker_cancel_on_disconnect), если за cancel_grace_seconds он не
+    переподключился к этой реплике. Подключения к другим репликам видны только
+    через общий реестр присутствия; реестр в памяти процесса рассчитан на
+    одну реплику.
     """
 
-    def __init__(self):
+    def __init__(self, rabbitmq_service: RabbitMQService | None = None):
         self.active_connections: dict[int, list[WebSocket]] = {}
+        self.rabbitmq_service = rabbitmq_service
+        self.cancel_on_disconnect = settings.ai_worker_settings.cancel_on_disconnect
+        self.cancel_grace_seconds = settings.ai_worker_settings.cancel_grace_seconds
+        # Отложенные отмены запросов пользователей, закрывших последний сокет
+        self._pending_cancels: dict[int, asyncio.Task] = {}
+        self._subscriptions: dict[int, asyncio.Task] = {}
+        # Отменяемые подписки: новая подписка ждет, пока старая отпустит очередь
+        self._unsubscribing: dict[int, asyncio.Task] = {}
 
     async def connect(self, websocket: WebSocket, user_id: int):
         """
@@ -25,11 +60,21 @@ class ConnectionManager:
         if user_id not in self.active_connections:
             self.active_connections[user_id] = []
         self.active_connections[user_id].append(websocket)
+        WEBSOCKET_CONNECTIONS.inc()
         logger.info(f"Новое WebSocket соединение для пользователя {user_id}")
 
-    def disconnect(self, websocket: WebSocket, user_id: int):
+        # Пользователь вернулся до отмены своих запросов
+        pending_cancel = self._pending_cancels.pop(user_id, None)
+        if pending_cancel is not None:
+            pending_cancel.cancel()
+
+        if self.rabbitmq_service is not None and user_id not in self._subscriptions:
+            await self._subscribe(user_id)
+
+    async def disconnect(self, websocket: WebSocket, user_id: int):
         """
-        Закрытие соединения
+        Закрытие соединения, с последним соединением пользователя
+        закрывается и его подписка на ответы
 
         :param websocket: WebSocket соединение
         :param user_id: ID пользователя
@@ -37,11 +82,140 @@ class ConnectionManager:
         if user_id in self.active_connections:
             if websocket in self.active_connections[user_id]:
                 self.active_connections[user_id].remove(websocket)
+                WEBSOCKET_CONNECTIONS.dec()
             # Если это последнее соединение пользователя, удаляем запись
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
             logger.info(f"WebSocket соединение закрыто для пользователя {user_id}")
 
+        # Сокеты могли быть удалены раньше при ошибке отправки
+        if user_id not in self.active_connections:
+            await self._unsubscribe(user_id)
+            self._schedule_cancel(user_id)
+
+    def subscribers(self, user_id: int) -> int:
+        """
+        Число сокетов пользователя, получающих его ответы
+
+        :param user_id: ID пользователя
+        """
+        return len(self.active_connections.get(user_id, ()))
+
+    async def close(self):
+        """
+        Закрытие всех подписок на ответы
+        """
+        for task in self._pending_cancels.values():
+            task.cancel()
+        self._pending_cancels.clear()
+        for user_id in list(self._subscriptions):
+            await self._unsubscribe(user_id)
+
+    async def _subscribe(self, user_id: int):
+        previous = self._unsubscribing.get(user_id)
+        if previous is not None:
+            await asyncio.wait([previous])
+        if user_id in self._subscriptions or user_id not in self.active_connections:
+            return
+
+        async def deliver(data: dict[str, Any]):
+            await self._deliver_response(user_id, data)
+
+        self._subscriptions[user_id] = asyncio.create_task(
+            self.rabbitmq_service.listen_for_responses(user_id, deliver)
+        )
+        RESPONSE_SUBSCRIPTIONS.set(len(self._subscriptions))
+        try:
+            await self.rabbitmq_service.presence.register(user_id)
+        except Exception as e:
+            logger.error(f"Ошибка регистрации присутствия пользователя {user_id}: {e}")
+
+    async def _unsubscribe(self, user_id: int):
+        task = self._subscriptions.pop(user_id, None)
+        if task is None:
+            return
+        RESPONSE_SUBSCRIPTIONS.set(len(self._subscriptions))
+        try:
+            await self.rabbitmq_service.presence.unregister(user_id)
+        except Exception as e:
+            logger.error(f"Ошибка снятия присутствия пользователя {user_id}: {e}")
+
+        self._unsubscribing[user_id] = task
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if self._unsubscribing.get(user_id) is task:
+                del self._unsubscribing[user_id]
+
+    def _schedule_cancel(self, user_id: int):
+        if self.rabbitmq_service is None or not self.cancel_on_disconnect:
+            return
+        if user_id not in self._pending_cancels:
+            self._pending_cancels[user_id] = asyncio.create_task(
+                self._cancel_abandoned(user_id)
+            )
+
+    async def _cancel_abandoned(self, user_id: int):
+        """
+        Отмена запросов пользователя, не вернувшегося за cancel_grace_seconds
+
+        :param user_id: ID пользователя
+        """
+        try:
+            await asyncio.sleep(self.cancel_grace_seconds)
+        finally:
+            if self._pending_cancels.get(user_id) is asyncio.current_task():
+                del self._pending_cancels[user_id]
+        if user_id in self.active_connections:
+            return
+        presence = self.rabbitmq_service.presence
+        try:
+            # Пользователь может быть подключен к другой реплике
+            if presence.shared and await presence.is_online(user_id):
+                return
+            await self.rabbitmq_service.send_ai_cancel(user_id)
+        except Exception as e:
+            logger.error(f"Ошибка отмены запросов пользователя {user_id}: {e}")
+
+    async def _deliver_response(self, user_id: int, data: dict[str, Any]):
+        """
+        Рассылка ответа AI всем сокетам пользователя
+
+        :param user_id: ID пользователя, на которого оформлена подписка
+        :param data: Данные ответа
+        """
+        response_type = data.get("type")
+        message_id = data.get("message_id")
+        content = data.get("content")
+        if response_type == "ai_response_chunk":
+            response = AIResponseChunkMessage(
+                user_id=user_id,
+                message_id=message_id,
+                content=content,
+                seq=data.get("seq", 0),
+            )
+        elif response_type == "ai_response_done":
+            response = AIResponseDoneMessage(
+                user_id=user_id, message_id=message_id, content=content
+            )
+        elif response_type == "ai_request_expired":
+            response = AIRequestExpiredMessage(message_id=message_id)
+        elif response_type == "error":
+            response = ErrorMessage(
+                message=content,
+                error_code=data.get("error_code"),
+                message_id=message_id,
+                retry_after=data.get("retry_after"),
+            )
+        else:
+            response = AIResponseMessage(
+                user_id=user_id, message_id=message_id, content=content
+            )
+        await self.send_message(response, user_id)
+
     async def send_message(self, message: WebSocketBaseMessage, user_id: int):
         """
         Отправка сообщения пользователю
@@ -49,27 +223,31 @@ class ConnectionManager:
         :param message: Сообщение для отправки
         :param user_id: ID пользователя
         """
-        if user_id in self.active_connections:
-            disconnected = []
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_json(message.model_dump())
-                    logger.info(
-                        f"Сообщение типа {message.type} отправлено пользователю {user_id}"
-                    )
-                except Exception as e:
-                    logger.error(f"Ошибка отправки сообщения: {str(e)}")
-                    disconnected.append(connection)
-
-            for connection in disconnected:
-                if connection in self.active_connections[user_id]:
-                    self.active_connections[user_id].remove(connection)
-
-            if (
-                user_id in self.active_connections
-                and not self.active_connections[user_id]
-            ):
-                del self.active_connections[user_id]
+        connections = list(self.active_connections.get(user_id, ()))
+        if not connections:
+            return
+
+        # Медленная вкладка не задерживает остальные сокеты пользователя
+        payload = message.model_dump()
+        results = await asyncio.gather(
+            *(connection.send_json(payload) for connection in connections),
+            return_exceptions=True,
+        )
+
+        remaining = self.active_connections.get(user_id, [])
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка отправки сообщения: {str(result)}")
+                if connection in remaining:
+                    remaining.remove(connection)
+                    WEBSOCKET_CONNECTIONS.dec()
+        logger.info(
+            f"Сообщение типа {message.type} отправлено пользователю {user_id}, "
+            f"соединений: {len(connections)}"
+        )
+
+        if user_id in self.active_connections and not remaining:
+            del self.active_connections[user_id]
 
     async def broadcast(self, message: WebSocketBaseMessage):
         """
@@ -0,0 +1,429 @@
+import asyncio
+import itertools
+import logging
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable
+
+from aio_pika.abc import AbstractMessage
+from aio_pika.exceptions import ChannelNotFoundEntity, QueueEmpty
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Envelope:
+    """Сообщение в очереди брокера"""
+
+    body: bytes
+    content_type: str | None
+    headers: dict[str, Any]
+    message_id: str | None
+    expiration: float | None
+    timestamp: Any
+    type: str | None
+    exchange: str
+    routing_key: str
+    redelivered: bool = False
+    expire_handle: asyncio.TimerHandle | None = None
+
+
+@dataclass
+class _Consumer:
+    tag: str
+    callback: Callable
+    channel: "MemoryChannel"
+    unacked: int = 0
+
+
+@dataclass
+class _QueueState:
+    name: str
+    arguments: dict[str, Any]
+    auto_delete: bool
+    owner: "MemoryChannel | None"
+    messages: deque[_Envelope] = field(default_factory=deque)
+    consumers: list[_Consumer] = field(default_factory=list)
+
+
+class MemoryBroker:
+    """
+    Брокер сообщений в памяти процесса с семантикой RabbitMQ
+
+    Поддерживает то подмножество AMQP, которым пользуется сервис: обмен по
+    умолчанию, direct и fanout обмены, привязки по routing key, потребителей
+    с prefetch, подтверждения, возврат в очередь, x-message-ttl и expiration
+    сообщений с перекладыванием в x-dead-letter-exchange, auto_delete и
+    exclusive очереди. Сообщения не переживают перезапуск процесса.
+    """
+
+    def __init__(self):
+        self.queues: dict[str, _QueueState] = {}
+        self.exchanges: dict[str, str] = {}
+        # exchange -> routing_key -> имена очередей
+        self.bindings: dict[str, dict[str, set[str]]] = {}
+        self._tags = itertools.count(1)
+        self._tasks: set[asyncio.Task] = set()
+
+    def declare_queue(
+        self,
+        name: str,
+        arguments: dict[str, Any] | None,
+        auto_delete: bool,
+        owner: "MemoryChannel | None",
+    ) -> _QueueState:
+        if not name:
+            name = f"amq.gen-{uuid.uuid4().hex}"
+        state = self.queues.get(name)
+        if state is None:
+            state = _QueueState(
+                name=name,
+                arguments=dict(arguments or {}),
+                auto_delete=auto_delete,
+                owner=owner,
+            )
+            self.queues[name] = state
+        return state
+
+    def delete_queue(self, name: str):
+        state = self.queues.pop(name, None)
+        if state is None:
+            return
+        for envelope in state.messages:
+            if envelope.expire_handle:
+                envelope.expire_handle.cancel()
+        for routes in self.bindings.values():
+            for queue_names in routes.values():
+                queue_names.discard(name)
+
+    def declare_exchange(self, name: str, exchange_type: str):
+        self.exchanges.setdefault(name, exchange_type)
+        self.bindings.setdefault(name, {})
+
+    def bind(self, queue: str, exchange: str, routing_key: str):
+        if exchange not in self.exchanges:
+            raise ChannelNotFoundEntity(f"no exchange '{exchange}'")
+        self.bindings[exchange].setdefault(routing_key, set()).add(queue)
+
+    def unbind(self, queue: str, exchange: str, routing_key: str):
+        self.bindings.get(exchange, {}).get(routing_key, set()).discard(queue)
+
+    def publish(self, message: AbstractMessage, exchange: str, routing_key: str):
+        """
+        Маршрутизация сообщения в очереди (немаршрутизируемые сообщения теряются)
+        """
+        envelope = _Envelope(
+            body=message.body,
+            content_type=message.content_type,
+            headers=dict(message.headers or {}),
+            message_id=message.message_id,
+            expiration=_seconds(message.expiration),
+            timestamp=message.timestamp,
+            type=message.type,
+            exchange=exchange,
+            routing_key=routing_key,
+        )
+        self._route(envelope)
+
+    def _route(self, envelope: _Envelope):
+        exchange = envelope.exchange
+        if exchange == "":
+            queue_names = {envelope.routing_key}
+        elif exchange not in self.exchanges:
+            raise ChannelNotFoundEntity(f"no exchange '{exchange}'")
+        elif self.exchanges[exchange] == "fanout":
+            queue_names = set().union(*self.bindings[exchange].values())
+        else:
+            queue_names = self.bindings[exchange].get(envelope.routing_key, set())
+
+        for name in queue_names:
+            state = self.queues.get(name)
+            if state is None:
+                continue
+            copy = _Envelope(**{**envelope.__dict__, "headers": dict(envelope.headers)})
+            self._enqueue(state, copy)
+
+    def _enqueue(self, state: _QueueState, envelope: _Envelope, front: bool = False):
+        ttl = _seconds(state.arguments.get("x-message-ttl"), milliseconds=True)
+        expires = [t for t in (ttl, envelope.expiration) if t is not None]
+        if expires:
+            envelope.expire_handle = asyncio.get_running_loop().call_later(
+                min(expires), self._expire, state, envelope
+            )
+        if front:
+            state.messages.appendleft(envelope)
+        else:
+            state.messages.append(envelope)
+        self._deliver(state)
+
+    def _expire(self, state: _QueueState, envelope: _Envelope):
+        try:
+            state.messages.remove(envelope)
+        except ValueError:
+            return
+        self.dead_letter(state, envelope, reason="expired")
+
+    def dead_letter(self, state: _QueueState, envelope: _Envelope, reason: str):
+        exchange = state.arguments.get("x-dead-letter-exchange")
+        if exchange is None:
+            return
+        envelope.headers["x-first-death-reason"] = reason
+        envelope.headers["x-first-death-queue"] = state.name
+        envelope.exchange = exchange
+        envelope.routing_key = state.arguments.get(
+            "x-dead-letter-routing-key", envelope.routing_key
+        )
+        # TTL очереди-источника к сообщению больше не относится
+        envelope.expiration = None
+        envelope.expire_handle = None
+        envelope.redelivered = False
+        self._route(envelope)
+
+    def add_consumer(self, state: _QueueState, consumer: _Consumer):
+        state.consumers.append(consumer)
+        self._deliver(state)
+
+    def remove_consumer(self, state: _QueueState, tag: str):
+        state.consumers = [c for c in state.consumers if c.tag != tag]
+        if state.auto_delete and not state.consumers:
+            self.delete_queue(state.name)
+
+    def next_tag(self) -> str:
+        return f"ctag-{next(self._tags)}"
+
+    def _deliver(self, state: _QueueState):
+        while state.messages and state.consumers:
+            consumer = next(
+                (c for c in state.consumers if c.channel.has_capacity(c)), None
+            )
+            if consumer is None:
+                return
+            # Следующее сообщение достается следующему потребителю
+            state.consumers.remove(consumer)
+            state.consumers.append(consumer)
+
+            envelope = state.messages.popleft()
+            if envelope.expire_handle:
+                envelope.expire_handle.cancel()
+            consumer.unacked += 1
+            message = MemoryIncomingMessage(self, state, envelope, consumer)
+            task = asyncio.create_task(consumer.callback(message))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def settle(self, state: _QueueState, consumer: _Consumer | None):
+        if consumer is not None:
+            consumer.unacked -= 1
+        if state.name in self.queues:
+            self._deliver(state)
+
+
+class MemoryIncomingMessage:
+    """Доставленное сообщение с интерфейсом aio_pika.IncomingMessage"""
+
+    def __init__(
+        self,
+        broker: MemoryBroker,
+        state: _QueueState,
+        envelope: _Envelope,
+        consumer: _Consumer | None,
+    ):
+        self._broker = broker
+        self._state = state
+        self._envelope = envelope
+        self._consumer = consumer
+        self.processed = False
+
+        self.body = envelope.body
+        self.content_type = envelope.content_type
+        self.headers = envelope.headers
+        self.message_id = envelope.message_id
+        self.expiration = envelope.expiration
+        self.timestamp = envelope.timestamp
+        self.type = envelope.type
+        self.exchange = envelope.exchange
+        self.routing_key = envelope.routing_key
+        self.redelivered = envelope.redelivered
+
+    async def ack(self, multiple: bool = False):
+        self._settle()
+
+    async def nack(self, multiple: bool = False, requeue: bool = True):
+        self._settle()
+        if requeue:
+            self._envelope.redelivered = True
+            self._broker._enqueue(self._state, self._envelope, front=True)
+        else:
+            self._broker.dead_letter(self._state, self._envelope, reason="rejected")
+
+    async def reject(self, requeue: bool = False):
+        await self.nack(requeue=requeue)
+
+    @asynccontextmanager
+    async def process(
+        self, requeue: bool = False, ignore_processed: bool = False
+    ) -> AsyncIterator["MemoryIncomingMessage"]:
+        try:
+            yield self
+        except BaseException:
+            if not self.processed:
+                await self.reject(requeue=requeue)
+            raise
+        else:
+            if not self.processed:
+                await self.ack()
+
+    def _settle(self):
+        if self.processed:
+            raise RuntimeError("Сообщение уже подтверждено")
+        self.processed = True
+        self._broker.settle(self._state, self._consumer)
+
+
+class MemoryExchange:
+    def __init__(self, broker: MemoryBroker, name: str):
+        self._broker = broker
+        self.name = name
+
+    async def publish(
+        self, message: AbstractMessage, routing_key: str, **kwargs
+    ) -> None:
+        self._broker.publish(message, self.name, routing_key)
+
+
+class MemoryQueue:
+    def __init__(self, channel: "MemoryChannel", state: _QueueState):
+        self._channel = channel
+        self._broker = channel.broker
+        self._state = state
+        self.name = state.name
+
+    async def bind(self, exchange: MemoryExchange | str, routing_key: str = ""):
+        self._broker.bind(self.name, _exchange_name(exchange), routing_key)
+
+    async def unbind(self, exchange: MemoryExchange | str, routing_key: str = ""):
+        self._broker.unbind(self.name, _exchange_name(exchange), routing_key)
+
+    async def consume(self, callback: Callable, **kwargs) -> str:
+        tag = self._broker.next_tag()
+        consumer = _Consumer(tag=tag, callback=callback, channel=self._channel)
+        self._channel.consumers.append((self._state, tag))
+        self._broker.add_consumer(self._state, consumer)
+        return tag
+
+    async def cancel(self, consumer_tag: str, **kwargs):
+        self._broker.remove_consumer(self._state, consumer_tag)
+
+    async def get(
+        self, no_ack: bool = False, fail: bool = True, **kwargs
+    ) -> MemoryIncomingMessage | None:
+        if not self._state.messages:
+            if fail:
+                raise QueueEmpty()
+            return None
+        envelope = self._state.messages.popleft()
+        if envelope.expire_handle:
+            envelope.expire_handle.cancel()
+        message = MemoryIncomingMessage(self._broker, self._state, envelope, None)
+        if no_ack:
+            message.processed = True
+        return message
+
+    async def purge(self, **kwargs):
+        self._state.messages.clear()
+
+
+class MemoryChannel:
+    """Канал с интерфейсом aio_pika.Channel поверх MemoryBroker"""
+
+    def __init__(self, broker: MemoryBroker):
+        self.broker = broker
+        self.is_closed = False
+        self.prefetch_count = 0
+        self.consumers: list[tuple[_QueueState, str]] = []
+        self.default_exchange = MemoryExchange(broker, "")
+
+    def has_capacity(self, consumer: _Consumer) -> bool:
+        return not self.prefetch_count or consumer.unacked < self.prefetch_count
+
+    async def set_qos(self, prefetch_count: int = 0, **kwargs):
+        self.prefetch_count = prefetch_count
+
+    async def declare_queue(
+        self,
+        name: str = "",
+        *,
+        durable: bool = False,
+        exclusive: bool = False,
+        auto_delete: bool = False,
+        arguments: dict[str, Any] | None = None,
+        **kwargs,
+    ) -> MemoryQueue:
+        state = self.broker.declare_queue(
+            name, arguments, auto_delete, owner=self if exclusive else None
+        )
+        return MemoryQueue(self, state)
+
+    async def declare_exchange(
+        self, name: str, type: Any = "direct", **kwargs
+    ) -> MemoryExchange:
+        self.broker.declare_exchange(name, getattr(type, "value", type))
+        return MemoryExchange(self.broker, name)
+
+    async def get_exchange(self, name: str, ensure: bool = True) -> MemoryExchange:
+        if ensure and name not in self.broker.exchanges:
+            raise ChannelNotFoundEntity(f"no exchange '{name}'")
+        return MemoryExchange(self.broker, name)
+
+    async def reopen(self):
+        self.is_closed = False
+
+    async def close(self):
+        if self.is_closed:
+            return
+        self.is_closed = True
+        for state, tag in self.consumers:
+            self.broker.remove_consumer(state, tag)
+        self.consumers.clear()
+        for state in list(self.broker.queues.values()):
+            if state.owner is self:
+                self.broker.delete_queue(state.name)
+
+
+class MemoryConnection:
+    """Соединение с MemoryBroker с интерфейсом aio_pika.RobustConnection"""
+
+    def __init__(self, broker: MemoryBroker):
+        self.broker = broker
+        self.is_closed = False
+        self._channels: list[MemoryChannel] = []
+
+    async def channel(self, publisher_confirms: bool = True, **kwargs) -> MemoryChannel:
+        channel = MemoryChannel(self.broker)
+        self._channels.append(channel)
+        return channel
+
+    async def close(self):
+        self.is_closed = True
+        for channel in self._channels:
+            await channel.close()
+        self._channels.clear()
+
+
+def _exchange_name(exchange: MemoryExchange | str) -> str:
+    return exchange if isinstance(exchange, str) else exchange.name
+
+
+def _seconds(value: Any, milliseconds: bool = False) -> float | None:
+    if value is None:
+        return None
+    if hasattr(value, "total_seconds"):
+        return value.total_seconds()
+    seconds = float(value)
+    return seconds / 1000 if milliseconds else seconds
+
+
+# Один брокер на процесс: его делят все соединения, как реплики делят RabbitMQ
+memory_broker = MemoryBroker()
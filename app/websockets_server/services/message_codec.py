@@ -0,0 +1,90 @@
+from typing import TypeVar
+
+import msgpack
+from pydantic import BaseModel, ValidationError
+
+from config import settings
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+class MessageDecodeError(Exception):
+    """Тело сообщения брокера не удалось разобрать"""
+
+
+class JsonCodec:
+    """
+    JSON с именами полей, формат, который понимают все версии сервиса
+    """
+
+    content_type = "application/json"
+
+    def encode(self, model: BaseModel) -> bytes:
+        return model.model_dump_json().encode()
+
+    def decode(self, body: bytes, model_cls: type[ModelT]) -> ModelT:
+        try:
+            return model_cls.model_validate_json(body)
+        except ValidationError as e:
+            raise MessageDecodeError(str(e)) from e
+
+
+class MsgpackCodec:
+    """
+    Компактный msgpack: значения полей массивом в порядке объявления в схеме
+
+    Имена полей и тег type не передаются. Новые поля схемы можно добавлять
+    только в конец и только со значением по умолчанию, тогда сообщения
+    от старых отправителей по-прежнему разбираются.
+    """
+
+    content_type = "application/x-msgpack"
+
+    # Поля со значением, однозначно определяемым схемой сообщения
+    implied_fields = ("type",)
+
+    def encode(self, model: BaseModel) -> bytes:
+        return msgpack.packb(
+            [getattr(model, name) for name in self._fields(type(model))]
+        )
+
+    def decode(self, body: bytes, model_cls: type[ModelT]) -> ModelT:
+        try:
+            values = msgpack.unpackb(body)
+            if not isinstance(values, list):
+                raise MessageDecodeError("Ожидался массив значений полей")
+            return model_cls.model_validate(dict(zip(self._fields(model_cls), values)))
+        except (ValueError, msgpack.UnpackException) as e:
+            # ValidationError и ошибки формата msgpack наследуют ValueError
+            raise MessageDecodeError(str(e)) from e
+
+    def _fields(self, model_cls: type[BaseModel]) -> list[str]:
+        return [
+            name for name in model_cls.model_fields if name not in self.implied_fields
+        ]
+
+
+CODECS = {codec.content_type: codec for codec in (JsonCodec(), MsgpackCodec())}
+CODEC_NAMES = {"json": JsonCodec.content_type, "msgpack": MsgpackCodec.content_type}
+
+
+def get_codec(content_type: str | None) -> JsonCodec | MsgpackCodec:
+    """
+    Кодек для входящего сообщения по заголовку content_type
+
+    Сообщения без заголовка или с неизвестным типом считаются JSON,
+    так их публиковали все прежние версии сервиса.
+
+    :param content_type: Значение content_type сообщения
+    :return: Кодек
+    """
+    return CODECS.get(content_type or "", CODECS[JsonCodec.content_type])
+
+
+def get_publish_codec() -> JsonCodec | MsgpackCodec:
+    """
+    Кодек для исходящих сообщений из настройки rabbitmq_codec
+
+    :return: Кодек
+    """
+    return CODECS[CODEC_NAMES[settings.rabbitmq_settings.codec]]
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from lawly_db.db_models.db_session import create_session
+
+from config import settings
+from metrics import OUTBOX_LAG, OUTBOX_PUBLISHED
+from repositories.outbox_repository import OutboxRepository
+from websockets_server.dto import RabbitMQAIRequest
+from websockets_server.services.rabbitmq_service import RabbitMQService
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    """
+    Публикация исходящих запросов к AI из базы данных в RabbitMQ
+
+    Обработчик WebSocket только фиксирует сообщение вместе со строкой
+    исходящих и будит релей через notify(). Релей забирает строки пачками,
+    публикует пачку с подтверждениями брокера и отмечает подтвержденные
+    строки отправленными. Неподтвержденные остаются в исходящих и уходят
+    в следующем проходе, так что доставка — как минимум один раз.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        poll_interval: float,
+        retention_seconds: int,
+        rabbitmq_service: RabbitMQService | None = None,
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.rabbitmq_service = rabbitmq_service or RabbitMQService()
+        self._wakeup = asyncio.Event()
+        self._stopped = asyncio.Event()
+        self._last_purge: float | None = None
+
+    def notify(self):
+        """
+        Уведомление о новой строке исходящих после фиксации транзакции
+        """
+        self._wakeup.set()
+
+    async def relay_once(self) -> tuple[int, int]:
+        """
+        Публикация одной пачки исходящих
+
+        :return: Число выбранных строк и число подтвержденных брокером
+        """
+        async with create_session() as session:
+            outbox_repo = OutboxRepository(session)
+            rows = await outbox_repo.lock_unsent(self.batch_size)
+            if not rows:
+                await self._purge(outbox_repo)
+                return 0, 0
+
+            requests = [
+                RabbitMQAIRequest(
+                    user_id=row.user_id,
+                    message=row.message,
+                    message_id=str(row.message_id),
+                    enqueued_at=row.created_at.timestamp(),
+                    priority=row.priority,
+                )
+                for row in rows
+            ]
+            confirmed = await self.rabbitmq_service.send_ai_requests(requests)
+
+            sent_ids = [row.id for row, ok in zip(rows, confirmed) if ok]
+            failed_ids = [row.id for row, ok in zip(rows, confirmed) if not ok]
+            await outbox_repo.mark_sent(sent_ids)
+            await outbox_repo.mark_failed(failed_ids)
+            # Блокировки строк снимаются вместе с фиксацией
+            await session.commit()
+
+        now = time.time()
+        for row, ok in zip(rows, confirmed):
+            if ok:
+                OUTBOX_LAG.observe(max(now - row.created_at.timestamp(), 0))
+        OUTBOX_PUBLISHED.labels(result="confirmed").inc(len(sent_ids))
+        OUTBOX_PUBLISHED.labels(result="failed").inc(len(failed_ids))
+        if failed_ids:
+            logger.warning(
+                f"Брокер не подтвердил {len(failed_ids)} исходящих запросов к AI, "
+                f"повтор через {self.poll_interval} с"
+            )
+        return len(rows), len(sent_ids)
+
+    async def run(self):
+        """
+        Цикл релея до вызова stop()
+        """
+        logger.info("Релей исходящих запросов к AI запущен")
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            try:
+                selected, sent = await self.relay_once()
+            except Exception as e:
+                logger.error(f"Ошибка публикации исходящих запросов к AI: {str(e)}")
+                selected, sent = 0, 0
+
+            # Полная подтвержденная пачка — вероятно, в исходящих есть еще строки
+            if selected == self.batch_size and sent == selected:
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+        await self.rabbitmq_service.close()
+        logger.info("Релей исходящих запросов к AI остановлен")
+
+    def stop(self):
+        """
+        Остановка цикла релея
+        """
+        self._stopped.set()
+        self._wakeup.set()
+
+    async def _purge(self, outbox_repo: OutboxRepository):
+        # Чистка идет в простое и не чаще раза в час
+        now = time.monotonic()
+        if self._last_purge is not None and now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        before = datetime.now(timezone.utc) - timedelta(seconds=self.retention_seconds)
+        deleted = await outbox_repo.delete_sent_before(before)
+        if deleted:
+            logger.info(f"Удалено отправленных исходящих запросов к AI: {deleted}")
+
+
+outbox_relay = OutboxRelay(
+    batch_size=settings.outbox_settings.batch_size,
+    poll_interval=settings.outbox_settings.poll_interval,
+    retention_seconds=settings.outbox_settings.retention_seconds,
+)
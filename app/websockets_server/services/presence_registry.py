@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from redis import asyncio as aioredis
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Удаляет поля хеша KEYS[1], если их значения не изменились с момента чтения:
+# ARGV — пары (поле, прочитанное значение). Продленная за это время аренда
+# остается на месте.
+DELETE_UNCHANGED_SCRIPT = """
+local deleted = 0
+for i = 1, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        deleted = deleted + redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+return deleted
+"""
+
+
+class PresenceRegistry:
+    """
+    Реестр присутствия пользователей: user_id → узлы, держащие его сокеты
+
+    Узел записывает аренду (lease) на каждого подключенного пользователя и
+    продлевает все свои аренды одним heartbeat раз в heartbeat_seconds.
+    Если узел упал, его аренды истекают сами через lease_seconds.
+
+    Здесь же хранятся отметки о просроченных запросах к AI, чтобы сообщить
+    о них клиенту при переподключении.
+
+    Базовая реализация хранит аренды в памяти процесса и подходит только
+    для одного узла.
+    """
+
+    # Видят ли реестр другие процессы (отдельные AI воркеры, реплики API)
+    shared = False
+
+    def __init__(
+        self,
+        node_id: str,
+        lease_seconds: int,
+        heartbeat_seconds: int,
+        expired_ttl_seconds: int = 24 * 3600,
+    ):
+        self.node_id = node_id
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.expired_ttl_seconds = expired_ttl_seconds
+        self.local_users: set[int] = set()
+        self._heartbeat_task: asyncio.Task | None = None
+        self._leases: dict[int, dict[str, float]] = {}
+        self._expired: dict[int, dict[str, float]] = {}
+
+    async def register(self, user_id: int):
+        """
+        Регистрация пользователя на текущем узле
+
+        :param user_id: ID пользователя
+        """
+        self.local_users.add(user_id)
+        await self._write_leases([user_id])
+        self._ensure_heartbeat()
+
+    async def unregister(self, user_id: int):
+        """
+        Снятие пользователя с текущего узла
+
+        :param user_id: ID пользователя
+        """
+        self.local_users.discard(user_id)
+        await self._remove_lease(user_id)
+
+    async def get_nodes(self, user_id: int) -> list[str]:
+        """
+        Узлы, на которых пользователь сейчас подключен
+
+        :param user_id: ID пользователя
+        :return: Список ID узлов с действующей арендой
+        """
+        return await self._read_nodes(user_id)
+
+    async def is_online(self, user_id: int) -> bool:
+        """
+        Подключен ли пользователь хотя бы на одном узле
+
+        :param user_id: ID пользователя
+        """
+        return bool(await self.get_nodes(user_id))
+
+    async def mark_expired(self, user_id: int, message_id: str):
+        """
+        Отметка о запросе к AI, оставшемся без ответа
+
+        :param user_id: ID пользователя
+        :param message_id: ID сообщения пользователя
+        """
+        expires_at = time.time() + self.expired_ttl_seconds
+        self._expired.setdefault(user_id, {})[message_id] = expires_at
+
+    async def pop_expired(self, user_id: int) -> list[str]:
+        """
+        Извлечение отметок о просроченных запросах пользователя
+
+        :param user_id: ID пользователя
+        :return: ID сообщений в порядке отметки
+        """
+        now = time.time()
+        marks = self._expired.pop(user_id, {})
+        return [message_id for message_id, expires in marks.items() if expires > now]
+
+    async def close(self):
+        """
+        Остановка heartbeat и снятие всех аренд узла
+        """
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        for user_id in list(self.local_users):
+            await self.unregister(user_id)
+
+    def _ensure_heartbeat(self):
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                await self._write_leases(list(self.local_users))
+            except Exception as e:
+                logger.error(f"Ошибка продления аренд присутствия: {str(e)}")
+
+    async def _write_leases(self, user_ids: list[int]):
+        expires_at = time.time() + self.lease_seconds
+        for user_id in user_ids:
+            self._leases.setdefault(user_id, {})[self.node_id] = expires_at
+
+    async def _remove_lease(self, user_id: int):
+        nodes = self._leases.get(user_id)
+        if nodes is not None:
+            nodes.pop(self.node_id, None)
+            if not nodes:
+                del self._leases[user_id]
+
+    async def _read_nodes(self, user_id: int) -> list[str]:
+        now = time.time()
+        nodes = self._leases.get(user_id, {})
+        return [node_id for node_id, expires in nodes.items() if expires > now]
+
+
+class RedisPresenceRegistry(PresenceRegistry):
+    """
+    Реестр присутствия в Redis, общий для всех реплик
+
+    На каждого пользователя хранится хеш chat:presence:{user_id} вида
+    {node_id: время истечения аренды}. Сам ключ живет не дольше двух сроков
+    аренды, так что записи ушедших пользователей удаляются без отдельной очистки.
+    Отметки о просроченных запросах — список chat:expired:{user_id}.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        redis_url: str,
+        node_id: str,
+        lease_seconds: int,
+        heartbeat_seconds: int,
+        expired_ttl_seconds: int = 24 * 3600,
+    ):
+        super().__init__(node_id, lease_seconds, heartbeat_seconds, expired_ttl_seconds)
+        self.redis = aioredis.from_url(redis_url)
+        self._delete_unchanged = self.redis.register_script(DELETE_UNCHANGED_SCRIPT)
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"chat:presence:{user_id}"
+
+    @staticmethod
+    def _expired_key(user_id: int) -> str:
+        return f"chat:expired:{user_id}"
+
+    async def mark_expired(self, user_id: int, message_id: str):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(self._expired_key(user_id), message_id)
+            pipe.expire(self._expired_key(user_id), self.expired_ttl_seconds)
+            await pipe.execute()
+
+    async def pop_expired(self, user_id: int) -> list[str]:
+        # Чтение и удаление одной транзакцией: отметку получит один сокет
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(self._expired_key(user_id), 0, -1)
+            pipe.delete(self._expired_key(user_id))
+            marks, _ = await pipe.execute()
+        return list(dict.fromkeys(mark.decode() for mark in marks))
+
+    async def close(self):
+        await super().close()
+        await self.redis.aclose()
+
+    async def _write_leases(self, user_ids: list[int]):
+        if not user_ids:
+            return
+        expires_at = time.time() + self.lease_seconds
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hset(self._key(user_id), self.node_id, expires_at)
+                pipe.expire(self._key(user_id), self.lease_seconds * 2)
+            await pipe.execute()
+
+    async def _remove_lease(self, user_id: int):
+        await self.redis.hdel(self._key(user_id), self.node_id)
+
+    async def _read_nodes(self, user_id: int) -> list[str]:
+        now = time.time()
+        leases = await self.redis.hgetall(self._key(user_id))
+        nodes, expired = [], []
+        for node_id, expires in leases.items():
+            if float(expires) > now:
+                nodes.append(node_id.decode())
+            else:
+                expired.extend((node_id, expires))
+        if expired:
+            # Узел мог продлить аренду между чтением и удалением
+            await self._delete_unchanged(keys=[self._key(user_id)], args=expired)
+        return nodes
+
+
+def create_presence_registry() -> PresenceRegistry:
+    """
+    Создание реестра присутствия по настройкам: Redis, если задан presence_redis_url,
+    иначе реестр в памяти процесса
+    """
+    presence_settings = settings.presence_settings
+    node_id = presence_settings.node_id or f"{socket.gethostname()}-{os.getpid()}"
+    if presence_settings.redis_url:
+        return RedisPresenceRegistry(
+            redis_url=presence_settings.redis_url,
+            node_id=node_id,
+            lease_seconds=presence_settings.lease_seconds,
+            heartbeat_seconds=presence_settings.heartbeat_seconds,
+            expired_ttl_seconds=presence_settings.expired_ttl_seconds,
+        )
+    return PresenceRegistry(
+        node_id=node_id,
+        lease_seconds=presence_settings.lease_seconds,
+        heartbeat_seconds=presence_settings.heartbeat_seconds,
+        expired_ttl_seconds=presence_settings.expired_ttl_seconds,
+    )
+
+
+presence_registry = create_presence_registry()
@@ -1,11 +1,24 @@
-import json
 import logging
+import time
 import aio_pika
 import asyncio
 from typing import Callable, Any, Optional, Dict
-from aio_pika import Connection, Channel, Queue, Message, ExchangeType
+from aio_pika import Channel, Queue, Message, ExchangeType
 
 from config import settings
+from services.errors import AICircuitOpenError
+from websockets_server.dto import (
+    RabbitMQAICancel,
+    RabbitMQAIRequest,
+    RabbitMQAIResponse,
+)
+from websockets_server.services.amqp_connection import amqp_connection
+from websockets_server.services.message_codec import (
+    MessageDecodeError,
+    get_codec,
+    get_publish_codec,
+)
+from websockets_server.services.presence_registry import presence_registry
 
 logger = logging.getLogger(__name__)
 
@@ -13,19 +26,43 @@ logger = logging.getLogger(__name__)
 class RabbitMQService:
     """
     Сервис для работы с RabbitMQ
+
+    Соединение общее на процесс (amqp_connection), публикация идет через его
+    пул каналов с подтверждениями брокера. Сервису принадлежит только канал
+    для объявления очередей и потребления.
     """
 
     def __init__(self):
-        self.connection: Optional[Connection] = None
+        self.amqp = amqp_connection
         self.channel: Optional[Channel] = None
         self.ai_request_queue: Optional[Queue] = None
         self.response_exchange = None
+        self.control_exchange = None
         self.callback_queue: Optional[Queue] = None
         self.processing = False
 
+        # Подписки и обработчик ждут этих событий, а не опрашивают флаги
+        self._closed = asyncio.Event()
+        self._processing_stopped = asyncio.Event()
+        # Запросы, полученные обработчиком и еще не подтвержденные
+        self._inflight = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+
+        # Режимы shared и node: одна очередь ответов на процесс
+        self.response_mode = settings.rabbitmq_settings.response_mode
+        self.presence = presence_registry
+        self.shared_response_queue: Optional[Queue] = None
+        self._shared_queue_lock = asyncio.Lock()
+        self._response_callbacks: dict[int, Callable[[dict[str, Any]], Any]] = {}
+        self._response_bindings: dict[int, int] = {}
+
         # Очереди и обмены
         self.ai_request_queue_name = "ai_request_queue"
         self.response_exchange_name = "ai_response_exchange"
+        # Управляющие сообщения воркерам (отмена запросов), получают все воркеры
+        self.control_exchange_name = "ai_control_exchange"
+        self.dead_letter_queue_name = "ai_request_dead_letter"
 
     async def connect(self) -> bool:
         """
@@ -33,15 +70,13 @@ class RabbitMQService:
 
         :return: Успешность подключения
         """
-        if self.connection and not self.connection.is_closed:
+        if self.channel and not self.channel.is_closed:
             return True
 
         try:
-            # Подключаемся к RabbitMQ
-            self.connection = await aio_pika.connect_robust(
-                settings.rabbitmq_settings.url
-            )
-            self.channel = await self.connection.channel()
+            # Открываем собственный канал на общем соединении процесса
+            self.channel = await self.amqp.channel()
+            self._closed.clear()
 
             # Создаем очередь запросов
             self.ai_request_queue = await self.channel.declare_queue(
@@ -53,6 +88,10 @@ class RabbitMQService:
                 self.response_exchange_name, ExchangeType.DIRECT, durable=True
             )
 
+            self.control_exchange = await self.channel.declare_exchange(
+                self.control_exchange_name, ExchangeType.FANOUT, durable=True
+            )
+
             logger.info("Подключение к RabbitMQ успешно установлено")
             return True
 
@@ -62,11 +101,14 @@ class RabbitMQService:
 
     async def close(self):
         """
-        Закрытие соединения с RabbitMQ
+        Закрытие канала сервиса (общее соединение закрывается при остановке приложения)
         """
-        if self.connection and not self.connection.is_closed:
-            await self.connection.close()
-            logger.info("Соединение с RabbitMQ закрыто")
+        self._closed.set()
+        self._processing_stopped.set()
+        if self.channel and not self.channel.is_closed:
+            await self.channel.close()
+            logger.info("Канал RabbitMQ закрыт")
+        self.shared_response_queue = None
 
     async def add_message_to_queue(
         self, user_id: int, message: str, message_id: str
@@ -83,7 +125,7 @@ class RabbitMQService:
         return await self.send_ai_request(user_id, message, message_id)
 
     async def send_ai_request(
-        self, user_id: int, message: str, message_id: str
+        self, user_id: int, message: str, message_id: str, priority: int = 0
     ) -> bool:
         """
         Отправка запроса к AI через RabbitMQ
@@ -91,35 +133,86 @@ class RabbitMQService:
         :param user_id: ID пользователя
         :param message: Сообщение для AI
         :param message_id: ID сообщения
+        :param priority: 1 — приоритетная полоса планировщика воркера
         :return: Успешность отправки
         """
+        request = RabbitMQAIRequest(
+            user_id=user_id,
+            message=message,
+            message_id=message_id,
+            enqueued_at=time.time(),
+            priority=priority,
+        )
+        confirmed = await self.send_ai_requests([request])
+        return confirmed[0]
+
+    async def send_ai_requests(self, requests: list[RabbitMQAIRequest]) -> list[bool]:
+        """
+        Отправка пачки запросов к AI с подтверждениями брокера
+
+        :param requests: Запросы
+        :return: Подтверждение брокера для каждого запроса в том же порядке
+        """
+        if not requests:
+            return []
         if not await self.connect():
             logger.error("Не удалось подключиться к RabbitMQ")
-            return False
+            return [False] * len(requests)
 
         try:
-            # Формируем данные для запроса
-            data = {"user_id": user_id, "message": message, "message_id": message_id}
-
-            # Создаем сообщение
-            message_body = json.dumps(data).encode()
-            rabbit_message = Message(
-                body=message_body,
-                content_type="application/json",
-                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
-            )
-
-            # Отправляем сообщение в очередь
-            await self.channel.default_exchange.publish(
-                rabbit_message, routing_key=self.ai_request_queue_name
-            )
-
-            logger.info(f"Запрос к AI отправлен, ID сообщения: {message_id}")
-            return True
+            codec = get_publish_codec()
+            messages = []
+            for request in self._stamp_deadlines(requests):
+                # Брокер сам удалит запрос, не дошедший до воркера в срок
+                expiration = None
+                if request.deadline is not None:
+                    expiration = max(request.deadline - time.time(), 0.001)
+                message = Message(
+                    body=codec.encode(request),
+                    content_type=codec.content_type,
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                    expiration=expiration,
+                )
+                messages.append((message, self.ai_request_queue_name))
+
+            # Брокер подтверждает пачку примерно за один круг
+            confirmed = await self.amqp.publish_batch(messages)
+
+            for request, ok in zip(requests, confirmed):
+                if ok:
+                    logger.info(
+                        f"Запрос к AI отправлен, ID сообщения: {request.message_id}"
+                    )
+            return confirmed
 
         except Exception as e:
             logger.error(f"Ошибка отправки запроса к AI: {str(e)}")
-            return False
+            return [False] * len(requests)
+
+    @staticmethod
+    def _stamp_deadlines(
+        requests: list[RabbitMQAIRequest],
+    ) -> list[RabbitMQAIRequest]:
+        """
+        Время постановки в очередь и срок ответа для запросов, где их нет
+
+        Срок отсчитывается от enqueued_at, то есть от записи сообщения
+        пользователем, а не от публикации.
+        """
+        ttl = settings.ai_worker_settings.request_ttl
+        now = time.time()
+        stamped = []
+        for request in requests:
+            enqueued_at = request.enqueued_at or now
+            deadline = request.deadline
+            if deadline is None and ttl > 0:
+                deadline = enqueued_at + ttl
+            stamped.append(
+                request.model_copy(
+                    update={"enqueued_at": enqueued_at, "deadline": deadline}
+                )
+            )
+        return stamped
 
     async def listen_for_responses(
         self, user_id: int, callback: Callable[[dict[str, Any]], Any]
@@ -134,6 +227,10 @@ class RabbitMQService:
             logger.error("Не удалось подключиться к RabbitMQ")
             return
 
+        if self.response_mode in ("shared", "node"):
+            await self._listen_shared(user_id, callback)
+            return
+
         try:
             # Создаем очередь для ответов пользователю
             user_queue_name = f"user_responses_{user_id}"
@@ -149,30 +246,233 @@ class RabbitMQService:
                 async with message.process():
                     try:
                         # Получаем данные из сообщения
-                        data = json.loads(message.body.decode())
+                        data = self._decode_response(message)
                         logger.info(f"Получен ответ от AI: {data}")
 
                         # Вызываем callback функцию с данными
                         await callback(data)
 
-                    except json.JSONDecodeError:
-                        logger.error(f"Ошибка декодирования JSON: {message.body}")
+                    except MessageDecodeError:
+                        logger.error(f"Ошибка декодирования сообщения: {message.body}")
                     except Exception as e:
                         logger.error(f"Ошибка обработки ответа: {str(e)}")
 
             # Начинаем прослушивание очереди
-            await user_queue.consume(process_message)
+            consumer_tag = await user_queue.consume(process_message)
+            logger.info(f"Начато прослушивание ответов для пользователя {user_id}")
+
+            # Ждем без пробуждений, пока задача не будет отменена или сервис закрыт
+            try:
+                await self._closed.wait()
+            finally:
+                await self._cancel_consumer(user_queue, consumer_tag)
+
+        except asyncio.CancelledError:
+            logger.info(f"Прослушивание ответов для пользователя {user_id} отменено")
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при настройке прослушивания ответов: {str(e)}")
+
+    async def listen_for_control(self, callback: Callable[[dict[str, Any]], Any]):
+        """
+        Прослушивание управляющих сообщений воркерам
+
+        У каждого воркера своя exclusive очередь, привязанная к fanout обмену,
+        так что отмену получают все воркеры, а выполняет тот, у кого запрос.
+
+        :param callback: Функция обработки сообщения об отмене
+        """
+        if not await self.connect():
+            logger.error("Не удалось подключиться к RabbitMQ")
+            return
+
+        try:
+            queue = await self.channel.declare_queue(exclusive=True)
+            await queue.bind(self.control_exchange, routing_key="")
+
+            async def process_message(message: aio_pika.IncomingMessage):
+                async with message.process():
+                    try:
+                        await callback(self._decode(message, RabbitMQAICancel))
+                    except MessageDecodeError:
+                        logger.error(f"Ошибка декодирования сообщения: {message.body}")
+                    except Exception as e:
+                        logger.error(f"Ошибка обработки отмены запроса: {str(e)}")
+
+            consumer_tag = await queue.consume(process_message)
+            try:
+                await self._closed.wait()
+            finally:
+                await self._cancel_consumer(queue, consumer_tag)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при настройке управляющих сообщений: {str(e)}")
+
+    async def send_ai_cancel(self, user_id: int, message_id: str | None = None) -> bool:
+        """
+        Отмена запросов к AI на всех воркерах
+
+        :param user_id: ID пользователя
+        :param message_id: ID сообщения, None — все запросы пользователя,
+            поставленные в очередь до этого момента
+        :return: Успешность отправки
+        """
+        if not await self.connect():
+            logger.error("Не удалось подключиться к RabbitMQ")
+            return False
+
+        cancel = RabbitMQAICancel(
+            user_id=user_id, message_id=message_id, cancelled_at=time.time()
+        )
+        codec = get_publish_codec()
+        message = Message(body=codec.encode(cancel), content_type=codec.content_type)
+        try:
+            confirmed = await self.amqp.publish(
+                message, routing_key="", exchange_name=self.control_exchange_name
+            )
+        except Exception as e:
+            logger.error(f"Ошибка отправки отмены запроса к AI: {str(e)}")
+            return False
+        logger.info(
+            f"Отмена запросов к AI: пользователь {user_id}, сообщение {message_id}"
+        )
+        return confirmed
+
+    @staticmethod
+    def _decode(
+        message: aio_pika.IncomingMessage,
+        model_cls: (
+            type[RabbitMQAIRequest] | type[RabbitMQAIResponse] | type[RabbitMQAICancel]
+        ),
+    ) -> dict[str, Any]:
+        """
+        Разбор тела сообщения кодеком, выбранным по content_type
+
+        :raises MessageDecodeError: Если тело не соответствует схеме
+        """
+        codec = get_codec(message.content_type)
+        return codec.decode(message.body, model_cls).model_dump()
+
+    def _decode_response(self, message: aio_pika.IncomingMessage) -> dict[str, Any]:
+        """
+        Разбор ответа, вид ответа передается свойством type сообщения
+
+        :raises MessageDecodeError: Если тело не соответствует схеме
+        """
+        data = self._decode(message, RabbitMQAIResponse)
+        if message.type:
+            data["type"] = message.type
+        return data
+
+    async def _cancel_consumer(self, queue: Queue, consumer_tag: str):
+        """
+        Отмена потребителя, чтобы брокер перестал доставлять сообщения
+        и мог удалить auto_delete очередь
+        """
+        if self.channel is None or self.channel.is_closed:
+            return
+        try:
+            await queue.cancel(consumer_tag)
+        except Exception as e:
+            logger.error(f"Ошибка отмены потребителя {consumer_tag}: {str(e)}")
+
+    async def _get_shared_response_queue(self) -> Queue:
+        """
+        Получение общей очереди ответов процесса с единственным потребителем
+        """
+        async with self._shared_queue_lock:
+            if self.shared_response_queue is None:
+                if self.response_mode == "node":
+                    # Очередь узла, ответы адресуются ей по реестру присутствия
+                    queue = await self.channel.declare_queue(
+                        f"chat_node_{self.presence.node_id}", exclusive=True
+                    )
+                    await queue.bind(
+                        self.response_exchange, routing_key=self._node_routing_key()
+                    )
+                else:
+                    # Имя выдает брокер, очередь удаляется вместе с соединением
+                    queue = await self.channel.declare_queue(exclusive=True)
+                await queue.consume(self._dispatch_response)
+                self.shared_response_queue = queue
+                logger.info(f"Создана общая очередь ответов {queue.name}")
+            return self.shared_response_queue
+
+    def _node_routing_key(self, node_id: str | None = None) -> str:
+        return f"node.{node_id or self.presence.node_id}"
+
+    async def _dispatch_response(self, message: aio_pika.IncomingMessage):
+        """
+        Передача ответа из общей очереди подписчику по user_id
+        """
+        async with message.process():
+            try:
+                data = self._decode_response(message)
+                callback = self._response_callbacks.get(data.get("user_id"))
+                if callback is None:
+                    logger.info(f"Нет подписчика для ответа: {data.get('user_id')}")
+                    return
+                await callback(data)
+            except MessageDecodeError:
+                logger.error(f"Ошибка декодирования сообщения: {message.body}")
+            except Exception as e:
+                logger.error(f"Ошибка обработки ответа: {str(e)}")
+
+    async def _listen_shared(
+        self, user_id: int, callback: Callable[[dict[str, Any]], Any]
+    ):
+        """
+        Подписка пользователя на общую очередь ответов процесса
+
+        При первой подписке пользователя создается привязка к обмену (shared)
+        или аренда в реестре присутствия (node), при последней — удаляется,
+        так что подключение не требует объявления очередей.
+
+        :param user_id: ID пользователя
+        :param callback: Функция обратного вызова для обработки ответов
+        """
+        self._response_callbacks[user_id] = callback
+        subscribers = self._response_bindings.get(user_id, 0)
+        self._response_bindings[user_id] = subscribers + 1
+
+        try:
+            queue = await self._get_shared_response_queue()
+            if subscribers == 0:
+                if self.response_mode == "node":
+                    await self.presence.register(user_id)
+                else:
+                    await queue.bind(self.response_exchange, routing_key=str(user_id))
             logger.info(f"Начато прослушивание ответов для пользователя {user_id}")
 
-            # Продолжаем бесконечно, пока задача не будет отменена
-            while True:
-                await asyncio.sleep(1)
+            await self._closed.wait()
 
         except asyncio.CancelledError:
             logger.info(f"Прослушивание ответов для пользователя {user_id} отменено")
             raise
         except Exception as e:
             logger.error(f"Ошибка при настройке прослушивания ответов: {str(e)}")
+        finally:
+            await self._release_shared_binding(user_id)
+
+    async def _release_shared_binding(self, user_id: int):
+        remaining = self._response_bindings.get(user_id, 1) - 1
+        if remaining > 0:
+            self._response_bindings[user_id] = remaining
+            return
+
+        self._response_bindings.pop(user_id, None)
+        self._response_callbacks.pop(user_id, None)
+        try:
+            if self.response_mode == "node":
+                await self.presence.unregister(user_id)
+            elif self.shared_response_queue is not None:
+                await self.shared_response_queue.unbind(
+                    self.response_exchange, routing_key=str(user_id)
+                )
+        except Exception as e:
+            logger.error(f"Ошибка при удалении привязки пользователя {user_id}: {e}")
 
     async def publish_response(self, user_id: int, message: Dict[str, Any]):
         """
@@ -188,11 +488,17 @@ class RabbitMQService:
         # Отправляем ответ через RabbitMQ
         await self.send_ai_response(user_id, message_id, content)
 
-    async def start_ai_worker(self, process_message: Callable[[dict[str, Any]], Any]):
+    async def start_ai_worker(
+        self,
+        process_message: Callable[[dict[str, Any]], Any],
+        prefetch_count: int | None = None,
+    ):
         """
         Запуск обработчика запросов к AI
 
         :param process_message: Функция обработки сообщений
+        :param prefetch_count: Сколько неподтвержденных запросов брокер выдает
+            этому воркеру, остальные достаются другим репликам
         """
         if not await self.connect():
             logger.error("Не удалось подключиться к RabbitMQ")
@@ -200,45 +506,225 @@ class RabbitMQService:
 
         try:
             self.processing = True
+            self._processing_stopped.clear()
 
-            # Функция для обработки сообщений из очереди запросов
-            async def on_message(message: aio_pika.IncomingMessage):
-                async with message.process():
-                    try:
-                        # Получаем данные из сообщения
-                        data = json.loads(message.body.decode())
-                        logger.info(f"Получен запрос к AI: {data}")
+            if prefetch_count is None:
+                prefetch_count = settings.ai_worker_settings.prefetch_count
+            await self.channel.set_qos(prefetch_count=prefetch_count)
 
-                        # Вызываем callback функцию с данными
-                        await process_message(data)
+            await self._declare_retry_topology()
 
-                    except json.JSONDecodeError:
-                        logger.error(f"Ошибка декодирования JSON: {message.body}")
-                    except Exception as e:
-                        logger.error(f"Ошибка обработки запроса: {str(e)}")
+            # Функция для обработки сообщений из очереди запросов
+            async def on_message(message: aio_pika.IncomingMessage):
+                self._inflight += 1
+                self._drained.clear()
+                try:
+                    await handle_message(message)
+                finally:
+                    self._inflight -= 1
+                    if not self._inflight:
+                        self._drained.set()
+
+            async def handle_message(message: aio_pika.IncomingMessage):
+                try:
+                    # Получаем данные из сообщения
+                    data = self._decode(message, RabbitMQAIRequest)
+                    logger.info(f"Получен запрос к AI: {data}")
+
+                    # Вызываем callback функцию с данными
+                    await process_message(data)
+
+                except MessageDecodeError as e:
+                    logger.error(f"Ошибка декодирования сообщения: {message.body}")
+                    # Повтор не поможет, сообщение сразу уходит в мертвые письма
+                    await self._retry_or_dead_letter(message, e, retry=False)
+                except AICircuitOpenError as e:
+                    # Запрос не дошел до AI, попытка не расходуется
+                    await self._retry_or_dead_letter(message, e, count_attempt=False)
+                except Exception as e:
+                    logger.error(f"Ошибка обработки запроса: {str(e)}")
+                    await self._retry_or_dead_letter(message, e)
+                else:
+                    await message.ack()
 
             # Начинаем прослушивание очереди запросов
-            await self.ai_request_queue.consume(on_message)
-            logger.info("AI Worker запущен")
+            consumer_tag = await self.ai_request_queue.consume(on_message)
+            logger.info(f"AI Worker запущен, prefetch_count={prefetch_count}")
 
-            # Продолжаем, пока не будет остановлено
+            # Ждем stop_processing или закрытия сервиса
             try:
-                while self.processing:
-                    await asyncio.sleep(1)
+                await self._processing_stopped.wait()
             except asyncio.CancelledError:
                 logger.info("AI Worker остановлен принудительно")
                 raise
+            finally:
+                # Новые запросы больше не принимаются, брокер отдаст их другим репликам
+                await self._cancel_consumer(self.ai_request_queue, consumer_tag)
+
+            await self._wait_inflight()
 
         except Exception as e:
             logger.error(f"Ошибка при запуске AI Worker: {str(e)}")
         finally:
             self.processing = False
 
+    def _retry_delays(self) -> list[float]:
+        """
+        Задержки перед повторными попытками, в секундах
+        """
+        worker_settings = settings.ai_worker_settings
+        return [
+            min(
+                worker_settings.retry_base_delay * 2**attempt,
+                worker_settings.retry_max_delay,
+            )
+            for attempt in range(worker_settings.max_attempts - 1)
+        ]
+
+    @staticmethod
+    def _retry_queue_name(delay: float) -> str:
+        # Задержка в имени: при смене настроек объявляется новая очередь,
+        # а не переобъявляется существующая с другим x-message-ttl
+        return f"ai_request_retry_{int(delay * 1000)}ms"
+
+    async def _declare_retry_topology(self):
+        """
+        Объявление очередей задержки и очереди мертвых писем
+
+        Сообщение в очереди задержки лежит x-message-ttl, после чего брокер
+        сам перекладывает его через обмен по умолчанию обратно в очередь
+        запросов, так что воркер не держит и не опрашивает отложенные запросы.
+        """
+        for delay in sorted(set(self._retry_delays())):
+            await self.channel.declare_queue(
+                self._retry_queue_name(delay),
+                durable=True,
+                arguments={
+                    "x-message-ttl": int(delay * 1000),
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": self.ai_request_queue_name,
+                },
+            )
+        await self.channel.declare_queue(self.dead_letter_queue_name, durable=True)
+
+    async def _retry_or_dead_letter(
+        self,
+        message: aio_pika.IncomingMessage,
+        error: Exception,
+        retry: bool = True,
+        count_attempt: bool = True,
+    ):
+        """
+        Перенос неудачного запроса в очередь задержки или мертвых писем
+
+        Номер попытки хранится в заголовке x-attempt. Исходное сообщение
+        подтверждается только после подтверждения брокером копии, иначе
+        возвращается в очередь.
+
+        :param count_attempt: false — запрос откладывается с той же задержкой,
+            не приближаясь к очереди мертвых писем
+        """
+        headers = dict(message.headers or {})
+        attempt = int(headers.get("x-attempt", 1))
+        next_attempt = attempt + 1 if count_attempt else attempt
+        delays = self._retry_delays()
+
+        delay = None
+        if retry and attempt <= len(delays):
+            delay = delays[attempt - 1]
+        elif retry and not count_attempt and delays:
+            delay = delays[-1]
+
+        if delay is not None:
+            routing_key = self._retry_queue_name(delay)
+            logger.warning(
+                f"Запрос к AI будет повторен через {delay} с, попытка {next_attempt}"
+            )
+        else:
+            routing_key = self.dead_letter_queue_name
+            logger.error(
+                f"Запрос отправлен в очередь мертвых писем после {attempt} попыток"
+            )
+
+        headers["x-attempt"] = next_attempt
+        headers["x-last-error"] = str(error)[:500]
+        copy = Message(
+            body=message.body,
+            content_type=message.content_type,
+            headers=headers,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        )
+        if await self.amqp.publish(copy, routing_key=routing_key):
+            await message.ack()
+        else:
+            await message.nack(requeue=True)
+
+    async def replay_dead_letters(self, limit: int | None = None) -> int:
+        """
+        Возврат запросов из очереди мертвых писем в очередь запросов
+
+        Счетчик попыток сбрасывается, так что каждый запрос снова получает
+        все max_attempts попыток.
+
+        :param limit: Максимальное число запросов, None — вся очередь
+        :return: Число возвращенных запросов
+        """
+        if not await self.connect():
+            logger.error("Не удалось подключиться к RabbitMQ")
+            return 0
+
+        queue = await self.channel.declare_queue(
+            self.dead_letter_queue_name, durable=True
+        )
+        replayed = 0
+        while limit is None or replayed < limit:
+            message = await queue.get(no_ack=False, fail=False)
+            if message is None:
+                break
+
+            headers = dict(message.headers or {})
+            headers.pop("x-attempt", None)
+            headers.pop("x-last-error", None)
+            copy = Message(
+                body=message.body,
+                content_type=message.content_type,
+                headers=headers,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            )
+            if not await self.amqp.publish(
+                copy, routing_key=self.ai_request_queue_name
+            ):
+                await message.nack(requeue=True)
+                break
+            await message.ack()
+            replayed += 1
+
+        logger.info(f"Возвращено запросов из очереди мертвых писем: {replayed}")
+        return replayed
+
+    async def _wait_inflight(self):
+        """
+        Ожидание уже полученных запросов, чтобы они были подтверждены до закрытия
+        канала. Не успевшие за shutdown_timeout брокер вернет в очередь.
+        """
+        if not self._inflight:
+            return
+        timeout = settings.ai_worker_settings.shutdown_timeout
+        logger.info(f"Ожидание завершения обрабатываемых запросов: {self._inflight}")
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Запросы не завершились за {timeout} с и будут возвращены в очередь: "
+                f"{self._inflight}"
+            )
+
     async def stop_processing(self):
         """
         Остановка обработки сообщений
         """
         self.processing = False
+        self._processing_stopped.set()
         logger.info("Запрошена остановка обработки очереди сообщений")
 
     async def send_ai_response(
@@ -252,31 +738,140 @@ class RabbitMQService:
         :param content: Содержимое ответа
         :return: Успешность отправки
         """
+        response = RabbitMQAIResponse(
+            user_id=user_id, message_id=message_id, content=content
+        )
+        return await self._send_response(response)
+
+    async def send_ai_chunk(
+        self, user_id: int, message_id: str, content: str, seq: int
+    ) -> bool:
+        """
+        Отправка фрагмента потокового ответа от AI
+
+        :param user_id: ID пользователя
+        :param message_id: ID сообщения
+        :param content: Текст фрагмента
+        :param seq: Номер фрагмента, начиная с 0
+        :return: Успешность отправки
+        """
+        response = RabbitMQAIResponse(
+            user_id=user_id,
+            message_id=message_id,
+            content=content,
+            type="ai_response_chunk",
+            seq=seq,
+        )
+        return await self._send_response(response)
+
+    async def send_ai_done(self, user_id: int, message_id: str, content: str) -> bool:
+        """
+        Завершение потокового ответа от AI
+
+        :param user_id: ID пользователя
+        :param message_id: ID сообщения
+        :param content: Полный текст ответа
+        :return: Успешность отправки
+        """
+        response = RabbitMQAIResponse(
+            user_id=user_id,
+            message_id=message_id,
+            content=content,
+            type="ai_response_done",
+        )
+        return await self._send_response(response)
+
+    async def send_ai_expired(self, user_id: int, message_id: str) -> bool:
+        """
+        Уведомление пользователя, что запрос к AI не выполнен в срок
+
+        :param user_id: ID пользователя
+        :param message_id: ID сообщения
+        :return: Успешность отправки
+        """
+        response = RabbitMQAIResponse(
+            user_id=user_id,
+            message_id=message_id,
+            content="",
+            type="ai_request_expired",
+        )
+        return await self._send_response(response)
+
+    async def send_ai_error(
+        self,
+        user_id: int,
+        message_id: str,
+        error_code: str,
+        content: str,
+        retry_after: float | None = None,
+    ) -> bool:
+        """
+        Уведомление пользователя об ошибке запроса к AI
+
+        :param user_id: ID пользователя
+        :param message_id: ID сообщения
+        :param error_code: Код ошибки
+        :param content: Текст ошибки для пользователя
+        :param retry_after: Через сколько секунд AI ожидается снова
+        :return: Успешность отправки
+        """
+        response = RabbitMQAIResponse(
+            user_id=user_id,
+            message_id=message_id,
+            content=content,
+            type="error",
+            error_code=error_code,
+            retry_after=retry_after,
+        )
+        return await self._send_response(response)
+
+    async def _send_response(self, response: RabbitMQAIResponse) -> bool:
+        """
+        Публикация ответа в обмен ответов
+
+        :param response: Ответ, его вид передается свойством type сообщения
+        :return: Успешность отправки
+        """
+        user_id = response.user_id
         if not await self.connect():
             logger.error("Не удалось подключиться к RabbitMQ")
             return False
 
         try:
-            # Формируем данные для ответа
-            data = {
-                "user_id": user_id,
-                "message_id": message_id,
-                "content": content,
-                "type": "ai_response",  # Добавляем тип сообщения для совместимости
-            }
-
             # Создаем сообщение
-            message_body = json.dumps(data).encode()
-            rabbit_message = Message(body=message_body, content_type="application/json")
-
-            # Отправляем сообщение в обмен с указанием routing_key = user_id
-            await self.response_exchange.publish(
-                rabbit_message, routing_key=str(user_id)
+            codec = get_publish_codec()
+            rabbit_message = Message(
+                body=codec.encode(response),
+                content_type=codec.content_type,
+                type=response.type,
             )
 
-            logger.info(
-                f"Ответ от AI отправлен, пользователь: {user_id}, ID сообщения: {message_id}"
+            if self.response_mode == "node":
+                # Отправляем ответ только узлам, где пользователь сейчас подключен
+                nodes = await self.presence.get_nodes(user_id)
+                if not nodes:
+                    logger.info(
+                        f"Пользователь {user_id} не подключен, ответ не отправляется"
+                    )
+                    return True
+                routing_keys = [self._node_routing_key(node_id) for node_id in nodes]
+            else:
+                # Отправляем сообщение в обмен с указанием routing_key = user_id
+                routing_keys = [str(user_id)]
+
+            confirmed = await self.amqp.publish_batch(
+                [(rabbit_message, routing_key) for routing_key in routing_keys],
+                exchange_name=self.response_exchange_name,
             )
+            if not all(confirmed):
+                return False
+
+            # Фрагменты потокового ответа идут десятками, их не логируем
+            if response.type != "ai_response_chunk":
+                logger.info(
+                    f"Ответ от AI отправлен, пользователь: {user_id}, "
+                    f"ID сообщения: {response.message_id}"
+                )
             return True
 
         except Exception as e:
@@ -49,14 +49,10 @@ async def subscribe_to_responses(user_id: int):
         async def response_callback(data):
             await handle_ai_response(data)
 
-        # Запускаем прослушивание ответов
-        await rabbitmq_service.listen_for_responses(user_id, response_callback)
+        # Прослушивание ответов держит задачу до ее отмены
         logger.info(f"Подписка на ответы запущена для пользователя {user_id}")
-
-        # Бесконечный цикл, чтобы задача не завершалась
         try:
-            while True:
-                await asyncio.sleep(1)
+            await rabbitmq_service.listen_for_responses(user_id, response_callback)
         except asyncio.CancelledError:
             logger.warning(f"Подписка на ответы для пользователя {user_id} отменена")
             raise
@@ -221,9 +217,6 @@ async def websocket_endpoint(
                     except Exception:
                         pass
 
-            # Даем возможность другим задачам выполниться
-            await asyncio.sleep(0.1)
-
     except WebSocketDisconnect as e:
         # При разрыве соединения отменяем задачу подписки
         logger.error(
@@ -1,3 +1,4 @@
 from .ai_worker import AIWorker
+from .fair_scheduler import FairScheduler
 
-__all__ = ["AIWorker"]
+__all__ = ["AIWorker", "FairScheduler"]
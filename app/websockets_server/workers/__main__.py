@@ -0,0 +1,36 @@
+"""
+Отдельный процесс AI воркера
+
+Запускает N процессов AIWorker независимо от API, так что пропускная
+способность AI и число WebSocket соединений масштабируются раздельно.
+Встроенный в API воркер при этом отключается через ai_worker_embedded=false.
+
+Запуск из каталога app:
+    python -m websockets_server.workers --processes 4 --concurrency 8
+
+SIGTERM/SIGINT останавливают прием новых запросов, уже полученные
+дорабатываются в пределах ai_worker_shutdown_timeout.
+"""
+
+import argparse
+import logging
+
+from config import settings
+from websockets_server.workers.runner import run_process, supervise
+
+if __name__ == "__main__":
+    worker_settings = settings.ai_worker_settings
+    parser = argparse.ArgumentParser(description="AI воркер чата")
+    parser.add_argument("--processes", type=int, default=worker_settings.processes)
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--prefetch", type=int, default=None)
+    parser.add_argument(
+        "--metrics-port", type=int, default=worker_settings.metrics_port
+    )
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_process(0, args.concurrency, args.prefetch, args.metrics_port)
+    else:
+        logging.basicConfig(level=logging.INFO)
+        supervise(args.processes, args.concurrency, args.prefetch, args.metrics_port)
@@ -1,12 +1,34 @@
 import asyncio
 import logging
-from typing import Any
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
 from lawly_db.db_models.db_session import create_session
 
+from config import settings
+from metrics import (
+    AI_CANCELLED,
+    AI_EXECUTION,
+    AI_EXPIRED,
+    AI_FIRST_CHUNK,
+    AI_INFLIGHT,
+    AI_QUEUE_WAIT,
+    AI_SHED,
+    AI_STREAM_CHUNKS,
+)
 from services.ai_client_service import AIClientService
+from services.errors import (
+    AICircuitOpenError,
+    AIDeadlineExceededError,
+    AIServiceError,
+)
 from repositories.message_repository import MessageRepository
+from websockets_server.services.ai_response_cache import create_ai_response_cache
 from websockets_server.services.rabbitmq_service import RabbitMQService
+from websockets_server.workers.concurrency_limiter import ConcurrencyLimiter, Sample
+from websockets_server.workers.context_builder import ContextBuilder
+from websockets_server.workers.fair_scheduler import FairScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -14,54 +36,428 @@ logger = logging.getLogger(__name__)
 class AIWorker:
     """
     Фоновый рабочий процесс для обработки запросов к AI
+
+    Брокер выдает воркеру не больше prefetch_count запросов, из них одновременно
+    выполняется не больше concurrency. Остальные ждут свободного слота
+    в FairScheduler, который чередует пользователей и выполняет запросы
+    одного пользователя строго по порядку.
+
+    Перед запросом к AI воркер проверяет срок запроса и, если реестр
+    присутствия общий, что пользователь еще подключен. Оставшееся до срока
+    время становится таймаутом запроса к AI. Просроченные запросы
+    отмечаются в реестре, клиент получит отметку при переподключении.
+
+    Ответ AI передается потоком: фрагменты копятся в коротком окне и уходят
+    в брокер кадрами ai_response_chunk, в конце — ai_response_done с полным
+    текстом. В базу данных сохраняется только итоговый текст.
+
+    Пока выключатель вызовов AI разомкнут, запросы не ждут своей ошибки:
+    клиент сразу получает кадр error с кодом ai_unavailable, а запрос
+    откладывается в очередь задержки. Ошибки AI не сохраняются как ответы.
+
+    Отмену запросов (кадр cancel или закрытие последнего сокета) воркер
+    получает через управляющий fanout обмен: еще не начатые запросы
+    пропускаются, у выполняющихся прерывается вызов AI.
+
+    Число слотов планировщика следует адаптивному пределу ConcurrencyLimiter:
+    предел растет, пока задержка AI близка к базовой, и падает при ее росте
+    или ошибках AI.
+
+    Вместе с сообщением AI получает последние реплики диалога в пределах
+    бюджета токенов, их собирает ContextBuilder. Ответы на запросы без
+    контекста берутся из кеша ответов AI, если такой вопрос уже задавали.
     """
 
-    def __init__(self):
+    def __init__(
+        self, concurrency: int | None = None, prefetch_count: int | None = None
+    ):
         self.rabbitmq_service = RabbitMQService()
         self.ai_client = AIClientService()
         self.running = False
 
+        worker_settings = settings.ai_worker_settings
+        self.concurrency = concurrency or worker_settings.concurrency
+        # Меньший prefetch оставил бы часть слотов пустыми
+        self.prefetch_count = max(
+            prefetch_count or worker_settings.prefetch_count, self.concurrency
+        )
+        self.cost_chars = worker_settings.cost_chars
+        self.scheduler = FairScheduler(
+            self.concurrency, priority_weight=worker_settings.priority_weight
+        )
+        self.limiter = None
+        limiter_settings = settings.ai_concurrency_settings
+        if limiter_settings.enabled:
+            self.limiter = ConcurrencyLimiter(
+                initial_limit=self.concurrency,
+                min_limit=limiter_settings.min_limit,
+                # Слоты сверх prefetch_count некому занять
+                max_limit=min(limiter_settings.max_limit, self.prefetch_count),
+                tolerance=limiter_settings.tolerance,
+                backoff_ratio=limiter_settings.backoff_ratio,
+                baseline_ttl=limiter_settings.baseline_ttl,
+            )
+        # Без потокового метода AI ответ пришел бы одним фрагментом и был бы
+        # отправлен клиенту дважды: фрагментом и в ai_response_done
+        self.streaming = worker_settings.streaming and self.ai_client.supports_streaming
+        self.stream_flush_interval = worker_settings.stream_flush_interval
+        self.stream_flush_chars = worker_settings.stream_flush_chars
+        context_settings = settings.ai_context_settings
+        self.context_builder = ContextBuilder(
+            max_turns=context_settings.max_turns,
+            token_budget=context_settings.token_budget,
+            chars_per_token=context_settings.chars_per_token,
+            cache_users=context_settings.cache_users,
+            cache_ttl=context_settings.cache_ttl,
+        )
+        self.response_cache = create_ai_response_cache()
+        # Отметки об отмене живут, пока отмененный запрос еще может прийти
+        self.cancel_ttl = worker_settings.request_ttl or 3600.0
+        # (user_id, message_id) → когда забыть отметку: ID сообщений
+        # последовательные, отмена чужого запроса не должна сработать
+        self._cancelled_messages: dict[tuple[int, str], float] = {}
+        self._cancelled_users: dict[int, float] = {}
+        # Выполняющиеся запросы: message_id → (user_id, enqueued_at, задача)
+        self._requests: dict[str, tuple[int, float | None, asyncio.Task]] = {}
+        self._aborted: set[str] = set()
+        self._stopped = asyncio.Event()
+
     async def process_message(self, data: dict[str, Any]):
         """
-        Обработка сообщения из очереди
+        Обработка сообщения из очереди, когда планировщик выдаст слот
+
+        :param data: Данные запроса (user_id, message, message_id, enqueued_at,
+            priority, deadline)
+        """
+        if self._is_cancelled(data):
+            await self._skip_cancelled(data, stage="queued")
+            return
+
+        cost = 1 + len(data.get("message") or "") // self.cost_chars
+        async with self.scheduler.slot(
+            data.get("user_id"), cost=cost, priority=bool(data.get("priority"))
+        ):
+            # Отмена могла прийти, пока запрос ждал слота
+            if self._is_cancelled(data):
+                await self._skip_cancelled(data, stage="queued")
+                return
+
+            enqueued_at = data.get("enqueued_at")
+            if enqueued_at is not None:
+                AI_QUEUE_WAIT.observe(max(time.time() - enqueued_at, 0))
+
+            message_id = data.get("message_id")
+            task = asyncio.ensure_future(self._handle_request(data))
+            self._requests[message_id] = (data.get("user_id"), enqueued_at, task)
+            AI_INFLIGHT.inc()
+            start = time.monotonic()
+            try:
+                await task
+            except asyncio.CancelledError:
+                if message_id not in self._aborted:
+                    raise
+                await self._skip_cancelled(data, stage="running")
+            finally:
+                self._requests.pop(message_id, None)
+                self._aborted.discard(message_id)
+                AI_EXECUTION.observe(time.monotonic() - start)
+                AI_INFLIGHT.dec()
+
+    async def cancel(self, data: dict[str, Any]):
+        """
+        Отмена запросов по управляющему сообщению
+
+        Запрос, еще не начатый воркером, будет пропущен. У выполняющегося
+        запроса прерывается вызов AI, ответ не отправляется и не сохраняется.
+
+        :param data: Данные отмены (user_id, message_id, cancelled_at)
+        """
+        user_id = data.get("user_id")
+        message_id = data.get("message_id")
+        now = time.monotonic()
+        self._forget_cancels(now)
+        if message_id is not None:
+            self._cancelled_messages[(user_id, message_id)] = now + self.cancel_ttl
+        else:
+            self._cancelled_users[user_id] = data.get("cancelled_at") or time.time()
+
+        for running_id, (owner, enqueued_at, task) in list(self._requests.items()):
+            if owner != user_id or task.done():
+                continue
+            if self._is_cancelled(
+                {"user_id": owner, "message_id": running_id, "enqueued_at": enqueued_at}
+            ):
+                logger.info(f"Прерывание запроса к AI {running_id} по отмене")
+                self._aborted.add(running_id)
+                task.cancel()
+
+    def _is_cancelled(self, data: dict[str, Any]) -> bool:
+        if (data.get("user_id"), data.get("message_id")) in self._cancelled_messages:
+            return True
+        cancelled_at = self._cancelled_users.get(data.get("user_id"))
+        enqueued_at = data.get("enqueued_at")
+        return (
+            cancelled_at is not None
+            and enqueued_at is not None
+            and enqueued_at <= cancelled_at
+        )
+
+    def _forget_cancels(self, now: float):
+        for key, expires in list(self._cancelled_messages.items()):
+            if expires <= now:
+                del self._cancelled_messages[key]
+        oldest = time.time() - self.cancel_ttl
+        for user_id, cancelled_at in list(self._cancelled_users.items()):
+            if cancelled_at <= oldest:
+                del self._cancelled_users[user_id]
+
+    async def _skip_cancelled(self, data: dict[str, Any], stage: str):
+        """
+        Завершение отмененного запроса без ответа
+
+        :param data: Данные запроса
+        :param stage: queued — не начинался, running — прерван
+        """
+        user_id = data.get("user_id")
+        message_id = data.get("message_id")
+        AI_CANCELLED.labels(stage=stage).inc()
+        logger.info(
+            f"Запрос к AI отменен ({stage}): user_id={user_id}, message_id={message_id}"
+        )
+        if (user_id, message_id) in self._cancelled_messages:
+            return
+        # Отмена из-за отключения: при переподключении клиент сможет повторить запрос
+        try:
+            await self.rabbitmq_service.presence.mark_expired(user_id, message_id)
+        except Exception as e:
+            logger.error(f"Ошибка отметки отмененного запроса {message_id}: {e}")
+
+    async def _handle_request(self, data: dict[str, Any]):
+        """
+        Запрос к AI, отправка ответа пользователю и сохранение в базе данных
 
-        :param data: Данные запроса (user_id, message, message_id)
+        :param data: Данные запроса (user_id, message, message_id, deadline)
+        :raises AIServiceError: Если AI недоступен, запрос будет повторен позже
         """
         user_id = data.get("user_id")
         message_text = data.get("message")
         message_id = data.get("message_id")
+        deadline = data.get("deadline")
 
         logger.info(
             f"Обработка запроса к AI: user_id={user_id}, message_id={message_id}"
         )
 
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                await self._expire(data, reason="deadline")
+                return
+
+        presence = self.rabbitmq_service.presence
+        # Реестр в памяти процесса не знает о сокетах других процессов
+        if presence.shared and not await presence.is_online(user_id):
+            await self._expire(data, reason="offline")
+            return
+
         try:
-            logger.info(f"Отправка запроса к AI через gRPC: {message_text[:50]}...")
-            ai_response = await self.ai_client.send_message(message_text)
+            # Пока выключатель разомкнут, не тратим время даже на сборку контекста
+            self.ai_client.breaker.check()
+            prompt = await self.context_builder.build(user_id, message_id, message_text)
+            if deadline is not None:
+                timeout = deadline - time.time()
+
+            # Ответ с контекстом диалога зависит от пользователя и не кешируется
+            cacheable = self.response_cache is not None and prompt == message_text
+            ai_response = None
+            if cacheable:
+                ai_response = await self.response_cache.get(prompt)
+
+            if ai_response is not None:
+                logger.info(f"Ответ AI для сообщения {message_id} взят из кеша")
+                if self.streaming:
+                    await self.rabbitmq_service.send_ai_done(
+                        user_id, message_id, ai_response
+                    )
+                else:
+                    await self.rabbitmq_service.send_ai_response(
+                        user_id=user_id, message_id=message_id, content=ai_response
+                    )
+            else:
+                logger.info(f"Отправка запроса к AI через gRPC: {message_text[:50]}...")
+                if self.streaming:
+                    ai_response = await self._stream_response(
+                        user_id, message_id, prompt, timeout
+                    )
+                else:
+                    async with self._limited():
+                        ai_response = await self.ai_client.send_message(
+                            prompt, timeout=timeout
+                        )
+                    # Отправляем ответ обратно через RabbitMQ
+                    await self.rabbitmq_service.send_ai_response(
+                        user_id=user_id, message_id=message_id, content=ai_response
+                    )
+                if cacheable:
+                    await self.response_cache.set(prompt, ai_response)
             logger.info(
                 f"Получен ответ от AI для сообщения {message_id}: {ai_response[:50]}..."
             )
 
-            # Отправляем ответ обратно через RabbitMQ
-            await self.rabbitmq_service.send_ai_response(
-                user_id=user_id, message_id=message_id, content=ai_response
-            )
-
             # Сохраняем ответ в базе данных
             async with create_session() as session:
                 message_repo = MessageRepository(session)
-                await message_repo.create_ai_response_message(
+                reply = await message_repo.create_ai_response_message(
                     user_id=user_id, content=ai_response
                 )
                 logger.info(
                     f"Ответ AI сохранен в базе данных для пользователя {user_id}"
                 )
+            self.context_builder.record(
+                user_id, message_id, message_text, reply.id, ai_response
+            )
+        except AIDeadlineExceededError:
+            await self._expire(data, reason="deadline")
+        except AICircuitOpenError as e:
+            AI_SHED.inc()
+            logger.warning(f"Запрос {message_id} отложен: {e.message}")
+            await self.rabbitmq_service.send_ai_error(
+                user_id,
+                message_id,
+                error_code="ai_unavailable",
+                content="AI временно недоступен, ответ придет позже",
+                retry_after=e.retry_after,
+            )
+            # Запрос вернется из очереди задержки, попытка не расходуется
+            raise
+        except AIServiceError:
+            # Слот освобождается сразу, повтор выполнит брокер через очередь задержки
+            raise
         except Exception as e:
             logger.error(f"Ошибка обработки запроса к AI: {str(e)}")
             import traceback
 
             logger.error(traceback.format_exc())
 
+    @asynccontextmanager
+    async def _limited(self) -> AsyncIterator[Sample]:
+        """
+        Вызов AI под адаптивным пределом, после него планировщик получает
+        новое число слотов
+        """
+        if self.limiter is None:
+            yield Sample(time.monotonic())
+            return
+        try:
+            async with self.limiter.call() as sample:
+                yield sample
+        finally:
+            self.scheduler.resize(self.limiter.limit)
+
+    async def _stream_response(
+        self, user_id: int, message_id: str, message_text: str, timeout: float | None
+    ) -> str:
+        """
+        Передача ответа AI фрагментами по мере генерации
+
+        Первый фрагмент отправляется сразу, следующие копятся не дольше
+        stream_flush_interval или до stream_flush_chars символов. Пока
+        фрагмент публикуется, чтение потока AI продолжается.
+
+        :param user_id: ID пользователя
+        :param message_id: ID сообщения
+        :param message_text: Текст промпта
+        :param timeout: Сколько секунд осталось до срока запроса
+        :return: Полный текст ответа
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        parts: list[str] = []
+        pending: list[str] = []
+        pending_chars = 0
+        seq = 0
+        flush_at: float | None = None
+
+        async def flush():
+            nonlocal pending_chars, seq, flush_at
+            await self.rabbitmq_service.send_ai_chunk(
+                user_id, message_id, "".join(pending), seq
+            )
+            if seq == 0:
+                AI_FIRST_CHUNK.observe(loop.time() - start)
+            seq += 1
+            pending.clear()
+            pending_chars = 0
+            flush_at = None
+
+        async with self._limited() as sample:
+            stream = self.ai_client.stream_message(message_text, timeout=timeout)
+            next_chunk = asyncio.ensure_future(anext(stream))
+            try:
+                while True:
+                    wait = None if flush_at is None else max(flush_at - loop.time(), 0)
+                    done, _ = await asyncio.wait({next_chunk}, timeout=wait)
+                    if not done:
+                        # Окно истекло раньше, чем пришел следующий фрагмент
+                        await flush()
+                        continue
+
+                    try:
+                        chunk = next_chunk.result()
+                    except StopAsyncIteration:
+                        break
+                    next_chunk = asyncio.ensure_future(anext(stream))
+
+                    sample.mark()
+                    parts.append(chunk)
+                    pending.append(chunk)
+                    pending_chars += len(chunk)
+                    if seq == 0 or pending_chars >= self.stream_flush_chars:
+                        await flush()
+                    elif flush_at is None:
+                        flush_at = loop.time() + self.stream_flush_interval
+            finally:
+                if not next_chunk.done():
+                    next_chunk.cancel()
+                    # Генератор можно закрыть только после остановки чтения
+                    await asyncio.gather(next_chunk, return_exceptions=True)
+                await stream.aclose()
+
+        # Остаток не отправляется фрагментом: итоговый кадр несет весь текст
+        ai_response = "".join(parts)
+        AI_STREAM_CHUNKS.observe(seq)
+        await self.rabbitmq_service.send_ai_done(user_id, message_id, ai_response)
+        return ai_response
+
+    async def _expire(self, data: dict[str, Any], reason: str):
+        """
+        Отказ от запроса без ответа AI
+
+        :param data: Данные запроса
+        :param reason: deadline — истек срок, offline — пользователь отключился
+        """
+        user_id = data.get("user_id")
+        message_id = data.get("message_id")
+        AI_EXPIRED.labels(reason=reason).inc()
+        logger.info(
+            f"Запрос к AI отброшен ({reason}): user_id={user_id}, "
+            f"message_id={message_id}"
+        )
+
+        presence = self.rabbitmq_service.presence
+        try:
+            online = reason == "deadline"
+            if online and presence.shared:
+                online = await presence.is_online(user_id)
+            if online:
+                # Подключенный клиент узнает о просрочке сразу
+                await self.rabbitmq_service.send_ai_expired(user_id, message_id)
+            if not (online and presence.shared):
+                await presence.mark_expired(user_id, message_id)
+        except Exception as e:
+            logger.error(f"Ошибка отметки просроченного запроса {message_id}: {e}")
+
     async def start(self):
         """
         Запуск воркера
@@ -70,15 +466,26 @@ class AIWorker:
             return
 
         self.running = True
-        logger.info("Запуск AI воркера...")
+        self._stopped.clear()
+        logger.info(
+            f"Запуск AI воркера: concurrency={self.concurrency}, "
+            f"prefetch_count={self.prefetch_count}"
+        )
 
+        control_task = None
         try:
             await self.rabbitmq_service.connect()
+            control_task = asyncio.create_task(
+                self.rabbitmq_service.listen_for_control(self.cancel)
+            )
 
-            await self.rabbitmq_service.start_ai_worker(self.process_message)
+            # Возвращает управление после stop_processing
+            await self.rabbitmq_service.start_ai_worker(
+                self.process_message, prefetch_count=self.prefetch_count
+            )
 
-            while self.running:
-                await asyncio.sleep(1)
+            # Если обработчик не запустился, ждем остановки воркера
+            await self._stopped.wait()
 
         except Exception as e:
             logger.error(f"Ошибка в AI воркере: {str(e)}")
@@ -87,7 +494,12 @@ class AIWorker:
             logger.error(traceback.format_exc())
         finally:
             self.running = False
+            if control_task is not None:
+                control_task.cancel()
             await self.rabbitmq_service.close()
+            await self.ai_client.close()
+            if self.response_cache is not None:
+                await self.response_cache.close()
             logger.info("AI воркер остановлен")
 
     async def stop(self):
@@ -95,4 +507,6 @@ class AIWorker:
         Остановка воркера
         """
         self.running = False
+        self._stopped.set()
+        await self.rabbitmq_service.stop_processing()
         logger.info("Запрошена остановка AI воркера")
@@ -0,0 +1,125 @@
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from metrics import AI_CONCURRENCY_LIMIT, AI_CONCURRENCY_MIN_RTT
+from services.errors import AICircuitOpenError, AIServiceError
+
+logger = logging.getLogger(__name__)
+
+
+class Sample:
+    """Замер одного вызова AI"""
+
+    __slots__ = ("start", "rtt")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.rtt: float | None = None
+
+    def mark(self):
+        """
+        Фиксация задержки вызова
+
+        Потоковому ответу задержку задает первый фрагмент: длина ответа
+        зависит от вопроса, а не от загрузки AI.
+        """
+        if self.rtt is None:
+            self.rtt = time.monotonic() - self.start
+
+
+class ConcurrencyLimiter:
+    """
+    Адаптивный предел одновременных вызовов AI (AIMD)
+
+    Базовая задержка min_rtt — наименьшая задержка вызова с момента
+    последнего сброса. Пока задержка вызова не превышает min_rtt * tolerance,
+    очереди у AI нет и предел растет на единицу за вызов, но только если
+    к концу вызова выполняется не меньше половины предела: простаивающий воркер
+    о пропускной способности AI ничего не узнает. Рост задержки или ошибка
+    AI уменьшают предел в backoff_ratio раз.
+
+    Одна перегрузка задевает все вызовы, выполнявшиеся в это время, поэтому
+    предел уменьшается не чаще раза на такую группу: вызовы, начатые до
+    последнего уменьшения, его уже не меняют.
+
+    Задержки AI со временем меняются, так что раз в baseline_ttl секунд
+    базовая задержка заменяется задержкой очередного вызова.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        tolerance: float,
+        backoff_ratio: float,
+        baseline_ttl: float,
+    ):
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.tolerance = tolerance
+        self.backoff_ratio = backoff_ratio
+        self.baseline_ttl = baseline_ttl
+        self.limit = min(max(initial_limit, self.min_limit), self.max_limit)
+        self.inflight = 0
+        self.min_rtt: float | None = None
+        self._baseline_at = 0.0
+        self._decreased_at = 0.0
+        AI_CONCURRENCY_LIMIT.set(self.limit)
+
+    @asynccontextmanager
+    async def call(self) -> AsyncIterator[Sample]:
+        """
+        Вызов AI, задержка которого меняет предел
+
+        Задержка — длительность блока, если она не зафиксирована раньше
+        через sample.mark(). AIServiceError внутри блока — ошибка AI,
+        отмена и прочие исключения предел не меняют.
+        """
+        sample = Sample(time.monotonic())
+        self.inflight += 1
+        try:
+            yield sample
+        except AICircuitOpenError:
+            # Вызов отклонен без обращения к AI
+            raise
+        except AIServiceError:
+            self._record(sample, dropped=True)
+            raise
+        else:
+            sample.mark()
+            self._record(sample, dropped=False)
+        finally:
+            self.inflight -= 1
+
+    def _record(self, sample: Sample, dropped: bool):
+        now = time.monotonic()
+        if sample.rtt is not None and not dropped:
+            if self.min_rtt is None or now - self._baseline_at >= self.baseline_ttl:
+                self.min_rtt = sample.rtt
+                self._baseline_at = now
+            else:
+                self.min_rtt = min(self.min_rtt, sample.rtt)
+            AI_CONCURRENCY_MIN_RTT.set(self.min_rtt)
+
+        if dropped or sample.rtt > self.min_rtt * self.tolerance:
+            if sample.start < self._decreased_at:
+                return
+            self._decreased_at = now
+            limit = math.floor(self.limit * self.backoff_ratio)
+        elif self.inflight * 2 >= self.limit:
+            limit = self.limit + 1
+        else:
+            return
+        self._set_limit(limit)
+
+    def _set_limit(self, limit: int):
+        limit = min(max(limit, self.min_limit), self.max_limit)
+        if limit == self.limit:
+            return
+        logger.info(f"Предел одновременных вызовов AI: {self.limit} → {limit}")
+        self.limit = limit
+        AI_CONCURRENCY_LIMIT.set(limit)
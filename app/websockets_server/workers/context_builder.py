@@ -0,0 +1,187 @@
+import logging
+import time
+from collections import OrderedDict, deque
+
+from lawly_db.db_models.db_session import create_session
+from lawly_db.db_models.enum_models import MessageSenderTypeEnum
+
+from metrics import AI_CONTEXT_BUILD, AI_CONTEXT_CACHE, AI_PROMPT_TOKENS
+from repositories.message_repository import MessageRepository
+
+logger = logging.getLogger(__name__)
+
+Turn = tuple[str, str]
+
+ROLE_TITLES = {"user": "Пользователь", "assistant": "Ассистент"}
+
+
+class _History:
+    """
+    Последние реплики пользователя в кеше воркера
+
+    covered_id — ID самого нового сообщения, которое уже учтено в turns:
+    при чтении из базы это все сообщения старше отвечаемого.
+    """
+
+    __slots__ = ("turns", "covered_id", "loaded_at")
+
+    def __init__(self, turns: deque[Turn], covered_id: int, loaded_at: float):
+        self.turns = turns
+        self.covered_id = covered_id
+        self.loaded_at = loaded_at
+
+
+class ContextBuilder:
+    """
+    Сборка промпта к AI из последних реплик диалога
+
+    История — сообщения старше отвечаемого — берется из MessageRepository
+    и кешируется в воркере кольцевым буфером на max_turns реплик, так что
+    подряд идущие сообщения пользователя не читают историю целиком. Ответы
+    воркера дописываются в буфер через record().
+
+    Сообщения пользователя обрабатывают разные воркеры, поэтому перед
+    использованием кеша одним запросом проверяется ID последнего сообщения
+    старше отвечаемого: если его нет в кеше (сообщение записал другой
+    процесс), история читается заново. Запись кеша в любом случае истекает
+    через cache_ttl.
+    В промпт попадают самые новые реплики, пока оценка размера в токенах
+    не превышает token_budget.
+    """
+
+    def __init__(
+        self,
+        max_turns: int,
+        token_budget: int,
+        chars_per_token: float,
+        cache_users: int,
+        cache_ttl: float,
+    ):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.chars_per_token = chars_per_token
+        self.cache_users = cache_users
+        self.cache_ttl = cache_ttl
+        self._cache: OrderedDict[int, _History] = OrderedDict()
+
+    def estimate_tokens(self, text: str) -> int:
+        """
+        Оценка числа токенов по длине текста
+
+        :param text: Текст
+        """
+        return int(len(text) / self.chars_per_token) + 1
+
+    async def build(self, user_id: int, message_id: str, message: str) -> str:
+        """
+        Промпт с контекстом диалога
+
+        :param user_id: ID пользователя
+        :param message_id: ID текущего сообщения, в историю оно не входит
+        :param message: Текст текущего сообщения
+        :return: Текст промпта, без истории — само сообщение
+        """
+        start = time.monotonic()
+        try:
+            turns = await self._get_turns(user_id, message_id)
+        except Exception as e:
+            # Без истории ответ хуже, но запрос не теряется
+            logger.error(f"Ошибка чтения истории диалога пользователя {user_id}: {e}")
+            turns = []
+
+        budget = self.token_budget - self.estimate_tokens(message)
+        selected: list[Turn] = []
+        for role, text in reversed(turns):
+            cost = self.estimate_tokens(text)
+            if cost > budget:
+                break
+            budget -= cost
+            selected.append((role, text))
+        selected.reverse()
+
+        prompt = self._format(selected, message)
+        AI_CONTEXT_BUILD.observe(time.monotonic() - start)
+        AI_PROMPT_TOKENS.observe(self.estimate_tokens(prompt))
+        return prompt
+
+    def record(
+        self, user_id: int, message_id: str, message: str, reply_id: int, reply: str
+    ):
+        """
+        Дописывание обмена репликами, сохраненного воркером, в кеш
+
+        Если кеш уже учитывает сообщение (история прочитана для более нового
+        сообщения, отвеченного раньше), ответ не встанет в буфер на свое место,
+        и кеш пользователя сбрасывается.
+
+        :param user_id: ID пользователя
+        :param message_id: ID сообщения пользователя
+        :param message: Сообщение пользователя
+        :param reply_id: ID сохраненного ответа AI
+        :param reply: Ответ AI
+        """
+        history = self._cache.get(user_id)
+        if history is None:
+            return
+        if int(message_id) <= history.covered_id:
+            self.invalidate(user_id)
+            return
+        history.turns.append(("user", message))
+        history.turns.append(("assistant", reply))
+        history.covered_id = reply_id
+
+    def invalidate(self, user_id: int):
+        """
+        Сброс кеша пользователя, следующая сборка прочитает историю из базы
+
+        :param user_id: ID пользователя
+        """
+        self._cache.pop(user_id, None)
+
+    async def _get_turns(self, user_id: int, message_id: str) -> list[Turn]:
+        before_id = int(message_id)
+        history = self._cache.get(user_id)
+        if history is not None and (
+            history.covered_id >= before_id
+            or time.monotonic() - history.loaded_at >= self.cache_ttl
+        ):
+            history = None
+
+        async with create_session() as session:
+            message_repo = MessageRepository(session)
+            if history is not None:
+                last_id = await message_repo.get_last_ai_message_id(user_id, before_id)
+                if last_id is None or last_id <= history.covered_id:
+                    AI_CONTEXT_CACHE.labels(result="hit").inc()
+                    self._cache.move_to_end(user_id)
+                    return list(history.turns)
+
+            AI_CONTEXT_CACHE.labels(result="miss").inc()
+            # Текущее и более новые сообщения в историю не входят
+            messages = await message_repo.get_recent_ai_messages(
+                user_id, self.max_turns, before_id=before_id
+            )
+        turns: deque[Turn] = deque(maxlen=self.max_turns)
+        for message in messages:
+            if not message.text:
+                continue
+            if message.sender_type == MessageSenderTypeEnum.AI:
+                turns.append(("assistant", message.text))
+            else:
+                turns.append(("user", message.text))
+
+        self._cache[user_id] = _History(turns, before_id - 1, time.monotonic())
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_users:
+            self._cache.popitem(last=False)
+        return list(turns)
+
+    @staticmethod
+    def _format(turns: list[Turn], message: str) -> str:
+        if not turns:
+            return message
+        history = "\n".join(f"{ROLE_TITLES[role]}: {text}" for role, text in turns)
+        return (
+            f"Предыдущие сообщения диалога:\n{history}\n\n"
+            f"Текущее сообщение пользователя:\n{message}"
+        )
@@ -0,0 +1,251 @@
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from metrics import (
+    SCHEDULER_ACTIVE_USERS,
+    SCHEDULER_MAX_USER_DEPTH,
+    SCHEDULER_WAITING,
+)
+
+Waiter = tuple[int, asyncio.Future]
+
+
+class _UserQueue:
+    """Очередь ожидающих запросов одного пользователя в полосе"""
+
+    __slots__ = ("waiters", "deficit")
+
+    def __init__(self):
+        self.waiters: deque[Waiter] = deque()
+        self.deficit = 0
+
+
+class FairScheduler:
+    """
+    Справедливая выдача слотов выполнения запросов к AI
+
+    У каждого пользователя своя очередь, очереди обслуживаются по кругу
+    алгоритмом deficit round robin: за круг пользователь получает quantum
+    единиц стоимости, так что длинные запросы расходуют его долю быстрее.
+    Один пользователь с десятками сообщений не задерживает остальных
+    дольше, чем на один свой запрос за круг.
+
+    Запросы одного пользователя выполняются строго по очереди: пока его
+    запрос выполняется, очередь пользователя пропускается, так что ответы
+    не меняются местами. Разные пользователи выполняются параллельно
+    в пределах concurrency.
+
+    Порядок гарантируется только внутри одного процесса воркера. Общую
+    очередь запросов читают все процессы (встроенные воркеры реплик API,
+    процессы отдельного воркера), а повторы возвращаются через очереди
+    задержки ai_request_retry_* в конец очереди. Поэтому запросы одного
+    пользователя в разных процессах, как и повтор с более новым запросом,
+    могут выполняться одновременно и получить ответы не по порядку.
+
+    Приоритетная полоса обслуживается первой, но не больше priority_weight
+    слотов подряд, если ждут обычные запросы.
+
+    Состояние хранится только для пользователей с ожидающими или
+    выполняющимися запросами и удаляется, как только пользователь
+    простаивает, поэтому оно ограничено prefetch_count воркера.
+    """
+
+    def __init__(self, concurrency: int, quantum: int = 1, priority_weight: int = 3):
+        self.concurrency = concurrency
+        self.quantum = quantum
+        self.priority_weight = priority_weight
+        self.active = 0
+        self._lanes: dict[str, OrderedDict[int, _UserQueue]] = {
+            "priority": OrderedDict(),
+            "normal": OrderedDict(),
+        }
+        self._waiting = {"priority": 0, "normal": 0}
+        self._depths: dict[int, int] = {}
+        self._running: set[int] = set()
+        self._priority_streak = 0
+
+    def depth(self, user_id: int) -> int:
+        """
+        Число ожидающих запросов пользователя
+
+        :param user_id: ID пользователя
+        """
+        return self._depths.get(user_id, 0)
+
+    def depths(self) -> dict[int, int]:
+        """
+        Снимок глубины очередей по пользователям
+        """
+        return dict(self._depths)
+
+    def running(self, user_id: int) -> bool:
+        """
+        Выполняется ли сейчас запрос пользователя
+
+        :param user_id: ID пользователя
+        """
+        return user_id in self._running
+
+    async def acquire(self, user_id: int, cost: int = 1, priority: bool = False):
+        """
+        Ожидание слота выполнения
+
+        :param user_id: ID пользователя
+        :param cost: Стоимость запроса в единицах quantum
+        :param priority: Поставить запрос в приоритетную полосу
+        """
+        if (
+            self.active < self.concurrency
+            and not any(self._waiting.values())
+            and user_id not in self._running
+        ):
+            self.active += 1
+            self._running.add(user_id)
+            return
+
+        lane = self._lane_for(user_id, priority)
+        future = asyncio.get_running_loop().create_future()
+        queue = self._lanes[lane].get(user_id)
+        if queue is None:
+            queue = self._lanes[lane][user_id] = _UserQueue()
+        queue.waiters.append((max(cost, 1), future))
+        self._waiting[lane] += 1
+        self._depths[user_id] = self._depths.get(user_id, 0) + 1
+        self._update_metrics()
+        # Свободный слот мог простаивать, пока ждали только занятые пользователи
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но забрать его некому
+                self.release(user_id)
+            else:
+                future.cancel()
+                self._forget(lane, user_id)
+            raise
+
+    def release(self, user_id: int):
+        """
+        Возврат слота и выдача его следующему запросу
+
+        :param user_id: ID пользователя, чей запрос завершился
+        """
+        self.active -= 1
+        self._running.discard(user_id)
+        self._dispatch()
+
+    def resize(self, concurrency: int):
+        """
+        Изменение числа слотов
+
+        Лишние слоты не отбираются у выполняющихся запросов, они просто
+        не выдаются снова после освобождения.
+
+        :param concurrency: Новое число слотов
+        """
+        self.concurrency = concurrency
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(
+        self, user_id: int, cost: int = 1, priority: bool = False
+    ) -> AsyncIterator[None]:
+        """
+        Слот выполнения на время блока
+
+        :param user_id: ID пользователя
+        :param cost: Стоимость запроса в единицах quantum
+        :param priority: Поставить запрос в приоритетную полосу
+        """
+        await self.acquire(user_id, cost, priority)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+    def _lane_for(self, user_id: int, priority: bool) -> str:
+        # Запросы пользователя остаются в одной полосе, иначе полосы
+        # могли бы поменять их порядок
+        for lane, ring in self._lanes.items():
+            if user_id in ring:
+                return lane
+        return "priority" if priority else "normal"
+
+    def _dispatch(self):
+        while self.active < self.concurrency:
+            picked = self._pick_lane()
+            if picked is None:
+                break
+            lane, user_id, future = picked
+            self._forget(lane, user_id)
+            self.active += 1
+            self._running.add(user_id)
+            future.set_result(None)
+
+    def _pick_lane(self) -> tuple[str, int, asyncio.Future] | None:
+        normal_waiting = self._waiting["normal"] > 0
+        if self._waiting["priority"] and (
+            not normal_waiting or self._priority_streak < self.priority_weight
+        ):
+            picked = self._pick("priority")
+            if picked is not None:
+                self._priority_streak += 1
+                return ("priority", *picked)
+
+        self._priority_streak = 0
+        picked = self._pick("normal")
+        if picked is not None:
+            return ("normal", *picked)
+        return None
+
+    def _pick(self, lane: str) -> tuple[int, asyncio.Future] | None:
+        ring = self._lanes[lane]
+        # Пользователи, чей запрос уже выполняется, пропускаются; если подряд
+        # пропущен весь круг, выдавать в полосе некому
+        skipped = 0
+        while len(ring) > skipped:
+            user_id, queue = next(iter(ring.items()))
+            waiters = queue.waiters
+            while waiters and waiters[0][1].done():
+                waiters.popleft()
+            if not waiters:
+                del ring[user_id]
+                continue
+
+            if user_id in self._running:
+                ring.move_to_end(user_id)
+                skipped += 1
+                continue
+
+            cost, future = waiters[0]
+            if queue.deficit >= cost:
+                queue.deficit -= cost
+                waiters.popleft()
+                if not waiters:
+                    del ring[user_id]
+                return user_id, future
+
+            # Пользователь получает квант и уступает ход следующему
+            queue.deficit += self.quantum
+            ring.move_to_end(user_id)
+            skipped = 0
+        return None
+
+    def _forget(self, lane: str, user_id: int):
+        self._waiting[lane] -= 1
+        depth = self._depths.get(user_id, 0) - 1
+        if depth > 0:
+            self._depths[user_id] = depth
+        else:
+            self._depths.pop(user_id, None)
+        self._update_metrics()
+
+    def _update_metrics(self):
+        for lane, waiting in self._waiting.items():
+            SCHEDULER_WAITING.labels(lane=lane).set(waiting)
+        SCHEDULER_ACTIVE_USERS.set(len(self._depths))
+        SCHEDULER_MAX_USER_DEPTH.set(max(self._depths.values(), default=0))
@@ -0,0 +1,36 @@
+"""
+Возврат запросов к AI из очереди мертвых писем в очередь запросов
+
+Запуск из каталога app:
+    python -m websockets_server.workers.replay_dead_letters --limit 100
+"""
+
+import argparse
+import asyncio
+import logging
+
+from websockets_server.services.amqp_connection import amqp_connection
+from websockets_server.services.rabbitmq_service import RabbitMQService
+
+
+async def replay(limit: int | None):
+    rabbitmq_service = RabbitMQService()
+    try:
+        replayed = await rabbitmq_service.replay_dead_letters(limit)
+        print(f"Возвращено запросов: {replayed}")
+    finally:
+        await rabbitmq_service.close()
+        await amqp_connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Сколько запросов вернуть (по умолчанию все)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(replay(args.limit))
@@ -0,0 +1,122 @@
+"""
+Запуск процессов AI воркера, см. python -m websockets_server.workers
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.connection import wait
+
+from lawly_db.db_models.db_session import global_init
+from prometheus_client import start_http_server
+
+from config import settings
+from websockets_server.services.amqp_connection import amqp_connection
+from websockets_server.services.presence_registry import presence_registry
+from websockets_server.workers.ai_worker import AIWorker
+
+logger = logging.getLogger("websockets_server.workers")
+
+
+async def run_worker(concurrency: int | None, prefetch_count: int | None):
+    """
+    Работа одного воркера до сигнала остановки
+
+    :param concurrency: Число одновременных запросов к AI
+    :param prefetch_count: Число запросов, выдаваемых брокером заранее
+    """
+    await global_init()
+
+    worker = AIWorker(concurrency=concurrency, prefetch_count=prefetch_count)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(worker.stop()))
+
+    try:
+        await worker.start()
+    finally:
+        await presence_registry.close()
+        await amqp_connection.close()
+
+
+def run_process(
+    index: int, concurrency: int | None, prefetch_count: int | None, metrics_port: int
+):
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s [worker-{index}] %(levelname)s %(name)s: %(message)s",
+    )
+    if metrics_port:
+        start_http_server(metrics_port + index)
+    asyncio.run(run_worker(concurrency, prefetch_count))
+
+
+def supervise(
+    processes: int,
+    concurrency: int | None,
+    prefetch_count: int | None,
+    metrics_port: int,
+):
+    """
+    Запуск и перезапуск процессов воркера, пересылка им сигнала остановки
+
+    :param processes: Число процессов
+    """
+    context = multiprocessing.get_context("spawn")
+    children: dict[int, multiprocessing.Process] = {}
+    stopping = False
+
+    def start(index: int):
+        process = context.Process(
+            target=run_process,
+            args=(index, concurrency, prefetch_count, metrics_port),
+            name=f"ai-worker-{index}",
+        )
+        process.start()
+        children[index] = process
+        logger.info(f"Запущен процесс воркера {index}, pid {process.pid}")
+
+    def on_signal(signum, frame):
+        nonlocal stopping
+        if stopping:
+            return
+        stopping = True
+        logger.info("Остановка процессов воркера")
+        for process in children.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+    for index in range(processes):
+        start(index)
+
+    deadline = None
+    while children:
+        if stopping and deadline is None:
+            deadline = (
+                time.monotonic() + settings.ai_worker_settings.shutdown_timeout + 5
+            )
+        if deadline is not None and time.monotonic() > deadline:
+            for process in children.values():
+                logger.warning(f"Процесс {process.name} не остановился, завершаем")
+                process.kill()
+
+        sentinels = {process.sentinel: index for index, process in children.items()}
+        for sentinel in wait(list(sentinels), timeout=1):
+            index = sentinels[sentinel]
+            process = children.pop(index)
+            process.join()
+            if not stopping:
+                logger.error(
+                    f"Процесс воркера {index} завершился с кодом {process.exitcode}, "
+                    "перезапуск"
+                )
+                time.sleep(1)
+                start(index)
+
+    logger.info("Все процессы воркера остановлены")
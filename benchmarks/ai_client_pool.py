@@ -0,0 +1,114 @@
+"""
+Запросы к AI через пул каналов при временных ошибках сервера
+
+AIClientService работает с FakeAIServer из тестов: каждый вызов ai_chat
+занимает --delay секунд, доля --failure-rate вызовов завершается
+UNAVAILABLE. Замеряется задержка запроса с учетом повторов, доля
+запросов, не получивших ответ, и выигрыш от объединения одинаковых
+запросов (--distinct различных вопросов на --requests запросов).
+
+Запуск из корня репозитория:
+    python benchmarks/ai_client_pool.py --requests 2000 --failure-rate 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from unittest import mock
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, ROOT)
+
+import grpc  # noqa: E402
+
+from services.ai_client_service import AIClientService  # noqa: E402
+from services.errors import AIServiceError  # noqa: E402
+from tests.fake_ai import FakeAIServer  # noqa: E402
+
+
+class FlakyAIServer(FakeAIServer):
+    """Сервер, отвечающий UNAVAILABLE на случайную долю вызовов"""
+
+    def __init__(self, delay: float, failure_rate: float):
+        super().__init__(delay)
+        self.failure_rate = failure_rate
+
+    def client(self, host: str, port: int):
+        client = super().client(host, port)
+        ai_chat = client.ai_chat
+
+        async def flaky_ai_chat(request):
+            if random.random() < self.failure_rate:
+                self.failures.append(grpc.StatusCode.UNAVAILABLE)
+            return await ai_chat(request)
+
+        client.ai_chat = flaky_ai_chat
+        return client
+
+
+async def main(
+    requests: int,
+    distinct: int,
+    pool_size: int,
+    delay: float,
+    failure_rate: float,
+    concurrency: int,
+):
+    server = FlakyAIServer(delay, failure_rate)
+    with mock.patch("services.ai_client_service.AIAssistantClient", server.client):
+        client = AIClientService(pool_size=pool_size)
+    client.retry_base_delay = delay
+    client.health_check_interval = delay * 10
+    slots = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    failed = 0
+
+    async def ask(i: int):
+        nonlocal failed
+        async with slots:
+            start = time.perf_counter()
+            try:
+                await client.send_message(f"Вопрос {i % distinct}")
+            except AIServiceError:
+                failed += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    await client.close()
+
+    latencies.sort()
+    print(
+        f"{requests} запросов за {elapsed:.2f} с, вызовов ai_chat "
+        f"{len(server.requests)}, без ответа {failed}, задержка p50 "
+        f"{statistics.median(latencies) * 1e3:.1f} мс, p99 "
+        f"{latencies[int(len(latencies) * 0.99)] * 1e3:.1f} мс"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--distinct", type=int, default=500)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=0.01)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            args.requests,
+            args.distinct,
+            args.pool_size,
+            args.delay,
+            args.failure_rate,
+            args.concurrency,
+        )
+    )
@@ -0,0 +1,116 @@
+"""
+Замер пробуждений event loop на одно простаивающее WebSocket соединение
+
+Сравнивает прежний цикл ожидания (asyncio.sleep(1) в цикле) с ожиданием
+события в RabbitMQService.listen_for_responses. Брокер заменен заглушкой,
+поэтому замеряются только пробуждения самих подписок.
+
+Запуск из корня репозитория:
+    python benchmarks/idle_wakeups.py --connections 20000 --seconds 5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from websockets_server.services.rabbitmq_service import RabbitMQService  # noqa: E402
+
+
+class IdleQueue:
+    def __init__(self, name: str):
+        self.name = name
+
+    async def bind(self, exchange, routing_key):
+        pass
+
+    async def unbind(self, exchange, routing_key):
+        pass
+
+    async def consume(self, callback):
+        return f"ctag-{self.name}"
+
+    async def cancel(self, consumer_tag):
+        pass
+
+
+class IdleChannel:
+    is_closed = False
+
+    async def declare_queue(self, name: str = "", **kwargs):
+        return IdleQueue(name)
+
+    async def close(self):
+        self.is_closed = True
+
+
+class WakeupCounter:
+    """Считает колбэки, выполненные event loop"""
+
+    def __init__(self):
+        self.count = 0
+        self._original = asyncio.events.Handle._run
+
+    def __enter__(self):
+        counter = self
+
+        def _run(handle):
+            counter.count += 1
+            return counter._original(handle)
+
+        asyncio.events.Handle._run = _run
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.events.Handle._run = self._original
+
+
+async def polling_listener():
+    while True:
+        await asyncio.sleep(1)
+
+
+async def noop_callback(data):
+    pass
+
+
+async def measure(
+    name: str, tasks: list[asyncio.Task], connections: int, seconds: float
+):
+    # Даем подпискам дойти до ожидания, прежде чем считать
+    await asyncio.sleep(0.5)
+    with WakeupCounter() as counter:
+        await asyncio.sleep(seconds)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    per_connection = counter.count / connections / seconds
+    print(
+        f"{name:>10}: {counter.count} пробуждений за {seconds:.0f} с, "
+        f"{per_connection:.3f} на соединение в секунду"
+    )
+
+
+async def main(connections: int, seconds: float):
+    tasks = [asyncio.create_task(polling_listener()) for _ in range(connections)]
+    await measure("sleep(1)", tasks, connections, seconds)
+
+    service = RabbitMQService()
+    service.channel = IdleChannel()
+    service.response_mode = "per_user"
+    tasks = [
+        asyncio.create_task(service.listen_for_responses(user_id, noop_callback))
+        for user_id in range(connections)
+    ]
+    await measure("event", tasks, connections, seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, default=20000)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.connections, args.seconds))
@@ -0,0 +1,90 @@
+"""
+Накладные расходы конвейера клиент → воркер → клиент на брокере в памяти
+
+Запросы проходят через настоящие RabbitMQService, кодеки, планировщик не
+участвует: воркер сразу отвечает эхом. Замеряется задержка от отправки
+запроса до получения ответа подписчиком и пропускная способность.
+
+Запуск из корня репозитория:
+    python benchmarks/memory_broker_roundtrip.py --users 100 --messages 20000
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from websockets_server.services.amqp_connection import (  # noqa: E402
+    AMQPConnectionManager,
+)
+from websockets_server.services.rabbitmq_service import RabbitMQService  # noqa: E402
+
+
+async def main(users: int, messages: int, response_mode: str):
+    amqp = AMQPConnectionManager(
+        "memory://", channel_pool_size=8, confirm_timeout=5, transport="memory"
+    )
+
+    def make_service() -> RabbitMQService:
+        service = RabbitMQService()
+        service.amqp = amqp
+        service.response_mode = response_mode
+        return service
+
+    worker = make_service()
+    listener = make_service()
+    sent_at: dict[str, float] = {}
+    latencies: list[float] = []
+    done = asyncio.Event()
+
+    async def process(data):
+        await worker.send_ai_response(data["user_id"], data["message_id"], "ok")
+
+    async def on_response(data):
+        latencies.append(time.perf_counter() - sent_at.pop(data["message_id"]))
+        if len(latencies) == messages:
+            done.set()
+
+    listeners = [
+        asyncio.create_task(listener.listen_for_responses(user_id, on_response))
+        for user_id in range(users)
+    ]
+    worker_task = asyncio.create_task(
+        worker.start_ai_worker(process, prefetch_count=64)
+    )
+    await asyncio.sleep(0.1)
+
+    start = time.perf_counter()
+    for i in range(messages):
+        message_id = str(i)
+        sent_at[message_id] = time.perf_counter()
+        await listener.send_ai_request(i % users, "Вопрос", message_id)
+    await done.wait()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(
+        f"{response_mode}: {messages} запросов за {elapsed:.2f} с "
+        f"({messages / elapsed:.0f} в секунду), задержка p50 "
+        f"{statistics.median(latencies) * 1e6:.0f} мкс, p99 "
+        f"{latencies[int(len(latencies) * 0.99)] * 1e6:.0f} мкс"
+    )
+
+    for task in listeners:
+        task.cancel()
+    await worker.stop_processing()
+    await asyncio.gather(*listeners, worker_task, return_exceptions=True)
+    await amqp.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--response-mode", default="per_user")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.messages, args.response_mode))
@@ -0,0 +1,68 @@
+"""
+Стоимость кодирования сообщений брокера: время encode/decode и размер тела
+
+Сравнивает прежний json.dumps/json.loads словаря, JsonCodec и MsgpackCodec
+на запросе и ответе AI типичного размера.
+
+Запуск из корня репозитория:
+    python benchmarks/message_codecs.py --number 100000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from websockets_server.dto import RabbitMQAIRequest, RabbitMQAIResponse  # noqa: E402
+from websockets_server.services.message_codec import (  # noqa: E402
+    JsonCodec,
+    MsgpackCodec,
+)
+
+QUESTION = "Как расторгнуть договор аренды квартиры досрочно? " * 4
+ANSWER = "Согласно статье 619 ГК РФ договор аренды может быть расторгнут. " * 30
+
+
+def bench(number: int, name: str, encode, decode):
+    body = encode()
+    encode_us = timeit.timeit(encode, number=number) / number * 1e6
+    decode_us = timeit.timeit(lambda: decode(body), number=number) / number * 1e6
+    print(
+        f"{name:>22}: encode {encode_us:6.2f} мкс, decode {decode_us:6.2f} мкс, "
+        f"{len(body):5d} байт"
+    )
+
+
+def main(number: int):
+    request = RabbitMQAIRequest(
+        user_id=123456, message=QUESTION, message_id="987654", enqueued_at=time.time()
+    )
+    response = RabbitMQAIResponse(user_id=123456, message_id="987654", content=ANSWER)
+
+    for label, model in (("запрос", request), ("ответ", response)):
+        print(f"{label}:")
+        data = model.model_dump()
+        bench(
+            number,
+            "json.dumps (прежний)",
+            lambda: json.dumps(data).encode(),
+            lambda body: json.loads(body.decode()),
+        )
+        for codec in (JsonCodec(), MsgpackCodec()):
+            bench(
+                number,
+                type(codec).__name__,
+                lambda: codec.encode(model),
+                lambda body: codec.decode(body, type(model)),
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+    main(args.number)
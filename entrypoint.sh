@@ -1,12 +1,17 @@
 #!/bin/sh
 set -e
 
-# Проверяем, что RabbitMQ доступен
-until nc -z rabbitmq 5672 || nc -z test_rabbitmq 5672 || nc -z rabbitmq_prod 5672; do
-  echo "RabbitMQ недоступен - ожидание..."
-  sleep 1
-done
+# Брокер в памяти процесса не требует RabbitMQ
+transport="${RABBITMQ_TRANSPORT:-${rabbitmq_transport:-amqp}}"
 
-echo "RabbitMQ доступен - запуск приложения!"
+if [ "$transport" != "memory" ]; then
+  # Проверяем, что RabbitMQ доступен
+  until nc -z rabbitmq 5672 || nc -z test_rabbitmq 5672 || nc -z rabbitmq_prod 5672; do
+    echo "RabbitMQ недоступен - ожидание..."
+    sleep 1
+  done
+
+  echo "RabbitMQ доступен - запуск приложения!"
+fi
 
 exec "$@"
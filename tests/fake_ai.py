@@ -0,0 +1,62 @@
+import asyncio
+from collections import deque
+from types import SimpleNamespace
+
+import grpc
+
+
+def rpc_error(code: grpc.StatusCode) -> grpc.aio.AioRpcError:
+    """Ошибка вызова gRPC с заданным кодом статуса"""
+    return grpc.aio.AioRpcError(
+        code, grpc.aio.Metadata(), grpc.aio.Metadata(), details=code.name
+    )
+
+
+class FakeAIAssistantClient:
+    """Клиент AI в памяти, один экземпляр — один канал"""
+
+    def __init__(self, server: "FakeAIServer", host: str, port: int):
+        self.server = server
+        self.connected = False
+
+    async def connect(self):
+        if self.server.connect_failures:
+            raise self.server.connect_failures.popleft()
+        self.connected = True
+        self.server.connections += 1
+
+    async def close(self):
+        self.connected = False
+
+    async def ai_chat(self, request):
+        server = self.server
+        server.requests.append((self, request))
+        if server.failures:
+            raise rpc_error(server.failures.popleft())
+        try:
+            await asyncio.sleep(server.delay)
+        except asyncio.CancelledError:
+            server.cancelled_calls += 1
+            raise
+        return SimpleNamespace(assistant_reply=f"Ответ: {request.user_prompt}")
+
+
+class FakeAIServer:
+    """
+    Замена AI сервиса для тестов и бенчмарков
+
+    failures задает коды ошибок для очередных вызовов ai_chat,
+    connect_failures — исключения для очередных подключений,
+    delay — время генерации ответа.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.failures: deque[grpc.StatusCode] = deque()
+        self.connect_failures: deque[Exception] = deque()
+        self.requests: list = []
+        self.connections = 0
+        self.cancelled_calls = 0
+
+    def client(self, host: str, port: int) -> FakeAIAssistantClient:
+        return FakeAIAssistantClient(self, host, port)
@@ -0,0 +1,72 @@
+import asyncio
+from collections import deque
+
+
+class FakeS3Body:
+    """Тело ответа get_object"""
+
+    def __init__(self, data: bytes, delay: float):
+        self.data = data
+        self.delay = delay
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def read(self) -> bytes:
+        await asyncio.sleep(self.delay)
+        return self.data
+
+
+class FakeS3Client:
+    """Клиент S3 в памяти с внедряемыми задержками"""
+
+    def __init__(self, storage: "FakeS3Session"):
+        self.storage = storage
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get_object(self, Bucket: str, Key: str):
+        session = self.storage
+        first_byte_delay = (
+            session.first_byte_delays.popleft() if session.first_byte_delays else 0
+        )
+        session.get_calls += 1
+        try:
+            await asyncio.sleep(first_byte_delay)
+        except asyncio.CancelledError:
+            session.cancelled_calls += 1
+            raise
+        data = session.objects[Key]
+        return {
+            "Body": FakeS3Body(data, session.body_delay),
+            "ContentLength": len(data),
+        }
+
+    async def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs):
+        self.storage.objects[Key] = Body
+
+
+class FakeS3Session:
+    """
+    Замена aioboto3.Session для тестов
+
+    first_byte_delays задает задержку до первого байта для очередных
+    вызовов get_object, body_delay — задержку чтения тела.
+    """
+
+    def __init__(self, objects: dict[str, bytes] | None = None):
+        self.objects = objects or {}
+        self.first_byte_delays: deque[float] = deque()
+        self.body_delay = 0.0
+        self.get_calls = 0
+        self.cancelled_calls = 0
+
+    def client(self, service_name: str, **kwargs) -> FakeS3Client:
+        return FakeS3Client(self)
@@ -0,0 +1,128 @@
+import asyncio
+
+import grpc
+import pytest
+
+from services.ai_client_service import AIClientService
+from services.errors import AIDeadlineExceededError, AIServiceError
+from tests.fake_ai import FakeAIServer
+
+
+@pytest.fixture
+def server(mocker):
+    server = FakeAIServer(delay=0.05)
+    mocker.patch("services.ai_client_service.AIAssistantClient", server.client)
+    return server
+
+
+def make_client(pool_size: int = 1) -> AIClientService:
+    client = AIClientService(pool_size=pool_size)
+    client.retry_base_delay = 0.001
+    client.health_check_interval = 0.01
+    return client
+
+
+@pytest.mark.asyncio
+async def test_identical_prompts_share_one_call(server):
+    """Одинаковые вопросы в разном написании ждут один вызов ai_chat"""
+    client = make_client()
+
+    replies = await asyncio.gather(
+        client.send_message("Как вернуть товар?"),
+        client.send_message("как вернуть товар"),
+        client.send_message("КАК вернуть товар!"),
+        client.send_message("Как расторгнуть договор?"),
+    )
+    assert len(server.requests) == 2
+    assert replies[:3] == ["Ответ: Как вернуть товар?"] * 3
+    assert replies[3] == "Ответ: Как расторгнуть договор?"
+
+    # Завершенный вызов не переиспользуется, другие параметры — другой вызов
+    await client.send_message("Как вернуть товар?")
+    await client.send_message("Как вернуть товар?", temperature=0.1, max_tokens=100)
+    assert len(server.requests) == 4
+    request = server.requests[-1][1]
+    assert (request.temperature, request.max_tokens) == (0.1, 100)
+
+
+@pytest.mark.asyncio
+async def test_leaving_waiter_does_not_cancel_shared_call(server):
+    """Отмена или таймаут одного запроса не отменяют вызов для остальных"""
+    client = make_client()
+
+    cancelled = asyncio.create_task(client.send_message("Вопрос"))
+    waiting = asyncio.create_task(client.send_message("Вопрос"))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    with pytest.raises(AIDeadlineExceededError):
+        await client.send_message("Вопрос", timeout=0.01)
+
+    assert await waiting == "Ответ: Вопрос"
+    assert len(server.requests) == 1
+    assert server.cancelled_calls == 0
+
+
+@pytest.mark.asyncio
+async def test_call_is_cancelled_when_nobody_waits(server):
+    """Вызов отменяется, когда его перестал ждать последний запрос"""
+    client = make_client()
+
+    first = asyncio.create_task(client.send_message("Вопрос"))
+    second = asyncio.create_task(client.send_message("Вопрос"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    second.cancel()
+    await asyncio.gather(first, second, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert server.cancelled_calls == 1
+    assert client._flights == {}
+
+
+@pytest.mark.asyncio
+async def test_requests_rotate_over_channels(server):
+    """Каналы пула выбираются по кругу"""
+    server.delay = 0
+    client = make_client(pool_size=3)
+
+    for i in range(6):
+        await client.send_message(f"Вопрос {i}")
+
+    channels = [channel for channel, _ in server.requests]
+    assert channels[:3] == channels[3:]
+    assert len(set(channels)) == 3
+
+
+@pytest.mark.asyncio
+async def test_temporary_errors_are_retried_on_healthy_channel(server):
+    """UNAVAILABLE повторяется на другом канале, неисправный канал восстанавливается"""
+    server.delay = 0
+    client = make_client(pool_size=2)
+    server.failures.extend([grpc.StatusCode.UNAVAILABLE])
+
+    assert await client.send_message("Вопрос") == "Ответ: Вопрос"
+    (failed, _), (retried, _) = server.requests
+    assert failed is not retried
+    assert [channel.healthy for channel in client.channels] == [False, True]
+
+    await asyncio.sleep(0.05)
+    assert all(channel.healthy for channel in client.channels)
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_permanent_errors_and_exhausted_retries_fail(server):
+    """Постоянные ошибки не повторяются, временные — не больше max_retries раз"""
+    server.delay = 0
+    client = make_client()
+
+    server.failures.append(grpc.StatusCode.INVALID_ARGUMENT)
+    with pytest.raises(AIServiceError):
+        await client.send_message("Вопрос")
+    assert len(server.requests) == 1
+
+    server.failures.extend([grpc.StatusCode.UNAVAILABLE] * 5)
+    with pytest.raises(AIServiceError):
+        await client.send_message("Вопрос")
+    assert len(server.requests) == 1 + client.max_retries + 1
+    await client.close()
@@ -0,0 +1,54 @@
+import pytest
+
+from services.ai_client_service import normalize_prompt
+from websockets_server.services.ai_response_cache import AIResponseCache
+
+
+def test_normalization_folds_case_whitespace_and_punctuation():
+    """Регистр, пунктуация и пробелы не влияют на ключ кеша"""
+    assert normalize_prompt("  Как вернуть  товар?! ") == "как вернуть товар"
+    assert normalize_prompt("Как вернуть «товар»") == normalize_prompt(
+        "как вернуть товар"
+    )
+    assert normalize_prompt("Ёлка") == "елка"
+
+
+@pytest.mark.asyncio
+async def test_cache_returns_reply_for_equivalent_prompt():
+    """Ответ на вопрос выдается и для того же вопроса в другом написании"""
+    cache = AIResponseCache(max_entries=10, ttl_seconds=60, max_prompt_chars=100)
+
+    assert await cache.get("Как вернуть товар?") is None
+    await cache.set("Как вернуть товар?", "Направьте продавцу претензию")
+
+    assert await cache.get("как  вернуть товар") == "Направьте продавцу претензию"
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_least_recently_used_and_expired():
+    """Записи вытесняются по LRU и истекают через ttl_seconds"""
+    cache = AIResponseCache(max_entries=2, ttl_seconds=60, max_prompt_chars=100)
+    await cache.set("первый", "1")
+    await cache.set("второй", "2")
+    assert await cache.get("первый") == "1"
+    await cache.set("третий", "3")
+
+    assert await cache.get("второй") is None
+    assert await cache.get("первый") == "1"
+    assert await cache.get("третий") == "3"
+
+    expired = AIResponseCache(max_entries=2, ttl_seconds=0, max_prompt_chars=100)
+    await expired.set("первый", "1")
+    assert await expired.get("первый") is None
+    assert len(expired) == 0
+
+
+@pytest.mark.asyncio
+async def test_long_prompts_are_not_cached():
+    """Длинные запросы не занимают кеш"""
+    cache = AIResponseCache(max_entries=10, ttl_seconds=60, max_prompt_chars=10)
+
+    await cache.set("очень длинный вопрос", "Ответ")
+
+    assert len(cache) == 0
+    assert await cache.get("очень длинный вопрос") is None
@@ -0,0 +1,258 @@
+import asyncio
+import time
+
+import pytest
+
+from services.errors import AICircuitOpenError
+from websockets_server.workers.ai_worker import AIWorker
+
+
+@pytest.mark.asyncio
+async def test_worker_limits_concurrent_requests(mocker):
+    """Одновременно выполняется не больше concurrency запросов к AI"""
+    worker = AIWorker(concurrency=2, prefetch_count=1)
+    assert worker.prefetch_count == 2
+
+    active = peak = 0
+
+    async def handle_request(data):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    mocker.patch.object(worker, "_handle_request", side_effect=handle_request)
+
+    await asyncio.gather(
+        *(
+            worker.process_message({"user_id": i, "message_id": str(i)})
+            for i in range(6)
+        )
+    )
+
+    assert peak == 2
+    assert worker._handle_request.call_count == 6
+
+
+@pytest.mark.asyncio
+async def test_worker_drops_request_after_deadline(mocker):
+    """Просроченный запрос не уходит в AI, клиент получает отметку"""
+    worker = AIWorker(concurrency=1)
+    send_message = mocker.patch.object(worker.ai_client, "send_message")
+    send_expired = mocker.patch.object(
+        worker.rabbitmq_service, "send_ai_expired", return_value=True
+    )
+    presence = worker.rabbitmq_service.presence
+    mocker.patch.object(presence, "mark_expired")
+
+    await worker.process_message(
+        {
+            "user_id": 1,
+            "message": "Вопрос",
+            "message_id": "5",
+            "deadline": time.time() - 1,
+        }
+    )
+
+    send_message.assert_not_called()
+    send_expired.assert_awaited_once_with(1, "5")
+    # Реестр в памяти процесса: отметка остается и для переподключения
+    presence.mark_expired.assert_awaited_once_with(1, "5")
+
+
+@pytest.mark.asyncio
+async def test_worker_skips_offline_user_with_shared_presence(mocker):
+    """При общем реестре запрос отключившегося пользователя не выполняется"""
+    worker = AIWorker(concurrency=1)
+    send_message = mocker.patch.object(worker.ai_client, "send_message")
+    send_expired = mocker.patch.object(worker.rabbitmq_service, "send_ai_expired")
+    presence = worker.rabbitmq_service.presence
+    mocker.patch.object(presence, "shared", True)
+    mocker.patch.object(presence, "is_online", return_value=False)
+    mocker.patch.object(presence, "mark_expired")
+
+    await worker.process_message({"user_id": 1, "message": "Вопрос", "message_id": "5"})
+
+    send_message.assert_not_called()
+    send_expired.assert_not_called()
+    presence.mark_expired.assert_awaited_once_with(1, "5")
+
+
+@pytest.mark.asyncio
+async def test_worker_passes_remaining_time_to_ai(mocker):
+    """Оставшееся до срока время становится таймаутом запроса к AI"""
+    worker = AIWorker(concurrency=1)
+    send_message = mocker.patch.object(
+        worker.ai_client, "send_message", return_value="Ответ"
+    )
+    mocker.patch.object(worker.rabbitmq_service, "send_ai_response", return_value=True)
+    mocker.patch("websockets_server.workers.ai_worker.MessageRepository")
+
+    await worker.process_message(
+        {
+            "user_id": 1,
+            "message": "Вопрос",
+            "message_id": "5",
+            "deadline": time.time() + 30,
+        }
+    )
+
+    timeout = send_message.call_args.kwargs["timeout"]
+    assert 29 < timeout <= 30
+
+
+@pytest.mark.asyncio
+async def test_worker_streams_coalesced_chunks_and_saves_final_text(mocker):
+    """Фрагменты объединяются в окне, в базу сохраняется только итоговый текст"""
+    worker = AIWorker(concurrency=1)
+    worker.streaming = True
+    worker.stream_flush_interval = 0.05
+
+    async def stream_message(message, timeout=None):
+        yield "Первый"
+        # Три быстрых токена попадают в одно окно
+        for token in (" второй", " третий", " четвертый"):
+            await asyncio.sleep(0.001)
+            yield token
+        await asyncio.sleep(0.1)
+        yield " последний"
+
+    mocker.patch.object(worker.ai_client, "stream_message", stream_message)
+    send_chunk = mocker.patch.object(
+        worker.rabbitmq_service, "send_ai_chunk", return_value=True
+    )
+    send_done = mocker.patch.object(
+        worker.rabbitmq_service, "send_ai_done", return_value=True
+    )
+    repository = mocker.patch("websockets_server.workers.ai_worker.MessageRepository")
+    create_message = (
+        repository.return_value.create_ai_response_message
+    ) = mocker.AsyncMock()
+
+    await worker.process_message({"user_id": 1, "message": "Вопрос", "message_id": "5"})
+
+    chunks = [call.args[2:] for call in send_chunk.call_args_list]
+    assert chunks == [("Первый", 0), (" второй третий четвертый", 1)]
+    full_text = "Первый второй третий четвертый последний"
+    send_done.assert_awaited_once_with(1, "5", full_text)
+    create_message.assert_awaited_once_with(user_id=1, content=full_text)
+
+
+@pytest.mark.asyncio
+async def test_worker_serves_repeated_question_from_cache(mocker):
+    """Повторный вопрос без контекста диалога не уходит в AI"""
+    worker = AIWorker(concurrency=1)
+    worker.streaming = False
+    send_message = mocker.patch.object(
+        worker.ai_client, "send_message", return_value="Направьте претензию"
+    )
+    send_response = mocker.patch.object(
+        worker.rabbitmq_service, "send_ai_response", return_value=True
+    )
+    mocker.patch("websockets_server.workers.ai_worker.MessageRepository")
+    build = mocker.patch.object(
+        worker.context_builder, "build", side_effect=lambda _, __, text: text
+    )
+
+    await worker.process_message(
+        {"user_id": 1, "message": "Как вернуть товар?", "message_id": "5"}
+    )
+    await worker.process_message(
+        {"user_id": 2, "message": "как вернуть товар", "message_id": "6"}
+    )
+    assert send_message.await_count == 1
+    send_response.assert_awaited_with(
+        user_id=2, message_id="6", content="Направьте претензию"
+    )
+
+    # Запрос с контекстом диалога кеш не использует
+    build.side_effect = lambda _, __, text: f"История\n{text}"
+    await worker.process_message(
+        {"user_id": 1, "message": "Как вернуть товар?", "message_id": "7"}
+    )
+    assert send_message.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_worker_sheds_requests_while_circuit_is_open(mocker):
+    """При разомкнутом выключателе клиент получает error, запрос откладывается"""
+    worker = AIWorker(concurrency=1)
+    worker.ai_client.breaker._open()
+    send_message = mocker.patch.object(worker.ai_client, "send_message")
+    send_error = mocker.patch.object(
+        worker.rabbitmq_service, "send_ai_error", return_value=True
+    )
+    repository = mocker.patch("websockets_server.workers.ai_worker.MessageRepository")
+
+    with pytest.raises(AICircuitOpenError):
+        await worker.process_message(
+            {"user_id": 1, "message": "Вопрос", "message_id": "5"}
+        )
+
+    send_message.assert_not_called()
+    repository.assert_not_called()
+    assert send_error.call_args.kwargs["error_code"] == "ai_unavailable"
+    assert send_error.call_args.args == (1, "5")
+
+
+@pytest.mark.asyncio
+async def test_worker_skips_cancelled_queued_requests(mocker):
+    """Отмененный запрос не уходит в AI; отмена по отключению — только старых"""
+    worker = AIWorker(concurrency=1)
+    handle = mocker.patch.object(worker, "_handle_request")
+    mark_expired = mocker.patch.object(worker.rabbitmq_service.presence, "mark_expired")
+    now = time.time()
+
+    await worker.cancel({"user_id": 1, "message_id": "5"})
+    # Чужой запрос с тем же ID не отменяется
+    await worker.process_message({"user_id": 2, "message_id": "5"})
+    await worker.process_message({"user_id": 1, "message_id": "5"})
+    assert [call.args[0]["user_id"] for call in handle.call_args_list] == [2]
+    mark_expired.assert_not_called()
+
+    await worker.cancel({"user_id": 3, "message_id": None, "cancelled_at": now})
+    await worker.process_message(
+        {"user_id": 3, "message_id": "6", "enqueued_at": now - 1}
+    )
+    await worker.process_message(
+        {"user_id": 3, "message_id": "7", "enqueued_at": now + 1}
+    )
+    assert handle.call_args_list[-1].args[0]["message_id"] == "7"
+    assert handle.call_count == 2
+    # Отключившийся пользователь узнает об отмене при переподключении
+    mark_expired.assert_awaited_once_with(3, "6")
+
+
+@pytest.mark.asyncio
+async def test_worker_aborts_running_request(mocker):
+    """Отмена прерывает вызов AI, ответ не отправляется и не сохраняется"""
+    worker = AIWorker(concurrency=1)
+    worker.streaming = True
+    started = asyncio.Event()
+    aborted = asyncio.Event()
+
+    async def stream_message(message, timeout=None):
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            aborted.set()
+            raise
+        yield "Ответ"
+
+    mocker.patch.object(worker.ai_client, "stream_message", stream_message)
+    send_done = mocker.patch.object(worker.rabbitmq_service, "send_ai_done")
+    repository = mocker.patch("websockets_server.workers.ai_worker.MessageRepository")
+
+    request = asyncio.create_task(
+        worker.process_message({"user_id": 1, "message": "Вопрос", "message_id": "5"})
+    )
+    await asyncio.wait_for(started.wait(), timeout=1)
+    await worker.cancel({"user_id": 1, "message_id": "5"})
+    await asyncio.wait_for(request, timeout=1)
+
+    assert aborted.is_set()
+    send_done.assert_not_called()
+    repository.assert_not_called()
+    assert worker.scheduler.active == 0
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from aio_pika import Message
+from aio_pika.exceptions import DeliveryError
+from pamqp.commands import Basic
+
+from websockets_server.services.amqp_connection import AMQPConnectionManager
+
+
+class FakeExchange:
+    def __init__(self, published: list):
+        self.published = published
+
+    async def publish(self, message, routing_key, timeout=None):
+        await asyncio.sleep(0)
+        if routing_key == "rejected":
+            raise DeliveryError(None, Basic.Nack())
+        self.published.append(routing_key)
+
+
+class FakeChannel:
+    def __init__(self, published: list):
+        self.is_closed = False
+        self.default_exchange = FakeExchange(published)
+
+    async def get_exchange(self, name, ensure=True):
+        return self.default_exchange
+
+    async def close(self):
+        self.is_closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.is_closed = False
+        self.published = []
+        self.channels = 0
+
+    async def channel(self, publisher_confirms=True):
+        self.channels += 1
+        return FakeChannel(self.published)
+
+    async def close(self):
+        self.is_closed = True
+
+
+@pytest.mark.asyncio
+async def test_publish_reports_broker_confirms(mocker):
+    """Публикация возвращает, подтвердил ли брокер каждое сообщение"""
+    connection = FakeConnection()
+    connect = mocker.patch("aio_pika.connect_robust", return_value=connection)
+    manager = AMQPConnectionManager(
+        "amqp://test", channel_pool_size=2, confirm_timeout=1
+    )
+
+    assert await manager.publish(Message(b"1"), routing_key="queue") is True
+    results = await manager.publish_batch(
+        [(Message(b"2"), "queue"), (Message(b"3"), "rejected")], exchange_name="ex"
+    )
+
+    assert results == [True, False]
+    assert connection.published == ["queue", "queue"]
+    # Одно соединение на процесс, канал публикации переиспользуется из пула
+    connect.assert_called_once()
+    assert connection.channels == 1
+
+    await manager.close()
+    assert connection.is_closed
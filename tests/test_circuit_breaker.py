@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from services.circuit_breaker import CircuitBreaker
+from services.errors import AICircuitOpenError, AIServiceError
+
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    options = dict(
+        window=10,
+        min_calls=4,
+        failure_rate=0.5,
+        slow_call_seconds=10,
+        open_seconds=60,
+        half_open_calls=2,
+    )
+    options.update(overrides)
+    return CircuitBreaker(**options)
+
+
+async def succeed(breaker: CircuitBreaker):
+    async with breaker.call():
+        pass
+
+
+async def succeed_after(breaker: CircuitBreaker, delay: float):
+    async with breaker.call():
+        await asyncio.sleep(delay)
+
+
+async def fail(breaker: CircuitBreaker):
+    with pytest.raises(AIServiceError):
+        async with breaker.call():
+            raise AIServiceError("AI недоступен")
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_on_failure_rate():
+    """Выключатель размыкается, когда доля неудач в окне достигла порога"""
+    breaker = make_breaker()
+
+    await fail(breaker)
+    await fail(breaker)
+    await succeed(breaker)
+    # Вызовов меньше min_calls — решения еще нет
+    assert breaker.state == "closed"
+
+    await fail(breaker)
+    assert breaker.state == "open"
+    with pytest.raises(AICircuitOpenError) as error:
+        await succeed(breaker)
+    assert 0 < error.value.retry_after <= 60
+
+
+@pytest.mark.asyncio
+async def test_slow_calls_count_as_failures():
+    """Ответы дольше slow_call_seconds считаются неудачами"""
+    breaker = make_breaker(min_calls=2, slow_call_seconds=0.01)
+
+    for _ in range(2):
+        async with breaker.call():
+            await asyncio.sleep(0.02)
+
+    assert breaker.state == "open"
+
+
+@pytest.mark.asyncio
+async def test_half_open_probes_close_or_reopen_breaker():
+    """После open_seconds пробные вызовы решают, замкнуть ли выключатель"""
+    breaker = make_breaker(min_calls=1, open_seconds=0)
+    await fail(breaker)
+    assert breaker.state == "open"
+
+    # Проба неудачна — выключатель снова разомкнут
+    await fail(breaker)
+    assert breaker.state == "open"
+
+    release = asyncio.Event()
+
+    async def probe():
+        async with breaker.call():
+            await release.wait()
+
+    probes = [asyncio.create_task(probe()) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert breaker.state == "half_open"
+    # Больше half_open_calls проб одновременно не пропускается
+    with pytest.raises(AICircuitOpenError):
+        breaker.check()
+
+    release.set()
+    await asyncio.gather(*probes)
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_frees_its_slot():
+    """Отмененная проба не считается исходом и освобождает место"""
+    breaker = make_breaker(min_calls=1, open_seconds=0, half_open_calls=1)
+    await fail(breaker)
+
+    task = asyncio.create_task(succeed_after(breaker, 1))
+    await asyncio.sleep(0)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert breaker.state == "half_open"
+    await succeed(breaker)
+    assert breaker.state == "closed"
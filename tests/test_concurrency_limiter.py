@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from services.errors import AICircuitOpenError, AIServiceError
+from websockets_server.workers.concurrency_limiter import ConcurrencyLimiter
+from websockets_server.workers.fair_scheduler import FairScheduler
+
+
+def make_limiter(**overrides) -> ConcurrencyLimiter:
+    options = dict(
+        initial_limit=4,
+        min_limit=1,
+        max_limit=10,
+        tolerance=2.0,
+        backoff_ratio=0.5,
+        baseline_ttl=60,
+    )
+    options.update(overrides)
+    return ConcurrencyLimiter(**options)
+
+
+async def run_calls(limiter: ConcurrencyLimiter, count: int, delay: float):
+    """Выполняет count одновременных вызовов длительностью delay"""
+
+    async def call():
+        async with limiter.call():
+            await asyncio.sleep(delay)
+
+    await asyncio.gather(*(call() for _ in range(count)))
+
+
+@pytest.mark.asyncio
+async def test_limit_grows_while_latency_stays_at_baseline():
+    """Предел растет на единицу за вызов, пока задержка близка к базовой"""
+    limiter = make_limiter()
+
+    await run_calls(limiter, 4, 0.01)
+
+    # Последние вызовы завершаются, когда загружено меньше половины предела
+    assert limiter.limit == 6
+    assert limiter.inflight == 0
+    assert 0.01 <= limiter.min_rtt < 0.05
+
+
+@pytest.mark.asyncio
+async def test_idle_worker_does_not_grow_limit():
+    """Вызовы заняли меньше половины предела — предел не меняется"""
+    limiter = make_limiter()
+
+    for _ in range(3):
+        await run_calls(limiter, 1, 0)
+
+    assert limiter.limit == 4
+
+
+@pytest.mark.asyncio
+async def test_latency_growth_cuts_limit_once_per_overload():
+    """Рост задержки уменьшает предел один раз на группу одновременных вызовов"""
+    limiter = make_limiter()
+    await run_calls(limiter, 2, 0.01)
+    assert limiter.limit == 5
+
+    await run_calls(limiter, 4, 0.05)
+    assert limiter.limit == 2
+
+    # Следующая перегрузка снова уменьшает предел
+    await run_calls(limiter, 2, 0.05)
+    assert limiter.limit == 1
+
+
+@pytest.mark.asyncio
+async def test_errors_cut_limit_and_rejected_calls_are_ignored():
+    """Ошибка AI уменьшает предел, отказ выключателя и отмена — нет"""
+    limiter = make_limiter()
+
+    with pytest.raises(AICircuitOpenError):
+        async with limiter.call():
+            raise AICircuitOpenError("AI сервис временно недоступен")
+    with pytest.raises(asyncio.CancelledError):
+        async with limiter.call():
+            raise asyncio.CancelledError
+    assert limiter.limit == 4
+
+    with pytest.raises(AIServiceError):
+        async with limiter.call():
+            raise AIServiceError("AI недоступен")
+    assert limiter.limit == 2
+    assert limiter.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_first_chunk_sets_latency_of_streamed_call():
+    """Задержку потокового вызова задает первый фрагмент, а не весь ответ"""
+    limiter = make_limiter(initial_limit=1)
+
+    async with limiter.call() as sample:
+        sample.mark()
+        await asyncio.sleep(0.02)
+
+    assert limiter.min_rtt < 0.01
+    assert limiter.limit == 2
+
+
+@pytest.mark.asyncio
+async def test_scheduler_resize_hands_out_new_slots():
+    """Увеличенный предел сразу выдает слоты ожидающим запросам"""
+    scheduler = FairScheduler(concurrency=1)
+    await scheduler.acquire(1)
+    waiter = asyncio.create_task(scheduler.acquire(2))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    scheduler.resize(2)
+    await asyncio.wait_for(waiter, 1)
+    assert scheduler.active == 2
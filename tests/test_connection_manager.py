@@ -0,0 +1,203 @@
+import asyncio
+
+import pytest
+
+from websockets_server.services.amqp_connection import AMQPConnectionManager
+from websockets_server.services.connection_manager import ConnectionManager
+from websockets_server.services.memory_broker import MemoryBroker
+from websockets_server.services.rabbitmq_service import RabbitMQService
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = asyncio.Queue()
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        await self.sent.put(data)
+
+
+@pytest.fixture
+def broker(mocker):
+    broker = MemoryBroker()
+    mocker.patch("websockets_server.services.amqp_connection.memory_broker", broker)
+    return broker
+
+
+def make_service(broker) -> RabbitMQService:
+    service = RabbitMQService()
+    service.amqp = AMQPConnectionManager(
+        "memory://", channel_pool_size=2, confirm_timeout=1, transport="memory"
+    )
+    service.response_mode = "per_user"
+    return service
+
+
+async def wait_for_consumers(broker: MemoryBroker, queue_name: str, count: int):
+    for _ in range(100):
+        state = broker.queues.get(queue_name)
+        if count == 0 and state is None:
+            return
+        if state is not None and len(state.consumers) == count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"У очереди {queue_name} нет {count} потребителей")
+
+
+@pytest.mark.asyncio
+async def test_one_subscription_for_all_user_sockets(broker):
+    """Ответ получают все вкладки пользователя, потребитель у брокера один"""
+    manager = ConnectionManager(make_service(broker))
+    worker = make_service(broker)
+    tabs = [FakeWebSocket() for _ in range(3)]
+
+    for tab in tabs:
+        await manager.connect(tab, 1)
+    await wait_for_consumers(broker, "user_responses_1", 1)
+
+    assert await worker.send_ai_response(1, "7", "Ответ")
+    for tab in tabs:
+        data = await asyncio.wait_for(tab.sent.get(), timeout=1)
+        assert data["message_id"] == "7"
+        assert data["content"] == "Ответ"
+
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_last_socket_closes_subscription(broker):
+    """Подписка живет, пока открыт хотя бы один сокет пользователя"""
+    manager = ConnectionManager(make_service(broker))
+    first, second = FakeWebSocket(), FakeWebSocket()
+
+    await manager.connect(first, 1)
+    await manager.connect(second, 1)
+    await wait_for_consumers(broker, "user_responses_1", 1)
+
+    await manager.disconnect(first, 1)
+    assert manager.subscribers(1) == 1
+    await wait_for_consumers(broker, "user_responses_1", 1)
+
+    await manager.disconnect(second, 1)
+    assert manager.subscribers(1) == 0
+    # auto_delete очередь удаляется вместе с последним потребителем
+    await wait_for_consumers(broker, "user_responses_1", 0)
+
+    # Переподключение открывает подписку заново
+    third = FakeWebSocket()
+    await manager.connect(third, 1)
+    await wait_for_consumers(broker, "user_responses_1", 1)
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_expired_request_notice_reaches_sockets(broker):
+    """Уведомление о просроченном запросе приходит отдельным типом кадра"""
+    manager = ConnectionManager(make_service(broker))
+    worker = make_service(broker)
+    tab = FakeWebSocket()
+
+    await manager.connect(tab, 1)
+    await wait_for_consumers(broker, "user_responses_1", 1)
+
+    assert await worker.send_ai_expired(1, "7")
+    data = await asyncio.wait_for(tab.sent.get(), timeout=1)
+    assert data == {"type": "ai_request_expired", "message_id": "7"}
+
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_streamed_response_frames_reach_sockets(broker):
+    """Фрагменты и итог потокового ответа приходят своими типами кадров"""
+    manager = ConnectionManager(make_service(broker))
+    worker = make_service(broker)
+    tab = FakeWebSocket()
+
+    await manager.connect(tab, 1)
+    await wait_for_consumers(broker, "user_responses_1", 1)
+
+    assert await worker.send_ai_chunk(1, "7", "Отв", 0)
+    assert await worker.send_ai_done(1, "7", "Ответ")
+    chunk = await asyncio.wait_for(tab.sent.get(), timeout=1)
+    done = await asyncio.wait_for(tab.sent.get(), timeout=1)
+    assert chunk == {
+        "type": "ai_response_chunk",
+        "message_id": "7",
+        "user_id": 1,
+        "content": "Отв",
+        "seq": 0,
+    }
+    assert done["type"] == "ai_response_done"
+    assert done["content"] == "Ответ"
+
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_ai_error_frame_reaches_sockets(broker):
+    """Ошибка запроса к AI приходит кадром error с кодом и message_id"""
+    manager = ConnectionManager(make_service(broker))
+    worker = make_service(broker)
+    tab = FakeWebSocket()
+
+    await manager.connect(tab, 1)
+    await wait_for_consumers(broker, "user_responses_1", 1)
+
+    assert await worker.send_ai_error(
+        1, "7", "ai_unavailable", "AI временно недоступен", retry_after=30
+    )
+    data = await asyncio.wait_for(tab.sent.get(), timeout=1)
+    assert data == {
+        "type": "error",
+        "message": "AI временно недоступен",
+        "error_code": "ai_unavailable",
+        "message_id": "7",
+        "retry_after": 30,
+    }
+
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_last_socket_cancels_user_requests(broker, mocker):
+    """Закрытие последнего сокета отменяет запросы, остановка сервера — нет"""
+    service = make_service(broker)
+    send_cancel = mocker.patch.object(service, "send_ai_cancel", return_value=True)
+    manager = ConnectionManager(service)
+    manager.cancel_grace_seconds = 0.01
+    first, second = FakeWebSocket(), FakeWebSocket()
+
+    await manager.connect(first, 1)
+    await manager.connect(second, 1)
+    await manager.disconnect(first, 1)
+    await asyncio.sleep(0.05)
+    send_cancel.assert_not_called()
+
+    await manager.disconnect(second, 1)
+    await asyncio.sleep(0.05)
+    send_cancel.assert_awaited_once_with(1)
+
+    await manager.connect(FakeWebSocket(), 2)
+    await manager.close()
+    assert send_cancel.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_reconnect_within_grace_keeps_requests(broker, mocker):
+    """Переподключение за время ожидания (обновление страницы) не отменяет запросы"""
+    service = make_service(broker)
+    send_cancel = mocker.patch.object(service, "send_ai_cancel", return_value=True)
+    manager = ConnectionManager(service)
+    manager.cancel_grace_seconds = 0.05
+
+    tab = FakeWebSocket()
+    await manager.connect(tab, 1)
+    await manager.disconnect(tab, 1)
+    await manager.connect(FakeWebSocket(), 1)
+    await asyncio.sleep(0.1)
+
+    send_cancel.assert_not_called()
+    await manager.close()
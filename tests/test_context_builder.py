@@ -0,0 +1,195 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from lawly_db.db_models.enum_models import MessageSenderTypeEnum
+
+from websockets_server.workers.context_builder import ContextBuilder
+
+
+def make_message(message_id: int, text: str, from_ai: bool = False):
+    return SimpleNamespace(
+        id=message_id,
+        text=text,
+        sender_type=(
+            MessageSenderTypeEnum.AI if from_ai else MessageSenderTypeEnum.USER
+        ),
+    )
+
+
+@pytest.fixture
+def history(mocker):
+    """История чата в базе данных: get_recent_ai_messages возвращает ее хвост
+    до сообщения before_id, get_last_ai_message_id — ID последнего из них"""
+    messages = []
+
+    @asynccontextmanager
+    async def fake_session():
+        yield None
+
+    async def get_recent_ai_messages(self, user_id, limit, before_id=None):
+        older = [m for m in messages if before_id is None or m.id < before_id]
+        return older[-limit:]
+
+    async def get_last_ai_message_id(self, user_id, before_id):
+        return max((m.id for m in messages if m.id < before_id), default=None)
+
+    mocker.patch(
+        "websockets_server.workers.context_builder.create_session", fake_session
+    )
+    mocker.patch(
+        "websockets_server.workers.context_builder.MessageRepository"
+        ".get_last_ai_message_id",
+        get_last_ai_message_id,
+    )
+    load = mocker.patch(
+        "websockets_server.workers.context_builder.MessageRepository"
+        ".get_recent_ai_messages",
+        autospec=True,
+        side_effect=get_recent_ai_messages,
+    )
+    return SimpleNamespace(messages=messages, load=load)
+
+
+def make_builder(**overrides) -> ContextBuilder:
+    options = dict(
+        max_turns=10,
+        token_budget=1000,
+        chars_per_token=1.0,
+        cache_users=10,
+        cache_ttl=60,
+    )
+    options.update(overrides)
+    return ContextBuilder(**options)
+
+
+@pytest.mark.asyncio
+async def test_prompt_contains_previous_turns_without_current_message(history):
+    """В промпт попадают прошлые реплики, текущее сообщение — только в конце"""
+    history.messages.extend(
+        [
+            make_message(1, "Что такое аренда?"),
+            make_message(2, "Договор найма имущества", from_ai=True),
+            make_message(3, "А субаренда?"),
+        ]
+    )
+    builder = make_builder()
+
+    prompt = await builder.build(1, "3", "А субаренда?")
+
+    assert prompt == (
+        "Предыдущие сообщения диалога:\n"
+        "Пользователь: Что такое аренда?\n"
+        "Ассистент: Договор найма имущества\n\n"
+        "Текущее сообщение пользователя:\n"
+        "А субаренда?"
+    )
+
+
+@pytest.mark.asyncio
+async def test_history_excludes_newer_messages(history):
+    """Сообщения новее отвечаемого не попадают в промпт ни из базы, ни из кеша"""
+    history.messages.extend(
+        [
+            make_message(1, "Первый вопрос"),
+            make_message(2, "Второй вопрос"),
+            make_message(3, "Третий вопрос"),
+        ]
+    )
+    builder = make_builder()
+
+    await builder.build(1, "3", "Третий вопрос")
+    prompt = await builder.build(1, "2", "Второй вопрос")
+
+    assert "Третий вопрос" not in prompt.split("Текущее сообщение")[0]
+    assert "Пользователь: Первый вопрос" in prompt
+    assert history.load.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_out_of_order_reply_resets_cache(history):
+    """Ответ на сообщение, уже учтенное в кеше, сбрасывает кеш пользователя"""
+    history.messages.extend(
+        [make_message(1, "Первый вопрос"), make_message(2, "Второй вопрос")]
+    )
+    builder = make_builder()
+
+    await builder.build(1, "2", "Второй вопрос")
+    builder.record(1, "1", "Первый вопрос", 3, "Первый ответ")
+
+    assert 1 not in builder._cache
+
+
+@pytest.mark.asyncio
+async def test_budget_keeps_newest_turns(history):
+    """Старые реплики отбрасываются первыми, когда не помещаются в бюджет"""
+    history.messages.extend(
+        [make_message(i, f"Реплика {i}" + "." * 40) for i in range(1, 6)]
+    )
+    builder = make_builder(token_budget=120)
+
+    prompt = await builder.build(1, "6", "Вопрос")
+
+    assert "Реплика 5" in prompt and "Реплика 4" in prompt
+    assert "Реплика 3" not in prompt
+
+
+@pytest.mark.asyncio
+async def test_history_is_cached_and_updated_by_worker_writes(history):
+    """Подряд идущие сообщения не читают базу, ответы воркера дописываются в кеш"""
+    history.messages.append(make_message(1, "Первый вопрос"))
+    builder = make_builder()
+
+    await builder.build(1, "2", "Второй вопрос")
+    history.messages.extend(
+        [
+            make_message(2, "Второй вопрос"),
+            make_message(3, "Второй ответ", from_ai=True),
+        ]
+    )
+    builder.record(1, "2", "Второй вопрос", 3, "Второй ответ")
+    prompt = await builder.build(1, "4", "Третий вопрос")
+
+    assert history.load.call_count == 1
+    assert "Пользователь: Второй вопрос\nАссистент: Второй ответ" in prompt
+
+    builder.invalidate(1)
+    await builder.build(1, "4", "Третий вопрос")
+    assert history.load.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_reloads_messages_written_by_other_workers(history):
+    """Обмен, записанный другим воркером, попадает в контекст сразу"""
+    history.messages.append(make_message(1, "Первый вопрос"))
+    builder = make_builder()
+    await builder.build(1, "2", "Второй вопрос")
+
+    # На второй вопрос ответил другой воркер
+    history.messages.extend(
+        [
+            make_message(2, "Второй вопрос"),
+            make_message(3, "Второй ответ", from_ai=True),
+        ]
+    )
+    prompt = await builder.build(1, "4", "Третий вопрос")
+
+    assert history.load.call_count == 2
+    assert "Пользователь: Второй вопрос\nАссистент: Второй ответ" in prompt
+
+
+@pytest.mark.asyncio
+async def test_cache_is_bounded_by_users_and_turns(history):
+    """Кеш хранит не больше cache_users пользователей и max_turns реплик"""
+    history.messages.extend([make_message(i, f"Реплика {i}") for i in range(1, 6)])
+    builder = make_builder(max_turns=3, cache_users=2)
+
+    for user_id in (1, 2, 3):
+        await builder.build(user_id, "100", "Вопрос")
+
+    assert list(builder._cache) == [2, 3]
+    assert [text for _, text in builder._cache[3].turns] == [
+        "Реплика 3",
+        "Реплика 4",
+        "Реплика 5",
+    ]
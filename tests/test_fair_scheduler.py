@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from websockets_server.workers.fair_scheduler import FairScheduler
+
+
+async def run_requests(scheduler: FairScheduler, requests: list[tuple[int, bool]]):
+    """Запускает запросы при занятом слоте и возвращает порядок их выполнения"""
+    order = []
+
+    async def request(user_id: int, priority: bool):
+        async with scheduler.slot(user_id, priority=priority):
+            order.append(user_id)
+
+    await scheduler.acquire(0)
+    tasks = [asyncio.create_task(request(*item)) for item in requests]
+    await asyncio.sleep(0)
+    scheduler.release(0)
+    await asyncio.gather(*tasks)
+    return order
+
+
+@pytest.mark.asyncio
+async def test_heavy_user_does_not_block_others():
+    """Пользователи чередуются, даже если один прислал много запросов подряд"""
+    scheduler = FairScheduler(concurrency=1)
+
+    order = await run_requests(scheduler, [(1, False)] * 5 + [(2, False), (3, False)])
+
+    assert order[:3] == [1, 2, 3]
+    assert order[3:] == [1, 1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_priority_lane_goes_first_without_starving_others():
+    """Приоритетная полоса обслуживается первой, но не дольше priority_weight подряд"""
+    scheduler = FairScheduler(concurrency=1, priority_weight=2)
+
+    order = await run_requests(scheduler, [(1, False)] + [(2, True)] * 4)
+
+    assert order == [2, 2, 1, 2, 2]
+
+
+@pytest.mark.asyncio
+async def test_depth_is_tracked_per_user_and_cleared_on_cancel():
+    scheduler = FairScheduler(concurrency=1)
+    await scheduler.acquire(0)
+
+    waiters = [asyncio.create_task(scheduler.acquire(1)) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert scheduler.depths() == {1: 3}
+
+    waiters[0].cancel()
+    await asyncio.sleep(0)
+    assert scheduler.depth(1) == 2
+
+    scheduler.release(0)
+    await asyncio.sleep(0)
+    assert waiters[1].done()
+    assert scheduler.depth(1) == 1
+
+    waiters[2].cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    assert scheduler.depths() == {}
+
+
+@pytest.mark.asyncio
+async def test_user_requests_run_in_order_other_users_in_parallel():
+    """Запросы пользователя не обгоняют друг друга, разные пользователи параллельны"""
+    scheduler = FairScheduler(concurrency=4)
+    running: dict[int, int] = {}
+    peak_per_user = peak_total = 0
+    finished = []
+
+    async def request(user_id: int, seq: int, duration: float):
+        nonlocal peak_per_user, peak_total
+        async with scheduler.slot(user_id):
+            running[user_id] = running.get(user_id, 0) + 1
+            peak_per_user = max(peak_per_user, running[user_id])
+            peak_total = max(peak_total, sum(running.values()))
+            await asyncio.sleep(duration)
+            running[user_id] -= 1
+            finished.append((user_id, seq))
+
+    # Первый запрос пользователя дольше второго: без полос второй завершился бы раньше
+    await asyncio.gather(
+        *(
+            request(user_id, seq, 0.02 if seq == 0 else 0.001)
+            for user_id in (1, 2, 3)
+            for seq in range(3)
+        )
+    )
+
+    assert peak_per_user == 1
+    assert peak_total == 3
+    for user_id in (1, 2, 3):
+        assert [seq for uid, seq in finished if uid == user_id] == [0, 1, 2]
+    # Простаивающие пользователи не оставляют состояния
+    assert scheduler.depths() == {}
+    assert not any(scheduler.running(user_id) for user_id in (1, 2, 3))
+    assert not any(scheduler._lanes.values())
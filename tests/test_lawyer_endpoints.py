@@ -14,6 +14,8 @@ from unittest.mock import MagicMock, AsyncMock
 from httpx import AsyncClient
 from pytest_mock import MockerFixture
 
+from config import settings
+from services.gost_cipher_service import GostCipherService
 from services.s3_service import S3Service
 from tests.dto import UserDTO, LawyerDTO, LawyerRequestDTO
 
@@ -353,3 +355,98 @@ async def get_lawyer_messages_returns_400_for_invalid_date_range(
     )
 
     assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_resumable_document_upload(
+    ac: AsyncClient, user_dto: UserDTO, mocker: MockerFixture
+):
+    """Тест возобновляемой загрузки документа частями"""
+    document = b"Resumable document content" * 10
+    headers = {"Authorization": f"Bearer {user_dto.token}"}
+
+    mocker.patch(
+        'protos.user_service.client.UserServiceClient.get_user_info',
+        return_value=MagicMock(consultations_used=0, consultations_total=5),
+    )
+    mocker.patch(
+        'protos.user_service.client.UserServiceClient.write_off_consultation',
+        return_value=True,
+    )
+    mocker.patch(
+        'services.s3_service.S3Service.create_multipart_upload',
+        return_value=("test-doc.doc", "s3-upload-id"),
+    )
+    uploaded_parts = []
+
+    async def upload_part(file_name, upload_id, part_number, body):
+        uploaded_parts.append(body)
+        return {"PartNumber": part_number, "ETag": f"etag-{part_number}"}
+
+    mocker.patch('services.s3_service.S3Service.upload_part', side_effect=upload_part)
+    mocker.patch(
+        'services.s3_service.S3Service.complete_multipart_upload',
+        return_value="https://test-bucket.s3.example.com/test-doc.doc",
+    )
+
+    create_response = await ac.post(
+        "/api/v1/chat/lawyer/requests/uploads",
+        headers=headers,
+        json={"description": "Проверка договора", "total_size": len(document)},
+    )
+    assert create_response.status_code == 201
+    upload_id = create_response.json()["upload_id"]
+
+    half = len(document) // 2
+    response = await ac.put(
+        f"/api/v1/chat/lawyer/requests/uploads/{upload_id}/chunks/0",
+        headers=headers,
+        params={"offset": 0},
+        content=document[:half],
+    )
+    assert response.status_code == 200
+    assert response.json()["offset"] == half
+
+    # Повтор уже принятой части не меняет смещение
+    response = await ac.put(
+        f"/api/v1/chat/lawyer/requests/uploads/{upload_id}/chunks/0",
+        headers=headers,
+        params={"offset": 0},
+        content=document[:half],
+    )
+    assert response.status_code == 200
+    assert response.json()["offset"] == half
+
+    # Часть с неверным смещением отклоняется
+    response = await ac.put(
+        f"/api/v1/chat/lawyer/requests/uploads/{upload_id}/chunks/1",
+        headers=headers,
+        params={"offset": half + 1},
+        content=document[half:],
+    )
+    assert response.status_code == 409
+
+    status_response = await ac.get(
+        f"/api/v1/chat/lawyer/requests/uploads/{upload_id}", headers=headers
+    )
+    assert status_response.json()["offset"] == half
+    assert status_response.json()["next_chunk"] == 1
+
+    response = await ac.put(
+        f"/api/v1/chat/lawyer/requests/uploads/{upload_id}/chunks/1",
+        headers=headers,
+        params={"offset": half},
+        content=document[half:],
+    )
+    assert response.status_code == 200
+
+    complete_response = await ac.post(
+        f"/api/v1/chat/lawyer/requests/uploads/{upload_id}/complete", headers=headers
+    )
+    assert complete_response.status_code == 201
+    assert complete_response.json()["status"] == "pending"
+
+    # Загруженные части расшифровываются в исходный документ
+    cipher = GostCipherService()
+    key = settings.encryption_settings.key.encode()
+    assert cipher.decrypt_data(b"".join(uploaded_parts), key) == document
@@ -0,0 +1,117 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from config import settings
+from services.errors import AccessDeniedError, ServiceError, ServiceUnavailableError
+from services.gost_cipher_service import GostCipherService
+from services.lawyer_service import LawyerService
+from services.upload_session_store import upload_sessions
+
+
+@pytest.fixture
+def lawyer_service(mocker):
+    """LawyerService без базы данных, S3 и сервиса пользователей"""
+    mocker.patch("services.lawyer_service.S3Service")
+    service = LawyerService(session=MagicMock())
+    service.s3_service = MagicMock(
+        create_multipart_upload=AsyncMock(return_value=("doc.doc", "s3-upload-id")),
+        upload_part=AsyncMock(
+            side_effect=lambda key, upload_id, number, body: {"PartNumber": number}
+        ),
+        complete_multipart_upload=AsyncMock(return_value="https://s3/doc.doc"),
+        abort_multipart_upload=AsyncMock(),
+    )
+    service.lawyer_request_repo = MagicMock(create_lawyer_request=AsyncMock())
+    mocker.patch.object(service, "_check_consultations", AsyncMock())
+    mocker.patch.object(service, "_write_off_consultation", AsyncMock())
+    yield service
+    for upload_id in list(upload_sessions._sessions):
+        upload_sessions.remove(upload_id)
+
+
+def test_encryptor_copy_continues_independently():
+    """Копия шифратора продолжает шифрование, не меняя оригинал"""
+    cipher = GostCipherService()
+    key = settings.encryption_settings.key.encode()
+    encryptor = cipher.cfb_encryptor(key)
+    head = encryptor.update(b"0123456789")
+
+    clone = encryptor.copy()
+    clone.update(b"abcdef")
+
+    ciphertext = head + encryptor.update(b"abcdef") + encryptor.finalize()
+    assert cipher.decrypt_data(ciphertext, key) == b"0123456789abcdef"
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_blocks_new_chunks(lawyer_service, mocker):
+    """Пока отложенный шифротекст не отправлен, новые части не принимаются"""
+    mocker.patch.object(settings.upload_settings, "part_size", 8)
+    session = await lawyer_service.create_upload_session(1, "Договор", 48)
+    lawyer_service.s3_service.upload_part.side_effect = ServiceError("S3 недоступен")
+
+    await lawyer_service.upload_chunk(1, session.upload_id, 0, 0, b"x" * 16)
+    pending = len(session.pending)
+    assert pending >= 8
+
+    with pytest.raises(ServiceUnavailableError):
+        await lawyer_service.upload_chunk(1, session.upload_id, 1, 16, b"y" * 16)
+    assert (session.offset, session.next_chunk) == (16, 1)
+    assert len(session.pending) == pending
+
+    lawyer_service.s3_service.upload_part.side_effect = (
+        lambda key, upload_id, number, body: {"PartNumber": number}
+    )
+    await lawyer_service.upload_chunk(1, session.upload_id, 1, 16, b"y" * 16)
+    assert session.offset == 32
+
+
+@pytest.mark.asyncio
+async def test_complete_writes_off_consultation_before_s3(lawyer_service):
+    """Консультация списывается до завершения загрузки и только один раз"""
+    session = await lawyer_service.create_upload_session(1, "Договор", 4)
+    await lawyer_service.upload_chunk(1, session.upload_id, 0, 0, b"data")
+
+    lawyer_service._write_off_consultation.side_effect = AccessDeniedError(
+        "У вас закончились консультации"
+    )
+    with pytest.raises(AccessDeniedError):
+        await lawyer_service.complete_upload(1, session.upload_id)
+    lawyer_service.s3_service.complete_multipart_upload.assert_not_called()
+    assert upload_sessions.get(session.upload_id) is session
+
+    lawyer_service._write_off_consultation.side_effect = None
+    lawyer_service.s3_service.complete_multipart_upload.side_effect = ServiceError(
+        "S3 недоступен"
+    )
+    with pytest.raises(ServiceError):
+        await lawyer_service.complete_upload(1, session.upload_id)
+
+    lawyer_service.s3_service.complete_multipart_upload.side_effect = None
+    await lawyer_service.complete_upload(1, session.upload_id)
+    assert lawyer_service._write_off_consultation.await_count == 2
+    assert upload_sessions.get(session.upload_id) is None
+
+
+@pytest.mark.asyncio
+async def test_complete_is_retried_after_failed_request_insert(lawyer_service):
+    """Ошибка создания заявки оставляет сессию, повтор не завершает загрузку снова"""
+    session = await lawyer_service.create_upload_session(1, "Договор", 4)
+    await lawyer_service.upload_chunk(1, session.upload_id, 0, 0, b"data")
+
+    create_request = lawyer_service.lawyer_request_repo.create_lawyer_request
+    create_request.side_effect = RuntimeError("База данных недоступна")
+    with pytest.raises(RuntimeError):
+        await lawyer_service.complete_upload(1, session.upload_id)
+    assert upload_sessions.get(session.upload_id) is session
+
+    create_request.side_effect = None
+    await lawyer_service.complete_upload(1, session.upload_id)
+
+    lawyer_service.s3_service.complete_multipart_upload.assert_awaited_once()
+    assert lawyer_service._write_off_consultation.await_count == 1
+    create_request.assert_awaited_with(
+        user_id=1, message="Договор", document_url="https://s3/doc.doc"
+    )
+    assert upload_sessions.get(session.upload_id) is None
@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+from aio_pika import Message
+
+from config import settings
+from websockets_server.dto import RabbitMQAIRequest
+from websockets_server.services.amqp_connection import AMQPConnectionManager
+from websockets_server.services.memory_broker import MemoryBroker
+from websockets_server.services.rabbitmq_service import RabbitMQService
+
+
+@pytest.fixture
+def memory_amqp(mocker):
+    mocker.patch(
+        "websockets_server.services.amqp_connection.memory_broker", MemoryBroker()
+    )
+    return AMQPConnectionManager(
+        "memory://", channel_pool_size=2, confirm_timeout=1, transport="memory"
+    )
+
+
+def make_service(amqp: AMQPConnectionManager) -> RabbitMQService:
+    service = RabbitMQService()
+    service.amqp = amqp
+    service.response_mode = "per_user"
+    return service
+
+
+@pytest.mark.asyncio
+async def test_request_roundtrip_without_rabbitmq(memory_amqp, mocker):
+    """Запрос проходит путь клиент → воркер → клиент через брокер в памяти"""
+    mocker.patch.multiple(
+        "config.settings.ai_worker_settings", retry_base_delay=0.01, max_attempts=2
+    )
+    worker = make_service(memory_amqp)
+    listener = make_service(memory_amqp)
+    attempts = []
+
+    async def process(data):
+        attempts.append(data["message_id"])
+        if len(attempts) == 1:
+            raise RuntimeError("AI недоступен")
+        await worker.send_ai_response(
+            data["user_id"], data["message_id"], f"Ответ на: {data['message']}"
+        )
+
+    received = asyncio.Queue()
+    listen_task = asyncio.create_task(listener.listen_for_responses(1, received.put))
+    worker_task = asyncio.create_task(worker.start_ai_worker(process, prefetch_count=2))
+    await asyncio.sleep(0.01)
+
+    assert await listener.send_ai_request(1, "Вопрос", "10")
+    response = await asyncio.wait_for(received.get(), timeout=1)
+
+    # Первая попытка вернулась через очередь задержки с TTL и dead-letter
+    assert attempts == ["10", "10"]
+    assert response["content"] == "Ответ на: Вопрос"
+    assert response["message_id"] == "10"
+
+    listen_task.cancel()
+    await worker.stop_processing()
+    await asyncio.gather(listen_task, worker_task, return_exceptions=True)
+    await memory_amqp.close()
+
+
+@pytest.mark.asyncio
+async def test_prefetch_limits_unacked_deliveries(memory_amqp):
+    channel = await memory_amqp.channel()
+    await channel.set_qos(prefetch_count=1)
+    queue = await channel.declare_queue("jobs")
+    delivered = []
+
+    async def on_message(message):
+        delivered.append(message)
+
+    await queue.consume(on_message)
+    for body in (b"1", b"2"):
+        await memory_amqp.publish(Message(body), routing_key="jobs")
+    await asyncio.sleep(0)
+    assert [m.body for m in delivered] == [b"1"]
+
+    await delivered[0].ack()
+    await asyncio.sleep(0)
+    assert [m.body for m in delivered] == [b"1", b"2"]
+
+
+@pytest.mark.asyncio
+async def test_worker_stop_waits_for_inflight_requests(memory_amqp):
+    """Остановка не принимает новые запросы, но дожидается уже полученных"""
+    worker = make_service(memory_amqp)
+    started = asyncio.Event()
+    release = asyncio.Event()
+    finished = []
+
+    async def process(data):
+        started.set()
+        await release.wait()
+        finished.append(data["message_id"])
+
+    worker_task = asyncio.create_task(worker.start_ai_worker(process))
+    await asyncio.sleep(0.01)
+    await worker.send_ai_request(1, "Вопрос", "1")
+    await asyncio.wait_for(started.wait(), timeout=1)
+
+    await worker.stop_processing()
+    await asyncio.sleep(0.01)
+    assert not worker_task.done()
+
+    release.set()
+    await asyncio.wait_for(worker_task, timeout=1)
+    assert finished == ["1"]
+    await memory_amqp.close()
+
+
+@pytest.mark.asyncio
+async def test_request_carries_deadline_and_expiration(memory_amqp, mocker):
+    """Запрос получает срок ответа, брокер удаляет его по истечении срока"""
+    mocker.patch.object(settings.ai_worker_settings, "request_ttl", 0.05)
+    service = make_service(memory_amqp)
+
+    assert await service.send_ai_request(1, "Вопрос", "10")
+    message = await service.ai_request_queue.get(no_ack=True, fail=False)
+    data = service._decode(message, RabbitMQAIRequest)
+    assert data["deadline"] == pytest.approx(data["enqueued_at"] + 0.05)
+    assert 0 < message.expiration <= 0.05
+
+    assert await service.send_ai_request(1, "Вопрос", "11")
+    await asyncio.sleep(0.1)
+    assert await service.ai_request_queue.get(no_ack=True, fail=False) is None
+
+
+@pytest.mark.asyncio
+async def test_cancel_reaches_every_worker(memory_amqp):
+    """Отмена рассылается всем воркерам через управляющий fanout обмен"""
+    workers = [make_service(memory_amqp) for _ in range(2)]
+    api = make_service(memory_amqp)
+    received = [asyncio.Queue() for _ in workers]
+    tasks = [
+        asyncio.create_task(worker.listen_for_control(queue.put))
+        for worker, queue in zip(workers, received)
+    ]
+    await asyncio.sleep(0.01)
+
+    assert await api.send_ai_cancel(1, "10")
+    for queue in received:
+        data = await asyncio.wait_for(queue.get(), timeout=1)
+        assert data["user_id"] == 1
+        assert data["message_id"] == "10"
+        assert data["cancelled_at"] > 0
+
+    for worker in workers:
+        await worker.close()
+    await asyncio.gather(*tasks)
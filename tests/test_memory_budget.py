@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from services.errors import ServiceUnavailableError
+from services.memory_budget import ByteBudget
+
+
+@pytest.mark.asyncio
+async def test_budget_queues_until_released():
+    """Запрос ждет, пока бюджет не освободится"""
+    budget = ByteBudget(capacity=100, max_wait_seconds=1, retry_after_seconds=1)
+
+    first = await budget.acquire(80)
+    waiter = asyncio.create_task(budget.acquire(50))
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    budget.release(first)
+    assert await waiter == 50
+    assert budget.in_use == 50
+
+
+@pytest.mark.asyncio
+async def test_budget_rejects_after_timeout():
+    """Запрос отклоняется, если бюджет не освободился вовремя"""
+    budget = ByteBudget(capacity=100, max_wait_seconds=0.01, retry_after_seconds=7)
+
+    async with budget.reserve(100):
+        with pytest.raises(ServiceUnavailableError) as exc_info:
+            await budget.acquire(1)
+
+    assert exc_info.value.retry_after == 7
+    assert budget.in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_budget_clamps_oversized_request():
+    """Документ больше бюджета выполняется в одиночку"""
+    budget = ByteBudget(capacity=100, max_wait_seconds=0, retry_after_seconds=1)
+
+    async with budget.reserve(1000) as reserved:
+        assert reserved == 100
+        with pytest.raises(ServiceUnavailableError):
+            await budget.acquire(1)
+
+
+@pytest.mark.asyncio
+async def test_reservation_grows_and_releases_on_exit():
+    """Резервирование растет частями и возвращается целиком по выходе из блока"""
+    budget = ByteBudget(capacity=100, max_wait_seconds=0, retry_after_seconds=1)
+
+    async with budget.reservation() as reservation:
+        first = await reservation.grow(30)
+        await reservation.grow(40)
+        reservation.shrink(first)
+        assert budget.in_use == 40
+
+    assert budget.in_use == 0
+    # Возврат после выхода из блока не освобождает бюджет второй раз
+    reservation.shrink(40)
+    assert budget.in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_json_body_is_reserved_before_parsing(mocker):
+    """Бюджет резервируется по Content-Length до разбора JSON тела"""
+    from fastapi import APIRouter, Body, FastAPI
+    from httpx import ASGITransport, AsyncClient
+
+    from modules.lawyer.route import DocumentBudgetRoute
+
+    budget = ByteBudget(capacity=1000, max_wait_seconds=0, retry_after_seconds=3)
+    mocker.patch("modules.lawyer.route.document_memory_budget", budget)
+    in_use = []
+
+    router = APIRouter(route_class=DocumentBudgetRoute)
+
+    @router.post("/documents")
+    async def create_document(document_bytes: list[int] = Body(..., embed=True)):
+        in_use.append(budget.in_use)
+        return {"size": len(document_bytes)}
+
+    app = FastAPI()
+    app.include_router(router)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.post("/documents", json={"document_bytes": [1] * 10})
+        assert response.status_code == 200
+        assert in_use[0] == int(response.request.headers["content-length"]) * 8
+        assert budget.in_use == 0
+
+        # Бюджет целиком занят другим запросом
+        async with budget.reserve(budget.capacity):
+            response = await client.post("/documents", json={"document_bytes": [1]})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "3"
+
+        async def chunked_body():
+            yield b'{"document_bytes": [1]}'
+
+        # Тело без Content-Length не читается
+        response = await client.post(
+            "/documents",
+            content=chunked_body(),
+            headers={"content-type": "application/json"},
+        )
+        assert response.status_code == 411
+        assert in_use == [in_use[0]]
@@ -0,0 +1,52 @@
+import json
+
+import msgpack
+import pytest
+
+from websockets_server.dto import RabbitMQAIRequest, RabbitMQAIResponse
+from websockets_server.services.message_codec import (
+    JsonCodec,
+    MessageDecodeError,
+    MsgpackCodec,
+    get_codec,
+)
+
+
+@pytest.mark.parametrize("codec", [JsonCodec(), MsgpackCodec()])
+def test_codec_roundtrip(codec):
+    """Оба кодека восстанавливают сообщение без потерь"""
+    response = RabbitMQAIResponse(user_id=1, message_id="42", content="Ответ")
+
+    assert codec.decode(codec.encode(response), RabbitMQAIResponse) == response
+
+
+def test_msgpack_is_positional_and_smaller():
+    """msgpack не передает имена полей и тег type"""
+    response = RabbitMQAIResponse(user_id=1, message_id="42", content="Ответ")
+
+    packed = MsgpackCodec().encode(response)
+    assert b"content" not in packed and b"ai_response" not in packed
+    assert len(packed) < len(JsonCodec().encode(response))
+
+
+def test_old_publishers_are_understood():
+    """Сообщения прежнего формата разбираются, в том числе без content_type"""
+    body = json.dumps({"user_id": 1, "message": "Вопрос", "message_id": "7"}).encode()
+
+    request = get_codec(None).decode(body, RabbitMQAIRequest)
+    assert request.message == "Вопрос"
+    assert request.enqueued_at is None
+
+    # Старый msgpack-отправитель без поля enqueued_at, добавленного в конец схемы
+    old_packed = msgpack.packb([1, "Вопрос", "7"])
+    assert (
+        get_codec("application/x-msgpack").decode(old_packed, RabbitMQAIRequest)
+        == request
+    )
+
+
+def test_invalid_body_raises_decode_error():
+    with pytest.raises(MessageDecodeError):
+        MsgpackCodec().decode(b"\xc1", RabbitMQAIResponse)
+    with pytest.raises(MessageDecodeError):
+        JsonCodec().decode(b"{", RabbitMQAIResponse)
@@ -0,0 +1,144 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from websockets_server.dto import RabbitMQAIRequest
+from websockets_server.services.amqp_connection import AMQPConnectionManager
+from websockets_server.services.memory_broker import MemoryBroker
+from websockets_server.services.message_codec import get_codec
+from websockets_server.services.outbox_relay import OutboxRelay
+from websockets_server.services.rabbitmq_service import RabbitMQService
+
+
+class FakeOutboxRepository:
+    """Исходящие в памяти вместо таблицы ai_request_outbox"""
+
+    rows: list = []
+
+    def __init__(self, session):
+        self.session = session
+
+    async def lock_unsent(self, limit):
+        return [row for row in self.rows if row.sent_at is None][:limit]
+
+    async def mark_sent(self, outbox_ids):
+        for row in self.rows:
+            if row.id in outbox_ids:
+                row.sent_at = datetime.now(timezone.utc)
+
+    async def mark_failed(self, outbox_ids):
+        for row in self.rows:
+            if row.id in outbox_ids:
+                row.attempts += 1
+
+    async def delete_sent_before(self, before):
+        return 0
+
+
+def make_row(outbox_id: int, user_id: int = 1, priority: int = 0):
+    return SimpleNamespace(
+        id=outbox_id,
+        user_id=user_id,
+        message_id=100 + outbox_id,
+        message=f"Вопрос {outbox_id}",
+        priority=priority,
+        attempts=0,
+        created_at=datetime.now(timezone.utc),
+        sent_at=None,
+    )
+
+
+@pytest.fixture
+def relay(mocker):
+    mocker.patch(
+        "websockets_server.services.amqp_connection.memory_broker", MemoryBroker()
+    )
+    amqp = AMQPConnectionManager(
+        "memory://", channel_pool_size=2, confirm_timeout=1, transport="memory"
+    )
+
+    @asynccontextmanager
+    async def fake_session():
+        yield mocker.AsyncMock()
+
+    mocker.patch("websockets_server.services.outbox_relay.create_session", fake_session)
+    mocker.patch(
+        "websockets_server.services.outbox_relay.OutboxRepository",
+        FakeOutboxRepository,
+    )
+    FakeOutboxRepository.rows = []
+
+    service = RabbitMQService()
+    service.amqp = amqp
+    return OutboxRelay(
+        batch_size=2, poll_interval=60, retention_seconds=60, rabbitmq_service=service
+    )
+
+
+async def drain_requests(service: RabbitMQService) -> list[dict]:
+    queue = service.ai_request_queue
+    requests = []
+    while True:
+        message = await queue.get(no_ack=True, fail=False)
+        if message is None:
+            return requests
+        request = get_codec(message.content_type).decode(
+            message.body, RabbitMQAIRequest
+        )
+        requests.append(request.model_dump())
+
+
+@pytest.mark.asyncio
+async def test_relay_publishes_batch_and_marks_sent(relay):
+    """Строки исходящих публикуются пачкой и отмечаются отправленными"""
+    FakeOutboxRepository.rows = [make_row(1), make_row(2, user_id=2, priority=1)]
+
+    assert await relay.relay_once() == (2, 2)
+
+    assert all(row.sent_at is not None for row in FakeOutboxRepository.rows)
+    requests = await drain_requests(relay.rabbitmq_service)
+    assert [r["message_id"] for r in requests] == ["101", "102"]
+    assert requests[1]["priority"] == 1
+    # Ожидание в очереди считается от записи в исходящие
+    assert requests[0]["enqueued_at"] == pytest.approx(
+        FakeOutboxRepository.rows[0].created_at.timestamp()
+    )
+
+
+@pytest.mark.asyncio
+async def test_relay_keeps_unconfirmed_rows(relay, mocker):
+    """Неподтвержденная строка остается в исходящих до следующего прохода"""
+    FakeOutboxRepository.rows = [make_row(1), make_row(2)]
+    mocker.patch.object(
+        relay.rabbitmq_service, "send_ai_requests", return_value=[True, False]
+    )
+
+    assert await relay.relay_once() == (2, 1)
+
+    first, second = FakeOutboxRepository.rows
+    assert first.sent_at is not None
+    assert second.sent_at is None
+    assert second.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_notify_wakes_relay_without_polling(relay):
+    """Уведомление публикует новую строку, не дожидаясь интервала опроса"""
+    task = asyncio.create_task(relay.run())
+    await asyncio.sleep(0.01)
+
+    # Больше одной пачки: релей выбирает следующую сразу
+    FakeOutboxRepository.rows = [make_row(i) for i in range(1, 6)]
+    relay.notify()
+    for _ in range(100):
+        if all(row.sent_at for row in FakeOutboxRepository.rows):
+            break
+        await asyncio.sleep(0.01)
+
+    assert all(row.sent_at for row in FakeOutboxRepository.rows)
+
+    relay.stop()
+    await asyncio.wait_for(task, timeout=1)
@@ -0,0 +1,40 @@
+import pytest
+
+from websockets_server.services.presence_registry import PresenceRegistry
+
+
+@pytest.mark.asyncio
+async def test_presence_routes_to_registered_nodes():
+    """Пользователь виден на узле, пока узел держит аренду"""
+    node_a = PresenceRegistry("node-a", lease_seconds=30, heartbeat_seconds=10)
+
+    await node_a.register(1)
+    assert await node_a.get_nodes(1) == ["node-a"]
+    assert await node_a.get_nodes(2) == []
+
+    await node_a.unregister(1)
+    assert await node_a.get_nodes(1) == []
+    await node_a.close()
+
+
+@pytest.mark.asyncio
+async def test_presence_lease_expires_without_heartbeat():
+    """Аренда упавшего узла истекает сама"""
+    registry = PresenceRegistry("node-a", lease_seconds=0, heartbeat_seconds=10)
+
+    await registry.register(1)
+    assert await registry.get_nodes(1) == []
+    await registry.close()
+
+
+@pytest.mark.asyncio
+async def test_expired_marks_are_returned_once():
+    """Отметки о просроченных запросах выдаются при переподключении один раз"""
+    registry = PresenceRegistry("node-a", lease_seconds=30, heartbeat_seconds=10)
+
+    await registry.mark_expired(1, "5")
+    await registry.mark_expired(1, "6")
+
+    assert await registry.pop_expired(1) == ["5", "6"]
+    assert await registry.pop_expired(1) == []
+    assert await registry.pop_expired(2) == []
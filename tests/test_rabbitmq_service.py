@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from services.errors import AICircuitOpenError
+from websockets_server.services.rabbitmq_service import RabbitMQService
+
+
+class FakeQueue:
+    def __init__(self, name: str):
+        self.name = name
+        self.cancelled = []
+
+    async def bind(self, exchange, routing_key):
+        pass
+
+    async def consume(self, callback):
+        return "ctag-1"
+
+    async def cancel(self, consumer_tag):
+        self.cancelled.append(consumer_tag)
+
+
+class FakeChannel:
+    def __init__(self):
+        self.is_closed = False
+        self.queues = []
+
+    async def declare_queue(self, name: str = "", **kwargs):
+        queue = FakeQueue(name)
+        self.queues.append(queue)
+        return queue
+
+    async def close(self):
+        self.is_closed = True
+
+
+@pytest.mark.asyncio
+async def test_listener_cancels_consumer_when_task_cancelled():
+    """Отмена подписки сразу снимает потребителя с очереди пользователя"""
+    service = RabbitMQService()
+    service.response_mode = "per_user"
+    service.channel = FakeChannel()
+
+    task = asyncio.create_task(service.listen_for_responses(1, lambda data: None))
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert not task.done()
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert service.channel.queues[0].cancelled == ["ctag-1"]
+
+
+@pytest.mark.asyncio
+async def test_listener_returns_when_service_closed():
+    """Закрытие сервиса завершает подписки без ожидания"""
+    service = RabbitMQService()
+    service.response_mode = "per_user"
+    service.channel = FakeChannel()
+
+    task = asyncio.create_task(service.listen_for_responses(1, lambda data: None))
+    await asyncio.sleep(0)
+    await service.close()
+
+    await asyncio.wait_for(task, timeout=0.1)
+
+
+class FakeIncomingMessage:
+    def __init__(self, headers: dict | None = None):
+        self.body = b"{}"
+        self.content_type = "application/json"
+        self.headers = headers
+        self.acked = False
+        self.requeued = False
+
+    async def ack(self):
+        self.acked = True
+
+    async def nack(self, requeue: bool = True):
+        self.requeued = requeue
+
+
+@pytest.mark.asyncio
+async def test_failed_request_goes_through_delay_queues_to_dead_letter(mocker):
+    """Неудачный запрос откладывается с растущей задержкой, затем уходит в DLQ"""
+    mocker.patch.multiple(
+        "config.settings.ai_worker_settings",
+        max_attempts=3,
+        retry_base_delay=1.0,
+        retry_max_delay=60.0,
+    )
+    service = RabbitMQService()
+    publish = mocker.patch.object(service.amqp, "publish", return_value=True)
+
+    routes = []
+    headers = None
+    for _ in range(3):
+        message = FakeIncomingMessage(headers)
+        await service._retry_or_dead_letter(message, RuntimeError("AI недоступен"))
+        assert message.acked
+        copy = publish.call_args.args[0]
+        routes.append(publish.call_args.kwargs["routing_key"])
+        headers = copy.headers
+
+    assert routes == [
+        "ai_request_retry_1000ms",
+        "ai_request_retry_2000ms",
+        "ai_request_dead_letter",
+    ]
+    assert headers["x-attempt"] == 4
+    assert headers["x-last-error"] == "AI недоступен"
+
+
+@pytest.mark.asyncio
+async def test_shed_request_is_delayed_without_spending_attempts(mocker):
+    """Отложенный выключателем запрос не приближается к очереди мертвых писем"""
+    mocker.patch.multiple(
+        "config.settings.ai_worker_settings",
+        max_attempts=3,
+        retry_base_delay=1.0,
+        retry_max_delay=60.0,
+    )
+    service = RabbitMQService()
+    publish = mocker.patch.object(service.amqp, "publish", return_value=True)
+
+    for attempt, route in (
+        (1, "ai_request_retry_1000ms"),
+        (3, "ai_request_retry_2000ms"),
+    ):
+        message = FakeIncomingMessage({"x-attempt": attempt})
+        await service._retry_or_dead_letter(
+            message, AICircuitOpenError("AI недоступен"), count_attempt=False
+        )
+        assert publish.call_args.kwargs["routing_key"] == route
+        assert publish.call_args.args[0].headers["x-attempt"] == attempt
+
+
+@pytest.mark.asyncio
+async def test_failed_request_is_requeued_when_broker_rejects_copy(mocker):
+    service = RabbitMQService()
+    mocker.patch.object(service.amqp, "publish", return_value=False)
+
+    message = FakeIncomingMessage()
+    await service._retry_or_dead_letter(message, RuntimeError("AI недоступен"))
+
+    assert not message.acked
+    assert message.requeued
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from config import settings
+from services.latency_tracker import LatencyTracker
+from services.memory_budget import ByteBudget
+from services.s3_service import S3Service
+from tests.fake_s3 import FakeS3Session
+
+
+def make_s3_service(session: FakeS3Session, first_byte_samples: list[float]):
+    s3_service = S3Service()
+    s3_service.session = session
+    s3_service.latency = LatencyTracker()
+    for sample in first_byte_samples:
+        s3_service.latency.observe("get_object_first_byte", sample)
+    return s3_service
+
+
+def document_url(key: str) -> str:
+    s3_settings = settings.s3_settings
+    return f"{s3_settings.endpoint_url}/{s3_settings.bucket_name}/{key}"
+
+
+@pytest.mark.asyncio
+async def test_download_hedges_slow_first_byte():
+    """Медленный первый запрос перекрывается вторым, проигравший отменяется"""
+    session = FakeS3Session({"doc.doc": b"encrypted"})
+    session.first_byte_delays.extend([2.0, 0.0])
+    s3_service = make_s3_service(session, [0.01] * 50)
+
+    start = time.monotonic()
+    data = await s3_service.download_file(document_url("doc.doc"))
+
+    assert data == b"encrypted"
+    assert time.monotonic() - start < 1.0
+    assert session.get_calls == 2
+    assert session.cancelled_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_primary_records_censored_first_byte():
+    """Отмененный медленный запрос добавляет в замеры прошедшее время"""
+    session = FakeS3Session({"doc.doc": b"encrypted"})
+    session.first_byte_delays.extend([2.0, 0.0])
+    s3_service = make_s3_service(session, [0.01] * 50)
+
+    await s3_service.download_file(document_url("doc.doc"))
+
+    # Ответ второго запроса и нижняя граница для первого
+    assert s3_service.latency.count("get_object_first_byte") == 52
+    censored = s3_service.latency.percentile("get_object_first_byte", 1.0)
+    assert censored >= settings.s3_settings.hedge_min_delay
+
+
+@pytest.mark.asyncio
+async def test_download_without_hedge_when_fast():
+    """Быстрый ответ не порождает второго запроса"""
+    session = FakeS3Session({"doc.doc": b"encrypted"})
+    s3_service = make_s3_service(session, [0.5] * 50)
+
+    data = await s3_service.download_file(document_url("doc.doc"))
+
+    assert data == b"encrypted"
+    assert session.get_calls == 1
+    assert s3_service.latency.count("get_object") == 1
+
+
+def test_latency_tracker_percentile():
+    """Перцентиль считается по скользящему окну замеров"""
+    tracker = LatencyTracker(window=100)
+    for i in range(200):
+        tracker.observe("get_object", i / 1000)
+
+    assert tracker.count("get_object") == 100
+    assert tracker.percentile("get_object", 0.5) == pytest.approx(0.15)
+    assert tracker.percentile("get_object", 0.99) == pytest.approx(0.199)
+    assert tracker.percentile("put_object", 0.5) is None
+
+
+@pytest.mark.asyncio
+async def test_download_reserves_every_copy_in_flight():
+    """Каждый запрос GET резервирует размер объекта из ответа, копия
+    отмененного запроса возвращается в бюджет"""
+    session = FakeS3Session({"doc.doc": b"encrypted"})
+    session.first_byte_delays.extend([0.08, 0.0])
+    session.body_delay = 0.2
+    s3_service = make_s3_service(session, [0.001] * 50)
+    budget = ByteBudget(capacity=100, max_wait_seconds=0, retry_after_seconds=1)
+
+    async with budget.reservation() as reservation:
+        download = asyncio.create_task(
+            s3_service.download_file(document_url("doc.doc"), reservation)
+        )
+        await asyncio.sleep(0.15)
+        # Оба запроса получили ответ и читают тело
+        assert budget.in_use == 2 * len(b"encrypted")
+
+        assert await download == b"encrypted"
+        assert budget.in_use == len(b"encrypted")
+    assert budget.in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_download_cancels_primary_request():
+    """Отмена скачивания до хеджирования отменяет и дожидается первого запроса"""
+    session = FakeS3Session({"doc.doc": b"encrypted"})
+    session.first_byte_delays.append(2.0)
+    s3_service = make_s3_service(session, [0.5] * 50)
+
+    download = asyncio.create_task(s3_service.download_file(document_url("doc.doc")))
+    await asyncio.sleep(0.01)
+    download.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await download
+
+    assert session.get_calls == 1
+    assert session.cancelled_calls == 1